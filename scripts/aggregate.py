@@ -2,6 +2,8 @@ import mysql.connector
 import os
 import sys
 from dotenv import load_dotenv
+from job_logger import get_job_logger
+from proc_profiler import ProcProfiler
 
 load_dotenv()
 
@@ -26,6 +28,8 @@ DATA_MART_CONFIG = {
 class AggregateJob:
     def __init__(self):
         self.config_id = None
+        self.logger = get_job_logger(CONTROLLER_CONFIG)
+        self.profiler = ProcProfiler()
 
     def _get_conn(self, config):
         try:
@@ -72,7 +76,7 @@ class AggregateJob:
             print("⏳ Đang chạy Procedure: Refresh_Data_Mart...")
 
             # Gọi Procedure mới
-            cursor.callproc('Refresh_Data_Mart')
+            self.profiler.callproc(cursor, 'aggregate', 'Refresh_Data_Mart')
             conn.commit()
 
             print("✅ Data Mart đã được làm mới.")
@@ -85,6 +89,7 @@ class AggregateJob:
             conn.close()
 
     def finalize(self):
+        self.logger.log(self.config_id, 'SUCCESS', 'Data Mart Refresh Complete')
         conn = self._get_conn(CONTROLLER_CONFIG)
         if not conn: return
         try:
@@ -93,28 +98,30 @@ class AggregateJob:
             # Cập nhật config
             query = "UPDATE config SET status = 'AGGREGATED', is_processing = FALSE, flag = 0 WHERE id = %s"
             cursor.execute(query, (self.config_id,))
-
-            cursor.execute(
-                "INSERT INTO logging (id_config, status, description) VALUES (%s, 'SUCCESS', 'Data Mart Refresh Complete')",
-                (self.config_id,)
-            )
-            # --------------------
-
-            conn.commit()
+            with self.logger.flush_with(cursor):
+                conn.commit()
             print("🏁 Job Hoàn tất: AGGREGATED")
+            self._save_proc_metrics(conn)
         finally:
             conn.close()
 
+    def _save_proc_metrics(self, conn):
+        try:
+            self.profiler.save_to_db(conn, self.config_id)
+        except mysql.connector.Error as err:
+            print(f"Proc metrics save error: {err}")
+
     def report_error(self, msg):
+        self.logger.log(self.config_id, 'ERR', msg)
         conn = self._get_conn(CONTROLLER_CONFIG)
         if not conn: return
         try:
             cursor = conn.cursor()
             cursor.execute("UPDATE config SET status = 'ERR_AGG', is_processing = FALSE WHERE id = %s",
                            (self.config_id,))
-            cursor.execute("INSERT INTO logging (id_config, status, description) VALUES (%s, 'ERR', %s)",
-                           (self.config_id, msg))
-            conn.commit()
+            with self.logger.flush_with(cursor):
+                conn.commit()
+            self._save_proc_metrics(conn)
         finally:
             conn.close()
 
@@ -0,0 +1,225 @@
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import mysql.connector
+
+from crawl_data import (
+    CrawlJob, DB_CONFIG, DEFAULT_CSV_PATH, DATE_FORMAT, CRAWL_WORKERS,
+    CACHE_DIR, CACHE_TTL_SECONDS, CACHE_MAX_BYTES, HTTP_POOL_SIZE
+)
+from response_cache import ResponseCache
+from http_pool import SessionPool
+from trading_calendar import get_calendar
+
+# Kích thước mặc định của một chunk: số ngày mỗi cửa sổ và số mã mỗi lô
+BACKFILL_WINDOW_DAYS = int(os.getenv("BACKFILL_WINDOW_DAYS", "90"))
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "50"))
+# Số chunk chạy song song
+BACKFILL_PARALLEL = int(os.getenv("BACKFILL_PARALLEL", "2"))
+
+
+class BackfillPlanner:
+    """Chia một khoảng thời gian dài thành các chunk (cửa sổ ngày x lô mã) và chạy có checkpoint"""
+
+    def __init__(self, db_config, backfill_id, workers=CRAWL_WORKERS, cache=None):
+        self.db_config = db_config
+        self.backfill_id = backfill_id
+        self.workers = workers
+        self.cache = cache
+
+    def _get_conn(self):
+        try:
+            return mysql.connector.connect(**self.db_config)
+        except mysql.connector.Error as err:
+            print(f"Connection Error: {err}")
+            return None
+
+    def ensure_table(self):
+        conn = self._get_conn()
+        if not conn: return False
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS backfill_chunk (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    backfill_id VARCHAR(64) NOT NULL,
+                    chunk_no INT NOT NULL,
+                    window_start DATE NOT NULL,
+                    window_end DATE NOT NULL,
+                    symbols TEXT NOT NULL,
+                    id_config INT NULL,
+                    status VARCHAR(20) NOT NULL DEFAULT 'PENDING',
+                    rows_saved INT NOT NULL DEFAULT 0,
+                    checkpoint_at DATETIME NULL,
+                    UNIQUE KEY uq_backfill_chunk (backfill_id, chunk_no)
+                )
+            """)
+            conn.commit()
+            return True
+        finally:
+            conn.close()
+
+    @staticmethod
+    def plan(start_date, end_date, symbols, window_days, batch_size, calendar=None):
+        """Trả về danh sách chunk theo thứ tự: cửa sổ ngày trước, lô mã sau.
+        Cửa sổ được thu hẹp về ngày giao dịch, cửa sổ không có phiên nào bị bỏ qua"""
+        calendar = calendar or get_calendar()
+        chunks = []
+        batches = [symbols[i:i + batch_size] for i in range(0, len(symbols), batch_size)]
+        window_start = start_date
+        while window_start <= end_date:
+            window_end = min(window_start + timedelta(days=window_days - 1), end_date)
+            trading_range = calendar.clip(window_start, window_end)
+            for batch in (batches if trading_range else []):
+                chunks.append({
+                    "chunk_no": len(chunks),
+                    "window_start": trading_range[0],
+                    "window_end": trading_range[1],
+                    "symbols": batch
+                })
+            window_start = window_end + timedelta(days=1)
+        return chunks
+
+    def register(self, chunks):
+        """Ghi các chunk vào DB. Chunk đã tồn tại (chạy lại cùng backfill_id) được giữ nguyên"""
+        conn = self._get_conn()
+        if not conn: return False
+        try:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT IGNORE INTO backfill_chunk (backfill_id, chunk_no, window_start, window_end, symbols)
+                VALUES (%s, %s, %s, %s, %s)
+            """, [
+                (self.backfill_id, c["chunk_no"], c["window_start"], c["window_end"], json.dumps(c["symbols"]))
+                for c in chunks
+            ])
+            conn.commit()
+            return True
+        finally:
+            conn.close()
+
+    def pending_chunks(self):
+        conn = self._get_conn()
+        if not conn: return []
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT * FROM backfill_chunk
+                WHERE backfill_id = %s AND status <> 'DONE'
+                ORDER BY chunk_no
+            """, (self.backfill_id,))
+            return cursor.fetchall()
+        finally:
+            conn.close()
+
+    def _update_chunk(self, chunk_id, status, id_config=None, rows_saved=0):
+        conn = self._get_conn()
+        if not conn: return
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE backfill_chunk
+                SET status = %s, id_config = COALESCE(%s, id_config), rows_saved = %s, checkpoint_at = NOW()
+                WHERE id = %s
+            """, (status, id_config, rows_saved, chunk_id))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _abandon_previous_attempt(self, chunk):
+        """Chunk bị crash giữa chừng: đóng config cũ để không bị kẹt ở trạng thái CRAWLING"""
+        if not chunk["id_config"]:
+            return
+        conn = self._get_conn()
+        if not conn: return
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE config SET status = 'ERR', is_processing = FALSE, flag = 0
+                WHERE id = %s AND status IN ('READY', 'CRAWLING')
+            """, (chunk["id_config"],))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def run_chunk(self, chunk):
+        self._abandon_previous_attempt(chunk)
+        output_path = os.path.join(
+            DEFAULT_CSV_PATH, "backfill", self.backfill_id, f"chunk_{chunk['chunk_no']:04d}"
+        )
+        job = CrawlJob(
+            self.db_config,
+            manual_start=chunk["window_start"].strftime(DATE_FORMAT),
+            manual_end=chunk["window_end"].strftime(DATE_FORMAT),
+            workers=self.workers,
+            cache=self.cache,
+            symbols=json.loads(chunk["symbols"]),
+            output_path=output_path
+        )
+        if not job.setup_config():
+            # Chunk không có ngày giao dịch nào là no-op, không phải lỗi
+            status = 'DONE' if job.final_status == 'SKIPPED' else 'ERR'
+            self._update_chunk(chunk["id"], status, id_config=job.config_id)
+            return status == 'DONE'
+        self._update_chunk(chunk["id"], 'RUNNING', id_config=job.config_id)
+        if job.start_processing():
+            try:
+                job.execute_crawl()
+            finally:
+                job.finalize_job()
+
+        # Checkpoint: chỉ chunk đã lưu file thành công mới được đánh dấu DONE
+        status = 'DONE' if job.final_status == 'CRAWLED' else 'ERR'
+        self._update_chunk(chunk["id"], status, rows_saved=job.total_rows_saved)
+        print(f"Chunk {chunk['chunk_no']} ({chunk['window_start']} -> {chunk['window_end']}): {status}")
+        return status == 'DONE'
+
+    def run(self, parallel=BACKFILL_PARALLEL):
+        chunks = self.pending_chunks()
+        if not chunks:
+            print(f"Backfill {self.backfill_id}: nothing left to do.")
+            return True
+        print(f"Backfill {self.backfill_id}: {len(chunks)} chunks pending, running {parallel} in parallel")
+        with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+            results = list(executor.map(self.run_chunk, chunks))
+        done = sum(results)
+        print(f"Backfill {self.backfill_id}: {done}/{len(chunks)} chunks done")
+        return done == len(chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a resumable historical backfill")
+    parser.add_argument('--start', type=str, required=True, help='Start Date (YYYY-MM-DD)')
+    parser.add_argument('--end', type=str, required=True, help='End Date (YYYY-MM-DD)')
+    parser.add_argument('--id', type=str, default=None,
+                        help='Backfill ID. Re-running with the same ID resumes unfinished chunks')
+    parser.add_argument('--window-days', type=int, default=BACKFILL_WINDOW_DAYS)
+    parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE)
+    parser.add_argument('--parallel', type=int, default=BACKFILL_PARALLEL, help='Chunks to run in parallel')
+    parser.add_argument('--workers', type=int, default=CRAWL_WORKERS, help='Crawl workers per chunk')
+    args = parser.parse_args()
+
+    start_date = datetime.strptime(args.start, DATE_FORMAT).date()
+    end_date = datetime.strptime(args.end, DATE_FORMAT).date()
+    backfill_id = args.id or f"bf_{start_date:%Y%m%d}_{end_date:%Y%m%d}"
+
+    cache = ResponseCache(CACHE_DIR, CACHE_TTL_SECONDS, CACHE_MAX_BYTES)
+    planner = BackfillPlanner(DB_CONFIG, backfill_id, workers=args.workers, cache=cache)
+    if not planner.ensure_table():
+        return
+
+    symbols = CrawlJob(DB_CONFIG).load_symbols()
+    chunks = planner.plan(start_date, end_date, symbols, args.window_days, args.batch_size)
+    if planner.register(chunks):
+        pool = SessionPool(HTTP_POOL_SIZE)
+        with pool:
+            planner.run(parallel=args.parallel)
+        print(pool.report())
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
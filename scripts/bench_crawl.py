@@ -0,0 +1,58 @@
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import crawl_data
+from crawl_data import CrawlJob, DB_CONFIG, DATE_FORMAT, TODAY_DATE
+from rate_limiter import TokenBucket
+from sources import ReplaySource
+
+
+def run_once(source, symbols, workers, start, end, output_path):
+    """Chạy execute_crawl trên dữ liệu replay, không cần DB controller"""
+    job = CrawlJob(DB_CONFIG, workers=workers, symbols=symbols, output_path=output_path, source=source)
+    job.job_config = {
+        'data_date_start': datetime.strptime(start, DATE_FORMAT),
+        'data_date_end': datetime.strptime(end, DATE_FORMAT),
+        'path': output_path
+    }
+    started = time.perf_counter()
+    job.execute_crawl()
+    job.writer.close()
+    elapsed = time.perf_counter() - started
+    return job, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline crawl benchmark on recorded responses")
+    parser.add_argument('--fixtures-dir', type=str, default=os.path.join(crawl_data.CURRENT_DIR, 'fixtures'))
+    parser.add_argument('--start', type=str, default=TODAY_DATE, help='Date range used when recording')
+    parser.add_argument('--end', type=str, default=TODAY_DATE)
+    parser.add_argument('--workers', type=str, default='1,2,4,8', help='Comma separated worker counts')
+    parser.add_argument('--latency-ms', type=float, default=100.0, help='Simulated latency per call')
+    parser.add_argument('--recorded-latency', action='store_true', help='Replay the latency seen when recording')
+    parser.add_argument('--rate-limit', action='store_true', help='Keep the per-source rate limits')
+    args = parser.parse_args()
+
+    source = ReplaySource(args.fixtures_dir, latency=args.latency_ms / 1000,
+                          use_recorded_latency=args.recorded_latency)
+    symbols = source.symbols()
+    if not symbols:
+        print(f"No fixtures in {args.fixtures_dir}. Record some with: crawl_data.py --source record")
+        return
+    if not args.rate_limit:
+        for name in crawl_data.SOURCE_LIMITERS:
+            crawl_data.SOURCE_LIMITERS[name] = TokenBucket(0)
+
+    print(f"Replaying {len(symbols)} symbols, {args.start} -> {args.end}")
+    for workers in [int(w) for w in args.workers.split(',')]:
+        with tempfile.TemporaryDirectory() as tmp:
+            job, elapsed = run_once(source, symbols, workers, args.start, args.end, tmp)
+        print(f"workers={workers:<3} {elapsed:8.2f}s  {len(symbols) / elapsed:7.1f} symbols/s  "
+              f"ok={job.success_count} err={job.error_count} rows={job.writer.total_rows}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from crawl_writer import make_writer
+
+
+def synthetic_prices(symbols, days):
+    """Sinh dữ liệu giá giả lập giống output của Quote.history"""
+    frames = []
+    dates = pd.bdate_range("2015-01-01", periods=days)
+    rng = np.random.default_rng(42)
+    for i in range(symbols):
+        close = 10000 + rng.standard_normal(days).cumsum() * 100
+        frames.append(pd.DataFrame({
+            "time": dates,
+            "open": close * 0.99,
+            "high": close * 1.01,
+            "low": close * 0.98,
+            "close": close,
+            "volume": rng.integers(1_000, 5_000_000, days),
+            "symbol": f"S{i:04d}"
+        }))
+    return frames
+
+
+def run(output_format, frames, path):
+    writer = make_writer(output_format, path, "2024-01-01")
+    started = time.perf_counter()
+    for df in frames:
+        writer.write("price_history", df)
+    writer.close()
+    write_time = time.perf_counter() - started
+
+    target = writer.file_path("price_history")
+    if os.path.isdir(target):
+        size = sum(os.path.getsize(os.path.join(target, f)) for f in os.listdir(target))
+    else:
+        size = os.path.getsize(target)
+
+    started = time.perf_counter()
+    df = pd.read_parquet(target) if output_format == "parquet" else pd.read_csv(target)
+    read_time = time.perf_counter() - started
+
+    expected = frames[0].dtypes
+    matched = sum(1 for col in expected.index if col in df.columns and df[col].dtype.kind == expected[col].kind)
+    return {
+        "format": output_format,
+        "rows": len(df),
+        "size_mb": size / 1024 / 1024,
+        "write_s": write_time,
+        "read_s": read_time,
+        "dtypes_kept": f"{matched}/{len(expected)}"
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare CSV and Parquet crawl output")
+    parser.add_argument('--symbols', type=int, default=200)
+    parser.add_argument('--days', type=int, default=1000)
+    args = parser.parse_args()
+
+    frames = synthetic_prices(args.symbols, args.days)
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [run(fmt, frames, os.path.join(tmp, fmt)) for fmt in ("csv", "parquet")]
+    print(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import resource
+import tempfile
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from crawl_writer import IntradayParquetWriter
+from intraday import iter_intraday_rows
+from trading_calendar import get_calendar
+
+# Phiên giao dịch HOSE: 9:00 - 11:30 và 13:00 - 14:45
+SESSIONS = [("09:00", "11:29"), ("13:00", "14:44")]
+BAR_MINUTES = {"1m": 1, "5m": 5}
+
+
+def synthetic_bars(symbol, days, interval, rng):
+    """Sinh nến giả lập giống output của Quote.history(interval='1m'/'5m') cho một mã"""
+    times = pd.DatetimeIndex([])
+    for day in days:
+        for start, end in SESSIONS:
+            times = times.append(pd.date_range(f"{day} {start}", f"{day} {end}", freq=f"{BAR_MINUTES[interval]}min"))
+    close = 50 + rng.standard_normal(len(times)).cumsum() * 0.05
+    return pd.DataFrame({
+        "time": times,
+        "open": close * 0.999,
+        "high": close * 1.002,
+        "low": close * 0.998,
+        "close": close,
+        "volume": rng.integers(100, 50_000, len(times)),
+        "symbol": symbol
+    })
+
+
+def peak_rss_mb():
+    # Linux trả về KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Intraday write/read throughput benchmark")
+    parser.add_argument('--symbols', type=int, default=100)
+    parser.add_argument('--days', type=int, default=5, help='Trading days per symbol')
+    parser.add_argument('--intervals', type=str, default='1m,5m')
+    args = parser.parse_args()
+
+    intervals = args.intervals.split(',')
+    days = get_calendar().trading_days(date(2025, 1, 1), date(2025, 12, 31))[:args.days]
+    rng = np.random.default_rng(42)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = IntradayParquetWriter(tmp, days[-1].isoformat())
+        write_time = 0.0
+        # Sinh và ghi từng mã một, giống luồng crawl: chỉ một DataFrame trong bộ nhớ
+        for i in range(args.symbols):
+            for interval in intervals:
+                df = synthetic_bars(f"S{i:04d}", days, interval, rng)
+                started = time.perf_counter()
+                writer.write(interval, df)
+                write_time += time.perf_counter() - started
+        rows = writer.total_rows
+
+        company_ids = {f"S{i:04d}": i + 1 for i in range(args.symbols)}
+        started = time.perf_counter()
+        read_rows = sum(len(batch) for batch in iter_intraday_rows(tmp, days[0], days[-1], company_ids))
+        read_time = time.perf_counter() - started
+
+    print(f"{args.symbols} symbols x {len(days)} days, intervals {args.intervals}: {rows} rows, "
+          f"{writer.files} files")
+    print(f"write : {write_time:7.2f}s  {rows / write_time:10.0f} rows/s  "
+          f"{writer.bytes / 1024 / 1024:7.1f} MB  {writer.bytes / rows:5.1f} bytes/row")
+    print(f"read  : {read_time:7.2f}s  {read_rows / read_time:10.0f} rows/s (Parquet -> INSERT tuples)")
+    print(f"peak RSS: {peak_rss_mb():.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""So sánh đường staging hiện tại (JSON thô) với payload nén: số byte qua mạng và thời gian staging end-to-end.
+
+    python bench_staging.py [--symbols 400 --days 250] [--codecs none,zlib,zstd] [--mbps 100]
+    python bench_staging.py --path <thư mục crawl> --date YYYY-MM-DD    # dùng file crawl thật
+    python bench_staging.py --db    # INSERT/SELECT thật vào bảng tạm trong Staging DB, đo Bytes_received/Bytes_sent
+    python bench_staging.py --engine python    # transform bằng ods_engine.py thay cho Parse_JSON_To_ODS
+
+Đo cả chiều transform: với --engine procedure, payload nén được transform đọc về, giải nén rồi INSERT lại
+JSON thô vào staging_raw_data (3 lần qua mạng), còn codec none ở chế độ row chỉ qua mạng 1 lần vì
+Parse_JSON_To_ODS đọc staging_raw_data ngay trên server. Engine python đọc payload về (2 lần, không INSERT lại).
+Không có --db thì thời gian truyền được ước lượng từ số byte và băng thông --mbps.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+import mysql.connector
+import numpy as np
+import pandas as pd
+
+from load_staging import DATASET_COLUMNS, STAGING_DB_CONFIG, plan_symbol_chunks, read_dataset, split_into_chunks
+from manifest import dataset_files
+from staging_codec import available_codecs, compress_payload, decompress_payload
+from trading_calendar import get_calendar
+
+
+def synthetic_frames(symbols, days, rng):
+    """price_history + finance_ratio giả lập, cùng các cột mà crawl_data.py ghi ra"""
+    trading_days = [d.isoformat() for d in get_calendar().trading_days(date(2024, 1, 1), date(2025, 12, 31))[-days:]]
+    prices, ratios = [], []
+    for i in range(symbols):
+        symbol = f"S{i:04d}"
+        close = np.round(20 + rng.standard_normal(len(trading_days)).cumsum() * 0.3, 2)
+        prices.append(pd.DataFrame({
+            "time": trading_days, "open": close, "high": close + 0.2, "low": close - 0.2, "close": close,
+            "volume": rng.integers(1_000, 5_000_000, len(trading_days)), "symbol": symbol
+        }))
+        ratios.append(pd.DataFrame({
+            "CP": symbol, "Năm": np.repeat([2022, 2023, 2024], 4), "Kỳ": np.tile([1, 2, 3, 4], 3),
+            "P/E": np.round(rng.uniform(5, 30, 12), 2), "P/B": np.round(rng.uniform(0.5, 5, 12), 2),
+            "ROE (%)": np.round(rng.uniform(0, 0.3, 12), 4), "EPS (VND)": np.round(rng.uniform(500, 8000, 12), 0)
+        }))
+    return {"price_history_data": pd.concat(prices, ignore_index=True),
+            "finance_ratio_data": pd.concat(ratios, ignore_index=True)}
+
+
+def crawled_frames(path, date_tag):
+    frames = {}
+    for col, dataset in DATASET_COLUMNS.items():
+        file_format, files = dataset_files(path, dataset, date_tag)
+        if files:
+            # Parquet được đọc theo thư mục partition, CSV là một file
+            frames[col] = read_dataset(col, files[0] if file_format == "csv" else os.path.dirname(files[0]),
+                                       file_format)
+    return frames
+
+
+def session_bytes(cursor):
+    cursor.execute("SHOW SESSION STATUS WHERE Variable_name IN ('Bytes_received', 'Bytes_sent')")
+    return {name: int(value) for name, value in cursor.fetchall()}
+
+
+def staging_path(engine, codec):
+    """Các lượt payload qua mạng giữa client và Staging DB: 'stage' (load_staging gửi lên),
+    'fetch' (transform đọc về), 'restage' (transform INSERT lại JSON thô cho Parse_JSON_To_ODS)"""
+    if engine == "python":
+        return ("stage", "fetch")
+    return ("stage",) if codec == "none" else ("stage", "fetch", "restage")
+
+
+def db_round_trip(conn, rows, steps):
+    """Chạy các lượt của staging_path trên bảng tạm; trả về (giây, số byte JSON đã giải nén, byte qua mạng)"""
+    cursor = conn.cursor()
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS bench_staging_chunk")
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS bench_staging_raw")
+    cursor.execute("""
+        CREATE TEMPORARY TABLE bench_staging_chunk (
+            dataset VARCHAR(64), chunk_index INT, codec VARCHAR(16), payload LONGBLOB
+        )
+    """)
+    cursor.execute("CREATE TEMPORARY TABLE bench_staging_raw (payload LONGTEXT)")
+    before = session_bytes(cursor)
+    started = time.perf_counter()
+    for row in rows:
+        cursor.execute("INSERT INTO bench_staging_chunk VALUES (%s, %s, %s, %s)", row)
+    conn.commit()
+    fetched = [(row[2], row[3]) for row in rows]
+    if "fetch" in steps:
+        cursor.execute("SELECT codec, payload FROM bench_staging_chunk")
+        fetched = cursor.fetchall()
+    decoded = [decompress_payload(payload, codec) for codec, payload in fetched]
+    if "restage" in steps:
+        for payload in decoded:
+            cursor.execute("INSERT INTO bench_staging_raw VALUES (%s)", (payload,))
+        conn.commit()
+    elapsed = time.perf_counter() - started
+    after = session_bytes(cursor)
+    cursor.close()
+    # Phía server: Bytes_received = client gửi lên, Bytes_sent = server trả về
+    wire = (after['Bytes_received'] - before['Bytes_received']) + (after['Bytes_sent'] - before['Bytes_sent'])
+    return elapsed, sum(len(payload) for payload in decoded), wire
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Staging payload compression benchmark")
+    parser.add_argument('--symbols', type=int, default=400)
+    parser.add_argument('--days', type=int, default=250, help='Trading days of price history per symbol')
+    parser.add_argument('--path', type=str, default=None, help='Crawl output folder (use real files)')
+    parser.add_argument('--date', type=str, default=None, help='Data date of the crawl files (YYYY-MM-DD)')
+    parser.add_argument('--chunk-rows', type=int, default=sys.maxsize,
+                        help='Records per chunk (default: one chunk, like row mode)')
+    parser.add_argument('--codecs', type=str, default=','.join(available_codecs()))
+    parser.add_argument('--mbps', type=float, default=100, help='Link bandwidth used to estimate transfer time')
+    parser.add_argument('--db', action='store_true', help='Round-trip the payloads through the staging DB')
+    parser.add_argument('--engine', choices=['procedure', 'python'], default='procedure',
+                        help='Transform engine: decides whether payloads are fetched and re-inserted as JSON')
+    args = parser.parse_args()
+
+    if args.path:
+        frames = crawled_frames(args.path, args.date)
+    else:
+        frames = synthetic_frames(args.symbols, args.days, np.random.default_rng(42))
+    records = sum(len(df) for df in frames.values())
+
+    started = time.perf_counter()
+    chunks = list(split_into_chunks(frames, plan_symbol_chunks(frames, args.chunk_rows)))
+    serialize_time = time.perf_counter() - started
+    raw_bytes = sum(len(payload.encode('utf-8')) for *_, payload in chunks)
+    print(f"{len(frames)} datasets, {records} records, {len(chunks)} chunks, JSON {raw_bytes / 1024 / 1024:.1f} MB, "
+          f"to_json {serialize_time:.2f}s")
+
+    conn = mysql.connector.connect(**STAGING_DB_CONFIG) if args.db else None
+    baseline = None
+    try:
+        print(f"engine {args.engine}")
+        print(f"{'codec':6} {'path':23} {'wire MB':>8} {'ratio':>6} {'compress':>9} {'transfer':>9} "
+              f"{'decompress':>10} {'end-to-end':>10} {'speedup':>7}")
+        baseline_bytes = None
+        for codec in [c.strip() for c in args.codecs.split(',') if c.strip()]:
+            steps = staging_path(args.engine, codec)
+            started = time.perf_counter()
+            rows = [(col, idx, codec, compress_payload(payload, codec)) for col, idx, _, _, payload in chunks]
+            compress_time = time.perf_counter() - started
+
+            decompress_time = 0.0
+            if conn:
+                # Thời gian giải nén nằm trong round trip
+                transfer_time, decoded, wire_bytes = db_round_trip(conn, rows, steps)
+            else:
+                sent = sum(len(row[3]) for row in rows)
+                wire_bytes = sent * (("fetch" in steps) + 1) + (raw_bytes if "restage" in steps else 0)
+                transfer_time = wire_bytes * 8 / (args.mbps * 1_000_000)
+                started = time.perf_counter()
+                decoded = sum(len(decompress_payload(row[3], codec)) for row in rows)
+                decompress_time = time.perf_counter() - started
+            assert decoded == sum(len(payload) for *_, payload in chunks), f"{codec}: payload mismatch"
+
+            total = serialize_time + compress_time + transfer_time + decompress_time
+            baseline = baseline or total
+            baseline_bytes = baseline_bytes or wire_bytes
+            print(f"{codec:6} {' + '.join(steps):23} {wire_bytes / 1024 / 1024:8.1f} "
+                  f"{wire_bytes / baseline_bytes:6.1%} {compress_time:8.2f}s {transfer_time:8.2f}s "
+                  f"{decompress_time:9.2f}s {total:9.2f}s {baseline / total:6.2f}x")
+    finally:
+        if conn:
+            conn.close()
+    if not args.db:
+        print(f"transfer = wire bytes of every step in 'path' at {args.mbps:g} Mbit/s; ratio is vs the first codec")
+
+
+if __name__ == "__main__":
+    main()
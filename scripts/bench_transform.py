@@ -0,0 +1,116 @@
+"""So sánh engine transform Python (ods_engine.py) với Parse_JSON_To_ODS trên payload giả lập tăng dần.
+
+    python bench_transform.py [--sizes 50,100,200,400,800] [--days 250]
+    python bench_transform.py --db    # chạy cả procedure và bulk insert thật
+
+--db ghi đè staging_raw_data và các bảng ODS: chỉ chạy trên DB dev.
+"""
+import argparse
+import json
+import time
+
+import mysql.connector
+import numpy as np
+import pandas as pd
+
+from bench_staging import synthetic_frames
+from load_staging import records_json
+from ods_engine import build_ods_frames, load_ods
+from transform_data import ODS_DB_CONFIG, STAGING_COLUMNS, STAGING_DB_CONFIG
+
+EXCHANGES = ["HSX", "HNX", "UPCOM"]
+INDUSTRIES = ["Ngân hàng", "Bất động sản", "Thép", "Bán lẻ", "Dầu khí"]
+
+
+def synthetic_payloads(symbols, days, rng):
+    """5 payload JSON như một dòng staging_raw_data"""
+    frames = synthetic_frames(symbols, days, rng)
+    names = [f"S{i:04d}" for i in range(symbols)]
+    frames["listing_exchange_data"] = pd.DataFrame({
+        "symbol": names, "exchange": rng.choice(EXCHANGES, symbols), "type": "STOCK",
+        "organ_name": [f"Công ty Cổ phần {name}" for name in names]
+    })
+    frames["listing_industries_data"] = pd.DataFrame({
+        "symbol": names, "organ_name": [f"Công ty Cổ phần {name}" for name in names],
+        "icb_name3": rng.choice(INDUSTRIES, symbols), "com_type_code": "CT"
+    })
+    frames["company_overview_data"] = pd.DataFrame({
+        "symbol": names, "issue_share": rng.integers(10_000_000, 5_000_000_000, symbols),
+        "company_profile": [f"Hồ sơ doanh nghiệp {name}. " * 20 for name in names]
+    })
+    return {col: records_json(frames[col]) for col in STAGING_COLUMNS}, names
+
+
+def stage_payloads(payloads):
+    conn = mysql.connector.connect(**STAGING_DB_CONFIG)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("TRUNCATE TABLE staging_raw_data")
+        placeholders = ', '.join(['%s'] * len(STAGING_COLUMNS))
+        cursor.execute(
+            f"INSERT INTO staging_raw_data ({', '.join(STAGING_COLUMNS)}) VALUES ({placeholders})",
+            [payloads[col] for col in STAGING_COLUMNS]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run_procedure(symbols):
+    conn = mysql.connector.connect(**ODS_DB_CONFIG)
+    try:
+        started = time.perf_counter()
+        conn.cursor().callproc('Parse_JSON_To_ODS', [json.dumps(symbols)])
+        conn.commit()
+        return time.perf_counter() - started
+    finally:
+        conn.close()
+
+
+def run_python_insert(ods_frames):
+    conn = mysql.connector.connect(**ODS_DB_CONFIG)
+    try:
+        started = time.perf_counter()
+        load_ods(conn, ods_frames)
+        return time.perf_counter() - started
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Python ODS engine vs Parse_JSON_To_ODS benchmark")
+    parser.add_argument('--sizes', type=str, default='50,100,200,400,800', help='Symbol counts to test')
+    parser.add_argument('--days', type=int, default=250, help='Trading days of price history per symbol')
+    parser.add_argument('--db', action='store_true', help='Also run the procedure and the real bulk insert')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"{'symbols':>7} {'records':>9} {'JSON MB':>8} {'py parse':>9} {'py insert':>9} {'py total':>9} "
+          f"{'procedure':>9} {'speedup':>7}")
+    for size in [int(s) for s in args.sizes.split(',') if s.strip()]:
+        payloads, symbols = synthetic_payloads(size, args.days, rng)
+        json_mb = sum(len(p.encode('utf-8')) for p in payloads.values()) / 1024 / 1024
+
+        started = time.perf_counter()
+        ods_frames = build_ods_frames(payloads, symbols)
+        parse_time = time.perf_counter() - started
+        records = sum(len(df) for df in ods_frames.values())
+
+        insert_time = procedure_time = None
+        if args.db:
+            insert_time = run_python_insert(ods_frames)
+            stage_payloads(payloads)
+            procedure_time = run_procedure(symbols)
+
+        python_time = parse_time + (insert_time or 0)
+        print(f"{size:7d} {records:9d} {json_mb:8.1f} {parse_time:8.2f}s "
+              + (f"{insert_time:8.2f}s " if insert_time is not None else f"{'-':>9} ")
+              + f"{python_time:8.2f}s "
+              + (f"{procedure_time:8.2f}s {procedure_time / python_time:6.2f}x" if procedure_time is not None
+                 else f"{'-':>9} {'-':>7}"))
+    if not args.db:
+        print("Only the Python parse step was timed; run with --db to time the insert and the stored procedure.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,23 @@
-import pandas as pd
 import mysql.connector
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 import sys
+import time
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from vnstock import Finance, Vnstock, Listing, Quote
+from rate_limiter import TokenBucket
+from response_cache import ResponseCache
+from crawl_writer import make_writer
+from http_pool import SessionPool
+from job_logger import get_job_logger
+from retry_queue import RetryQueue
+from crawl_metrics import CallMetrics, payload_size
+from sources import VnstockSource, make_source
+from trading_calendar import get_calendar
+from date_utils import parse_date_id
+from manifest import write_manifest
+from symbol_registry import active_symbols, record_job_symbols
 
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 load_dotenv()
@@ -18,11 +30,22 @@ DB_CONFIG = {
     "database": os.getenv("DB_NAME_CONTROLLER")
 }
 
+# DWH thật: nơi đọc watermark (date_id lớn nhất đã load) cho chế độ incremental
+DWH_CONFIG = {
+    "host": os.getenv("DB_HOST_DW"),
+    "port": os.getenv("DB_PORT_DW"),
+    "user": os.getenv("DB_USER_DW"),
+    "password": os.getenv("DB_PASS_DW"),
+    "database": "dwh_production"
+}
+
 # Bước 14: lấy path để lưu trữ các file csv
 DEFAULT_CSV_PATH = os.getenv(
     CURRENT_DIR,
     "csv_output"
 )
+# Định dạng file output: csv (mặc định) hoặc parquet
+OUTPUT_FORMAT = os.getenv("CRAWL_OUTPUT_FORMAT", "csv")
 # Bước 8: lấy toàn bộ danh sách các công ty cần theo dõi
 SYMBOL_FILE = os.getenv(
     CURRENT_DIR,
@@ -32,23 +55,81 @@ SYMBOL_FILE = os.getenv(
 TODAY_DATE = datetime.now().strftime('%Y-%m-%d')
 DATE_FORMAT = '%Y-%m-%d'
 
+# Số luồng crawl song song (1 = chạy tuần tự như cũ)
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "1"))
+# Giới hạn tốc độ riêng cho từng nguồn: (số request / giây, burst)
+SOURCE_RATE_LIMITS = {
+    "TCBS": (float(os.getenv("RATE_LIMIT_TCBS", "4")), int(os.getenv("RATE_BURST_TCBS", "4"))),
+    "VCI": (float(os.getenv("RATE_LIMIT_VCI", "4")), int(os.getenv("RATE_BURST_VCI", "4"))),
+}
+# Cache trên đĩa cho các endpoint ít thay đổi (Quote.history không bao giờ được cache)
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(CURRENT_DIR, ".cache"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_MB", "256")) * 1024 * 1024
+CACHE_TTL_SECONDS = {
+    "overview": float(os.getenv("CACHE_TTL_OVERVIEW_HOURS", "168")) * 3600,
+    "ratio": float(os.getenv("CACHE_TTL_RATIO_HOURS", "720")) * 3600,
+    "symbols_by_exchange": float(os.getenv("CACHE_TTL_EXCHANGE_HOURS", "24")) * 3600,
+    "symbols_by_industries": float(os.getenv("CACHE_TTL_INDUSTRIES_HOURS", "168")) * 3600,
+}
+# Endpoint gọi cho từng mã -> dataset (tiền tố file) tương ứng, theo thứ tự gọi
+ENDPOINT_DATASETS = {
+    'overview': 'company_overview',
+    'ratio': 'finance_ratio',
+    'history': 'price_history',
+}
+# Số kết nối keep-alive tối đa giữ lại cho mỗi host / luồng
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+# Số ngày lấy lùi lại cho mã chưa có dữ liệu trong DWH (chế độ incremental)
+INCREMENTAL_INITIAL_DAYS = int(os.getenv("INCREMENTAL_INITIAL_DAYS", "30"))
+# Thời gian tối đa (phút) cho lượt crawl, hết giờ thì các mã còn lại được dời sang lần chạy sau (0 = không giới hạn)
+CRAWL_DEADLINE_MINUTES = float(os.getenv("CRAWL_DEADLINE_MINUTES", "0"))
+# Dùng chung cho mọi job trong cùng process để tổng tốc độ không vượt giới hạn
+SOURCE_LIMITERS = {
+    source: TokenBucket(rate, burst) for source, (rate, burst) in SOURCE_RATE_LIMITS.items()
+}
+
 
 class CrawlJob:
-    def __init__(self, db_config, manual_start=None, manual_end=None):
+    def __init__(self, db_config, manual_start=None, manual_end=None, workers=CRAWL_WORKERS, cache=None,
+                 incremental=False, symbols=None, output_path=None, output_format=OUTPUT_FORMAT, source=None,
+                 deadline_minutes=CRAWL_DEADLINE_MINUTES):
         self.db_config = db_config
         self.manual_start = manual_start
         self.manual_end = manual_end
+        self.workers = max(1, workers)
+        self.cache = cache
+        self.incremental = incremental
+        # symbols/output_path: cho phép chạy trên một tập mã và thư mục riêng (vd: backfill theo chunk)
+        self.symbols = symbols
+        self.output_path = output_path or DEFAULT_CSV_PATH
+        self.output_format = output_format
+        # Ngày bắt đầu riêng cho từng mã (chế độ incremental), None = đã đủ dữ liệu
+        self.symbol_start_dates = {}
 
         self.conn = None
+        self.logger = get_job_logger(db_config)
         self.config_id = None
         self.job_config = None
-        self.crawled_data_price = []
-        self.crawled_data_overview = []
-        self.crawled_data_ratio = []
-        self.data_listing_exchange = None
-        self.data_listing_industries = None
+        # Kết quả được ghi thẳng ra file qua writer, không tích lũy trong bộ nhớ
+        self.writer = None
+        # Nguồn dữ liệu: vnstock thật, hoặc record/replay để benchmark offline (xem sources.py)
+        self.source = source or VnstockSource()
         self.error_count = 0
         self.success_count = 0
+        self.final_status = None
+        self.total_rows_saved = 0
+        # Các lệnh gọi lỗi theo (mã, endpoint), được thử lại sau lượt chính
+        self.retry_queue = RetryQueue()
+        # Thời gian, số dòng, dung lượng của từng lệnh gọi API
+        self.metrics = CallMetrics()
+        # Snapshot listing (exchange, industries), chỉ tải một lần cho mỗi job
+        self.listing = None
+        # Hạn chót của lượt crawl (time.monotonic), các mã chưa kịp crawl nằm trong self.deferred
+        self.deadline_minutes = deadline_minutes
+        self.deadline_at = None
+        self.deferred = []
+        # Lịch giao dịch: bỏ thứ 7, chủ nhật và ngày nghỉ lễ trước khi gọi API
+        self.calendar = get_calendar()
 
     def _get_db_connection(self):
         try:
@@ -69,17 +150,8 @@ class CrawlJob:
         if not self.config_id:
             print(f"[LOGGING FAILED] Status: {status}, Desc: {description}", file=sys.stderr)
             return
-        conn = self._get_db_connection()
-        if not conn: return
-        try:
-            cursor = conn.cursor()
-            query = "INSERT INTO logging (id_config, status, description) VALUES (%s, %s, %s)"
-            cursor.execute(query, (self.config_id, status, description))
-            conn.commit()
-            cursor.close()
-        except mysql.connector.Error as err:
-            print(f"Error inserting log: {err}")
-            conn.rollback()
+        # Log được gom lại và ghi theo lô (xem job_logger.py)
+        self.logger.log(self.config_id, status, description)
 
     # Bước 3 thử kết nối tới db nếu không kết nối thành công thì kết thúc chương trình
     def setup_config(self):
@@ -93,18 +165,28 @@ class CrawlJob:
                 print(f"👉 RUNNING MANUAL MODE: {self.manual_start} to {self.manual_end}")
                 start_dt = datetime.strptime(self.manual_start, DATE_FORMAT)
                 end_dt = datetime.strptime(self.manual_end, DATE_FORMAT)
+            elif self.incremental:
+                print(f"👉 RUNNING INCREMENTAL MODE: up to {TODAY_DATE}")
+                end_dt = datetime.strptime(TODAY_DATE, DATE_FORMAT)
+                start_dt = self.plan_incremental(end_dt.date())
             else:
                 print(f"👉 RUNNING DEFAULT MODE: Today ({TODAY_DATE})")
                 start_dt = datetime.strptime(TODAY_DATE, DATE_FORMAT)
                 end_dt = datetime.strptime(TODAY_DATE, DATE_FORMAT)
 
+            trading_range = self.calendar.clip(start_dt, end_dt)
+            if trading_range is None:
+                return self._skip_non_trading(cursor, start_dt, end_dt)
+            # Thu hẹp khoảng ngày về ngày giao dịch đầu / cuối
+            start_dt, end_dt = (datetime.combine(d, datetime.min.time()) for d in trading_range)
+
             # Bước 4 insert dòng conflig đầu để bắt đầu chu trình
             # insert với status =  READY và flag = 1
             insert_query = """
                 INSERT INTO config (status, flag, is_processing, path, data_date_start, data_date_end)
                 VALUES (%s, %s, %s, %s, %s, %s)
             """
-            cursor.execute(insert_query, ('READY', 1, False, DEFAULT_CSV_PATH, start_dt, end_dt))
+            cursor.execute(insert_query, ('READY', 1, False, self.output_path, start_dt, end_dt))
             self.config_id = cursor.lastrowid
             conn.commit()
             print(f"Job Setup Complete. Config ID: {self.config_id}")
@@ -118,6 +200,76 @@ class CrawlJob:
             return False
         finally:
             cursor.close()
+
+    def _skip_non_trading(self, cursor, start_dt, end_dt):
+        """Khoảng ngày không có phiên giao dịch nào: ghi nhận job no-op (SKIPPED) thay vì crawl rồi báo lỗi"""
+        cursor.execute("""
+            INSERT INTO config (status, flag, is_processing, path, data_date_start, data_date_end)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, ('SKIPPED', 0, False, self.output_path, start_dt, end_dt))
+        self.config_id = cursor.lastrowid
+        message = f"No trading days between {start_dt:%Y-%m-%d} and {end_dt:%Y-%m-%d}, nothing to crawl."
+        self._insert_logging('SKIPPED', message)
+        with self.logger.flush_with(cursor):
+            self.conn.commit()
+        self.final_status = 'SKIPPED'
+        print(f"👉 {message} Job {self.config_id} marked SKIPPED.")
+        return False
+
+    def load_symbols(self):
+        if self.symbols is not None:
+            return self.symbols
+        try:
+            # Ưu tiên bảng symbol_registry, chưa có thì dùng đường dẫn file symbol từ cấu hình
+            self.symbols, source = active_symbols(self.db_config, SYMBOL_FILE)
+            print(f"📋 {len(self.symbols)} mã theo dõi (nguồn: {source}).")
+        except FileNotFoundError:
+            self.symbols = []
+            self._insert_logging('ERR', f"File {SYMBOL_FILE} not found.")
+        return self.symbols
+
+    def _load_watermarks(self):
+        """Đọc date_id lớn nhất đã có trong DWH cho từng mã"""
+        try:
+            conn = mysql.connector.connect(**DWH_CONFIG)
+        except mysql.connector.Error as err:
+            print(f"Watermark lookup failed, falling back to today only: {err}")
+            return None
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT dc.symbol, MAX(f.date_id)
+                FROM fact_price_history f
+                         JOIN dim_company dc ON f.company_id = dc.id
+                GROUP BY dc.symbol
+            """)
+            return {symbol: parse_date_id(date_id) for symbol, date_id in cursor.fetchall() if date_id}
+        except mysql.connector.Error as err:
+            print(f"Watermark lookup failed, falling back to today only: {err}")
+            return None
+        finally:
+            conn.close()
+
+    def plan_incremental(self, end_date):
+        """Tính ngày bắt đầu cho từng mã từ watermark, trả về ngày sớm nhất cần crawl"""
+        symbols = self.load_symbols()
+        watermarks = self._load_watermarks()
+        if watermarks is None:
+            self.symbol_start_dates = {}
+            return datetime.combine(end_date, datetime.min.time())
+
+        initial_start = end_date - timedelta(days=INCREMENTAL_INITIAL_DAYS)
+        for symbol in symbols:
+            last_loaded = watermarks.get(symbol)
+            start = self.calendar.next_trading_day(last_loaded, include=False) if last_loaded else initial_start
+            self.symbol_start_dates[symbol] = start if start <= end_date else None
+
+        pending = [d for d in self.symbol_start_dates.values() if d]
+        up_to_date = len(symbols) - len(pending)
+        print(f"Incremental plan: {len(pending)} symbols behind, {up_to_date} already up to date")
+        earliest = min(pending) if pending else end_date
+        return datetime.combine(earliest, datetime.min.time())
+
     # Bước 5 :Kiểm tra xem đã đã có config nào có tatus =  READY và flag = 1
     # Có thì bắt đầu thực hiện crawl dữ liệu , nếu không thì end
     def start_processing(self):
@@ -159,47 +311,186 @@ class CrawlJob:
         start_date_str = self.job_config['data_date_start'].strftime(DATE_FORMAT)
         end_date_str = self.job_config['data_date_end'].strftime(DATE_FORMAT)
 
+        if self.deadline_minutes and self.deadline_minutes > 0:
+            self.deadline_at = time.monotonic() + self.deadline_minutes * 60
+        symbols = self.load_symbols()
+        # Bước 15. Mở writer: dữ liệu từng mã được ghi ra file (csv/parquet) ngay khi crawl xong
+        self.writer = self._open_writer(end_date_str)
+        self._write_listing()
+        # Chạy lấy dữ liệu của toàn bo cac cong ty can theo doi
+        # Các luồng chỉ gọi API, kết quả được gom theo đúng thứ tự symbol ở luồng chính
+        # nên dữ liệu và bộ đếm giống hệt chế độ tuần tự
+        executor = ThreadPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        map_func = executor.map if executor else map
         try:
-            # Sử dụng đường dẫn file symbol từ cấu hình
-            with open(SYMBOL_FILE, 'r', encoding='utf-8') as f:
-                symbols = [line.strip() for line in f if line.strip()]
-        except FileNotFoundError:
-            symbols = []
-            self._insert_logging('ERR', f"File {SYMBOL_FILE} not found.")
+            if executor:
+                print(f"👉 Crawling {len(symbols)} symbols with {self.workers} workers")
+            for result in map_func(lambda symbol: self._crawl_symbol(symbol, start_date_str, end_date_str), symbols):
+                self._collect_result(*result)
+
+            if self.past_deadline() and len(self.retry_queue):
+                # Hết giờ: không retry nữa, các mã còn lệnh gọi lỗi cũng được dời sang lần chạy sau
+                for symbol in dict.fromkeys(item["symbol"] for item in self.retry_queue.pop_all()):
+                    self.deferred.append(symbol)
+            if self.deferred:
+                self._insert_logging(
+                    'WARN', f"Deadline reached, deferred {len(self.deferred)} symbols to the next run."
+                )
+
+            # Bước 13.1: chỉ gọi lại các cặp (mã, endpoint) bị lỗi, có backoff + jitter
+            failed_calls = len(self.retry_queue)
+            if failed_calls:
+                print(f"👉 Retrying {failed_calls} failed calls")
+                self.retry_queue.drain(
+                    self._retry_call, self._on_retry_success, self._on_retry_failure, map_func=map_func
+                )
+                self._insert_logging(
+                    'INFO', f"Retry recovered {self.retry_queue.recovered}/{failed_calls} failed calls."
+                )
+        finally:
+            if executor:
+                executor.shutdown()
+
+    def _open_writer(self, end_date_str):
+        return make_writer(self.output_format, self.job_config['path'], end_date_str)
 
+    def _write_listing(self):
         try:
-            listing = Listing()
-            self.data_listing_exchange = listing.symbols_by_exchange()
-            self.data_listing_industries = listing.symbols_by_industries()
+            df_exchange, df_industries = self.fetch_listing()
+            self.writer.write("listing_exchange", df_exchange)
+            self.writer.write("listing_industries", df_industries)
             self.success_count += 2
         except Exception as e:
             self._insert_logging('WARN', f"Listing data error (skipped): {e}")
-        # Chạy lấy dữ liệu của toàn bo cac cong ty can theo doi
-        for symbol in symbols:
-            try:
 
-                company_api = Vnstock().stock(symbol=symbol, source='TCBS').company
-                finance_api = Finance(symbol=symbol, source='VCI')
-                quote_api = Quote(symbol=symbol, source='VCI')
-
-                # Bước 9 : load thông tin công ty
-                df_overview = company_api.overview()
-                df_overview['symbol'] = symbol
-                self.crawled_data_overview.append(df_overview)
-                # Bước 10: load chỉ số tài chính
-                df_ratio = finance_api.ratio(period='year', lang='vi', dropna=True)
-                df_ratio['symbol'] = symbol
-                self.crawled_data_ratio.append(df_ratio)
-                # Bước 11: Load chỉ số cổ phiếu trong ngày
-                df_history = quote_api.history(start=start_date_str, end=end_date_str, interval='1D')
-                df_history['symbol'] = symbol
-                self.crawled_data_price.append(df_history)
-
-                self.success_count += 3
+    def fetch_listing(self):
+        """Danh sách mã theo sàn và theo ngành (qua cache)"""
+        if self.listing is None:
+            self.listing = (
+                self._cached('VCI', 'symbols_by_exchange', None, {}, self.source.symbols_by_exchange),
+                self._cached('VCI', 'symbols_by_industries', None, {}, self.source.symbols_by_industries),
+            )
+        return self.listing
+
+    def past_deadline(self):
+        return self.deadline_at is not None and time.monotonic() >= self.deadline_at
+
+    def _call(self, source, endpoint, symbol, func, *args, **kwargs):
+        # Thời gian chờ rate limit không tính vào latency của lệnh gọi
+        SOURCE_LIMITERS[source].acquire()
+        return self.metrics.measure(source, endpoint, symbol, func, *args, **kwargs)
+
+    def _cached(self, source, endpoint, symbol, params, fetch):
+        """Lấy từ cache nếu còn hạn, nếu không thì gọi API (có rate limit) rồi lưu lại"""
+        if self.cache:
+            started = time.perf_counter()
+            value = self.cache.get(source, endpoint, symbol, params)
+            if value is not None:
+                self.metrics.record(source, endpoint, symbol, time.perf_counter() - started,
+                                    len(value), payload_size(value), outcome='cache_hit')
+                return value
+        value = self._call(source, endpoint, symbol, fetch)
+        if self.cache:
+            self.cache.put(source, endpoint, symbol, params, value)
+        return value
+
+    def _history_range(self, symbol, start_date_str, end_date_str):
+        """Khoảng ngày cần lấy giá cho một mã, None nếu mã đã đủ dữ liệu (chế độ incremental)"""
+        if self.incremental and symbol in self.symbol_start_dates:
+            symbol_start = self.symbol_start_dates[symbol]
+            if not symbol_start:
+                return None
+            start_date_str = symbol_start.strftime(DATE_FORMAT)
+        return start_date_str, end_date_str
+
+    def _fetch(self, endpoint, symbol, date_range=None):
+        """Gọi một endpoint cho một mã và gắn cột symbol"""
+        if endpoint == 'overview':
+            # Client chỉ được khởi tạo khi cache miss, cache ấm thì chỉ còn gọi Quote.history
+            df = self._cached('TCBS', 'overview', symbol, {}, lambda: self.source.overview(symbol))
+        elif endpoint == 'ratio':
+            ratio_params = {'period': 'year', 'lang': 'vi', 'dropna': True}
+            df = self._cached(
+                'VCI', 'ratio', symbol, ratio_params,
+                lambda: self.source.ratio(symbol, **ratio_params)
+            )
+        else:
+            start, end = date_range
+            df = self._call(
+                'VCI', 'history', symbol, self.source.history, symbol, start=start, end=end, interval='1D'
+            )
+        df['symbol'] = symbol
+        return df
+
+    def _crawl_symbol(self, symbol, start_date_str, end_date_str):
+        """Gọi 3 API cho một mã, mỗi endpoint độc lập: endpoint lỗi không làm mất kết quả của endpoint khác.
+        Trả về (symbol, {endpoint: DataFrame}, {endpoint: (lỗi, context)}), (symbol, None, None) nếu đã quá hạn chót"""
+        if self.past_deadline():
+            # Hết giờ: bỏ qua mã này, không gọi API
+            return symbol, None, None
+        results, errors = {}, {}
+        # Bước 9 : load thông tin công ty / Bước 10: load chỉ số tài chính / Bước 11: Load giá cổ phiếu
+        for endpoint in ENDPOINT_DATASETS:
+            context = None
+            if endpoint == 'history':
+                context = self._history_range(symbol, start_date_str, end_date_str)
+                if context is None:
+                    continue
+            try:
+                results[endpoint] = self._fetch(endpoint, symbol, context)
             except Exception as e:
-                # Bước 13: Ghi nhận log nếu có lỗi
-                self.error_count += 1
-                self._insert_logging('ERR', f"Error for {symbol}: {e}")
+                errors[endpoint] = (e, context)
+        return symbol, results, errors
+
+    def _collect_result(self, symbol, results, errors):
+        if results is None:
+            self.deferred.append(symbol)
+            return
+        for endpoint, df in results.items():
+            self._write_result(endpoint, df)
+        for endpoint, (error, context) in errors.items():
+            self.retry_queue.add(symbol, endpoint, error, context=context)
+
+    def _retry_call(self, item):
+        return self._fetch(item["endpoint"], item["symbol"], item["context"])
+
+    def _write_result(self, endpoint, df):
+        self.writer.write(ENDPOINT_DATASETS[endpoint], df)
+        self.success_count += 1
+
+    def _on_retry_success(self, item, df):
+        self._write_result(item["endpoint"], df)
+
+    def _on_retry_failure(self, item):
+        # Bước 13: Ghi nhận log nếu vẫn lỗi sau khi đã thử lại
+        self.error_count += 1
+        self._insert_logging(
+            'ERR', f"Error for {item['symbol']} ({item['endpoint']}) after {item['attempts']} attempts: {item['error']}"
+        )
+
+    def _save_metrics(self, conn):
+        """Ghi báo cáo JSON cạnh file dữ liệu và bảng percentile vào DB controller"""
+        for row in self.metrics.summary():
+            print(f"  {row['source']}/{row['endpoint']} [{row['outcome']}]: {row['calls']} calls, "
+                  f"p50 {row['p50_ms']:.0f} ms, p90 {row['p90_ms']:.0f} ms, p99 {row['p99_ms']:.0f} ms")
+        try:
+            self.metrics.write_json(
+                os.path.join(self.writer.path, f"crawl_metrics_{self.writer.date_tag}.json"), self.config_id
+            )
+            self.metrics.save_to_db(conn, self.config_id)
+        except (OSError, mysql.connector.Error) as err:
+            print(f"Metrics save error: {err}")
+
+    def _write_manifest(self):
+        """Hash nội dung + số dòng của từng file để load_staging.py bỏ qua dataset không đổi"""
+        try:
+            write_manifest(self.writer.path, self.writer.date_tag, self.config_id)
+        except OSError as err:
+            print(f"Manifest write error: {err}")
+
+    def _update_job_status(self, cursor, final_status, final_flag):
+        update_query = "UPDATE config SET status = %s, is_processing = FALSE, flag = %s WHERE id = %s"
+        cursor.execute(update_query, (final_status, final_flag, self.config_id))
 
     def finalize_job(self):
         if not self.config_id: return
@@ -212,34 +503,16 @@ class CrawlJob:
 
         try:
             cursor = conn.cursor()
-            # Sử dụng path từ DB config hoặc fallback về DEFAULT
-            path = self.job_config['path'] if self.job_config else DEFAULT_CSV_PATH
-            os.makedirs(path, exist_ok=True)
-
-            date_tag = self.job_config['data_date_end'].strftime(DATE_FORMAT)
+            # Bước 15. Dữ liệu đã được ghi dần ra file csv trong lúc crawl, ở đây chỉ tổng kết
             total_rows_saved = 0
-
-            def save_to_csv(data, name_prefix, is_df=False):
-                nonlocal total_rows_saved
-                if is_df and data is not None:
-                    df = data
-                elif data and isinstance(data, list):
-                    df = pd.concat(data, ignore_index=True)
-                else:
-                    return 0
-
-                filename = f"{name_prefix}_{date_tag}.csv"
-                full_path = os.path.join(path, filename)
-                df.to_csv(full_path, index=False)
-                print(f"Saved {name_prefix}: {len(df)} rows")
-                total_rows_saved += len(df)
-                return len(df)
-            # Bước 15. Chuyển data vừa crawl được thành file csv
-            save_to_csv(self.crawled_data_price, "price_history")
-            save_to_csv(self.crawled_data_overview, "company_overview")
-            save_to_csv(self.crawled_data_ratio, "finance_ratio")
-            save_to_csv(self.data_listing_exchange, "listing_exchange", is_df=True)
-            save_to_csv(self.data_listing_industries, "listing_industries", is_df=True)
+            if self.writer:
+                self.writer.close()
+                total_rows_saved = self.writer.total_rows
+                self._save_metrics(conn)
+                self._write_manifest()
+                # Universe thực tế của job (mã bị dời không tính) để transform lọc đúng các mã này
+                deferred = set(self.deferred)
+                record_job_symbols(cursor, self.config_id, [s for s in self.symbols or [] if s not in deferred])
 
             if total_rows_saved > 0:
                 # Bước 16.2.1 : set status = CRAWED và isprocessing = 0
@@ -251,9 +524,12 @@ class CrawlJob:
                 # Bước: 16.1.2 Log FAIL lại lỗi
                 self._insert_logging('FAIL', "No data saved.")
 
-            update_query = "UPDATE config SET status = %s, is_processing = FALSE, flag = %s WHERE id = %s"
-            cursor.execute(update_query, (final_status, final_flag, self.config_id))
-            conn.commit()
+            self._update_job_status(cursor, final_status, final_flag)
+            # Log của job được commit cùng trạng thái cuối
+            with self.logger.flush_with(cursor):
+                conn.commit()
+            self.final_status = final_status
+            self.total_rows_saved = total_rows_saved
 
             print(f"Job Finalized. Status: {final_status}")
             cursor.close()
@@ -262,6 +538,9 @@ class CrawlJob:
             print(f"Finalize error: {e}")
             conn.rollback()
         finally:
+            self.logger.flush()
+            if self.cache:
+                print(f"Cache: {self.cache.hits} hits, {self.cache.misses} misses")
             self._close_db_connection()
 
 
@@ -269,17 +548,64 @@ def main():
     parser = argparse.ArgumentParser(description="Run Crawl Job")
     parser.add_argument('--start', type=str, help='Start Date (YYYY-MM-DD)', default=None)
     parser.add_argument('--end', type=str, help='End Date (YYYY-MM-DD)', default=None)
+    parser.add_argument('--workers', type=int, help='Number of concurrent crawl workers', default=CRAWL_WORKERS)
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only fetch trading days missing from the DWH for each symbol')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default=OUTPUT_FORMAT,
+                        help='Output file format')
+    parser.add_argument('--source', choices=['live', 'record', 'replay'], default='live',
+                        help='live: call vnstock, record: call vnstock and save responses, replay: serve saved responses')
+    parser.add_argument('--fixtures-dir', type=str, default=os.path.join(CURRENT_DIR, 'fixtures'),
+                        help='Directory for recorded responses')
+    parser.add_argument('--replay-latency', type=float, default=0.0, help='Simulated latency per call in replay (ms)')
+    parser.add_argument('--shard', type=str, default=None,
+                        help='Crawl only shard i of n (format i/n) of a job planned with shards.py plan')
+    parser.add_argument('--config-id', type=int, default=None, help='Logical job (config id) the shard belongs to')
+    parser.add_argument('--market', action='store_true',
+                        help='Crawl the whole market from the listing snapshot instead of symbol_company.txt')
+    parser.add_argument('--exchange', type=str, default=None, help='Market mode: comma-separated exchanges (HOSE,HNX,UPCOM)')
+    parser.add_argument('--industry', type=str, default=None, help='Market mode: comma-separated ICB industry names/codes')
+    parser.add_argument('--deadline-minutes', type=float, default=CRAWL_DEADLINE_MINUTES,
+                        help='Stop starting new symbols after this many minutes and defer the rest (0 = no limit)')
+    parser.add_argument('--refresh', action='store_true', help='Ignore cached responses and re-download')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the on-disk response cache')
 
     args = parser.parse_args()
 
-    job = CrawlJob(DB_CONFIG, manual_start=args.start, manual_end=args.end)
-
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(CACHE_DIR, CACHE_TTL_SECONDS, CACHE_MAX_BYTES, refresh=args.refresh)
+
+    job_kwargs = dict(workers=args.workers, cache=cache, output_format=args.format,
+                      source=make_source(args.source, args.fixtures_dir, args.replay_latency / 1000),
+                      deadline_minutes=args.deadline_minutes)
+    if args.shard:
+        # Import tại chỗ vì shards.py kế thừa CrawlJob từ module này
+        from shards import ShardCrawlJob, parse_shard
+        if not args.config_id:
+            parser.error('--shard requires --config-id (see shards.py plan)')
+        shard_index, shard_count = parse_shard(args.shard)
+        job = ShardCrawlJob(DB_CONFIG, args.config_id, shard_index, shard_count, **job_kwargs)
+    elif args.market:
+        from universe import MarketCrawlJob, parse_list
+        job = MarketCrawlJob(DB_CONFIG, exchanges=parse_list(args.exchange), industries=parse_list(args.industry),
+                             manual_start=args.start, manual_end=args.end, incremental=args.incremental, **job_kwargs)
+    else:
+        job = CrawlJob(DB_CONFIG, manual_start=args.start, manual_end=args.end,
+                       incremental=args.incremental, **job_kwargs)
+
+    # Giữ kết nối HTTP keep-alive theo từng nguồn và dùng lại cho mọi mã
+    pool = SessionPool(HTTP_POOL_SIZE)
     if job.setup_config():
         if job.start_processing():
             try:
-                job.execute_crawl()
+                with pool:
+                    job.execute_crawl()
             finally:
                 job.finalize_job()
+                print(pool.report())
+    if cache:
+        cache.close()
 
 
 if __name__ == "__main__":
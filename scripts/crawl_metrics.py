@@ -0,0 +1,114 @@
+import json
+import math
+import threading
+import time
+from datetime import datetime
+
+
+def percentile(sorted_values, q):
+    """Percentile kiểu nearest-rank trên danh sách đã sắp xếp"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def payload_size(value):
+    """Ước lượng dung lượng dữ liệu trả về (bytes)"""
+    try:
+        return int(value.memory_usage(index=True, deep=True).sum())
+    except AttributeError:
+        return 0
+
+
+class CallMetrics:
+    """Ghi nhận từng lệnh gọi API: thời gian, số dòng, dung lượng, kết quả theo (source, endpoint, symbol)"""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def record(self, source, endpoint, symbol, seconds, rows=0, payload_bytes=0, outcome='ok'):
+        with self._lock:
+            self.calls.append({
+                "source": source,
+                "endpoint": endpoint,
+                "symbol": symbol,
+                "ms": round(seconds * 1000, 2),
+                "rows": rows,
+                "bytes": payload_bytes,
+                "outcome": outcome
+            })
+
+    def measure(self, source, endpoint, symbol, func, *args, **kwargs):
+        """Gọi func và ghi lại metric, lỗi vẫn được raise lại cho bên gọi xử lý"""
+        started = time.perf_counter()
+        try:
+            value = func(*args, **kwargs)
+        except Exception:
+            self.record(source, endpoint, symbol, time.perf_counter() - started, outcome='error')
+            raise
+        rows = len(value) if hasattr(value, '__len__') else 0
+        self.record(source, endpoint, symbol, time.perf_counter() - started, rows, payload_size(value))
+        return value
+
+    def summary(self):
+        groups = {}
+        with self._lock:
+            for call in self.calls:
+                groups.setdefault((call["source"], call["endpoint"], call["outcome"]), []).append(call)
+        rows = []
+        for (source, endpoint, outcome), calls in sorted(groups.items()):
+            latencies = sorted(c["ms"] for c in calls)
+            rows.append({
+                "source": source,
+                "endpoint": endpoint,
+                "outcome": outcome,
+                "calls": len(calls),
+                "p50_ms": percentile(latencies, 50),
+                "p90_ms": percentile(latencies, 90),
+                "p99_ms": percentile(latencies, 99),
+                "max_ms": latencies[-1],
+                "total_rows": sum(c["rows"] for c in calls),
+                "total_bytes": sum(c["bytes"] for c in calls)
+            })
+        return rows
+
+    def write_json(self, file_path, config_id=None):
+        report = {
+            "config_id": config_id,
+            "generated_at": datetime.now().isoformat(timespec='seconds'),
+            "summary": self.summary(),
+            "calls": self.calls
+        }
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+
+    def save_to_db(self, conn, config_id):
+        """Lưu bảng tổng hợp percentile vào bảng crawl_metrics của DB controller"""
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS crawl_metrics (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                id_config INT NOT NULL,
+                source VARCHAR(16) NOT NULL,
+                endpoint VARCHAR(64) NOT NULL,
+                outcome VARCHAR(16) NOT NULL,
+                calls INT NOT NULL,
+                p50_ms DOUBLE, p90_ms DOUBLE, p99_ms DOUBLE, max_ms DOUBLE,
+                total_rows BIGINT, total_bytes BIGINT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                KEY idx_crawl_metrics_config (id_config)
+            )
+        """)
+        cursor.executemany("""
+            INSERT INTO crawl_metrics
+            (id_config, source, endpoint, outcome, calls, p50_ms, p90_ms, p99_ms, max_ms, total_rows, total_bytes)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, [
+            (config_id, r["source"], r["endpoint"], r["outcome"], r["calls"], r["p50_ms"], r["p90_ms"],
+             r["p99_ms"], r["max_ms"], r["total_rows"], r["total_bytes"])
+            for r in self.summary()
+        ])
+        conn.commit()
+        cursor.close()
@@ -0,0 +1,355 @@
+import csv
+import glob
+import json
+import os
+import shutil
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+class StreamingCsvWriter:
+    """Ghi nối tiếp kết quả của từng mã vào file CSV ngay khi có, không giữ DataFrame trong bộ nhớ.
+    Cột chỉ xuất hiện ở mã sau được nối vào cuối (như pd.concat), header được ghi lại ngay lúc đó
+    nên file trên đĩa luôn đọc được kể cả khi job crash giữa chừng."""
+
+    def __init__(self, path, date_tag):
+        self.path = path
+        self.date_tag = date_tag
+        self.columns = {}
+        self.header_width = {}
+        self.rows = {}
+        os.makedirs(path, exist_ok=True)
+
+    def file_path(self, name_prefix):
+        return os.path.join(self.path, f"{name_prefix}_{self.date_tag}.csv")
+
+    def write(self, name_prefix, df):
+        if df is None:
+            return 0
+        full_path = self.file_path(name_prefix)
+        if name_prefix not in self.columns:
+            # Lần ghi đầu tiên: tạo mới file (ghi đè file cũ cùng ngày) và chốt thứ tự cột
+            self.columns[name_prefix] = df.columns
+            self.header_width[name_prefix] = len(df.columns)
+            self.rows[name_prefix] = 0
+            df.to_csv(full_path, index=False, mode='w')
+        else:
+            # Các lần sau: căn cột theo hợp các cột đã gặp, mỗi lần ghi đều đóng file nên crash không mất dữ liệu cũ
+            columns = self.columns[name_prefix] = union_columns(self.columns[name_prefix], df)
+            if len(columns) > self.header_width[name_prefix]:
+                self._widen_header(name_prefix)
+            df.reindex(columns=columns).to_csv(full_path, index=False, mode='a', header=False)
+        self.rows[name_prefix] += len(df)
+        return len(df)
+
+    def _widen_header(self, name_prefix):
+        """Ghi lại header theo hợp các cột, dòng ghi trước khi có cột mới được thêm ô trống ở cuối"""
+        columns = self.columns[name_prefix]
+        full_path = self.file_path(name_prefix)
+        tmp_path = full_path + ".tmp"
+        with open(full_path, 'r', encoding='utf-8', newline='') as src, \
+                open(tmp_path, 'w', encoding='utf-8', newline='') as out:
+            reader = csv.reader(src)
+            for _ in range(columns.nlevels):
+                next(reader)
+            out.write(pd.DataFrame(columns=columns).to_csv(index=False))
+            writer = csv.writer(out, lineterminator=os.linesep)
+            for row in reader:
+                writer.writerow(row + [''] * (len(columns) - len(row)))
+        os.replace(tmp_path, full_path)
+        self.header_width[name_prefix] = len(columns)
+
+    @property
+    def total_rows(self):
+        return sum(self.rows.values())
+
+    def close(self):
+        for name_prefix, rows in self.rows.items():
+            print(f"Saved {name_prefix}: {rows} rows")
+
+
+# Schema cố định cho 5 loại dữ liệu khi ghi Parquet, theo tên cột (tầng cuối khác rỗng của header).
+# Cột không khai báo được suy kiểu từ dữ liệu (pyarrow), không ép về một kiểu mặc định.
+DATASET_SCHEMAS = {
+    "price_history": {
+        "time": pa.timestamp("ms"),
+        "open": pa.float64(),
+        "high": pa.float64(),
+        "low": pa.float64(),
+        "close": pa.float64(),
+        "volume": pa.int64(),
+        "symbol": pa.string(),
+    },
+    "company_overview": {
+        "symbol": pa.string(),
+        "exchange": pa.string(),
+        "industry": pa.string(),
+        "company_type": pa.string(),
+        "no_shareholders": pa.int64(),
+        "foreign_percent": pa.float64(),
+        "outstanding_share": pa.float64(),
+        "issue_share": pa.float64(),
+        "established_year": pa.int64(),
+        "no_employees": pa.int64(),
+        "stock_rating": pa.float64(),
+        "delta_in_week": pa.float64(),
+        "delta_in_month": pa.float64(),
+        "delta_in_year": pa.float64(),
+        "short_name": pa.string(),
+        "website": pa.string(),
+        "industry_id": pa.int64(),
+        "industry_id_v2": pa.string(),
+    },
+    "finance_ratio": {
+        "CP": pa.string(),
+        "Năm": pa.int64(),
+        "Kỳ": pa.int64(),
+        "symbol": pa.string(),
+    },
+    "listing_exchange": {
+        "symbol": pa.string(),
+        "id": pa.int64(),
+        "type": pa.string(),
+        "exchange": pa.string(),
+        "en_organ_name": pa.string(),
+        "en_organ_short_name": pa.string(),
+        "organ_short_name": pa.string(),
+        "organ_name": pa.string(),
+    },
+    "listing_industries": {
+        "symbol": pa.string(),
+        "organ_name": pa.string(),
+        "icb_name3": pa.string(),
+        "en_icb_name3": pa.string(),
+        "icb_name2": pa.string(),
+        "en_icb_name2": pa.string(),
+        "icb_name4": pa.string(),
+        "en_icb_name4": pa.string(),
+        "com_type_code": pa.string(),
+        "icb_code1": pa.string(),
+        "icb_code2": pa.string(),
+        "icb_code3": pa.string(),
+        "icb_code4": pa.string(),
+    },
+}
+
+# Số dòng header khi ghi CSV (finance_ratio có header 2 tầng)
+CSV_HEADER_ROWS = {"finance_ratio": 2}
+
+PARQUET_FLUSH_ROWS = int(os.getenv("PARQUET_FLUSH_ROWS", "50000"))
+# Metadata của mỗi part Parquet: các tầng header CSV của từng cột, theo thứ tự cột trong file CSV tương ứng
+CSV_HEADER_METADATA = b"csv_header"
+
+
+def parquet_partition_path(path, name_prefix, date_tag):
+    """<path>/<dataset>/data_date=<YYYY-MM-DD>/"""
+    return os.path.join(path, name_prefix, f"data_date={date_tag}")
+
+
+def union_columns(columns, df):
+    """Hợp các cột theo thứ tự xuất hiện, cột mới nối vào cuối như pd.concat"""
+    new_columns = df.columns[~df.columns.isin(columns)]
+    return columns.append(new_columns) if len(new_columns) else columns
+
+
+def pandas_column_names(names):
+    """Đặt tên cột giống engine mặc định của pandas: trống -> 'Unnamed: i', trùng -> 'X.1', 'X.2'..."""
+    result, seen = [], {}
+    for i, name in enumerate(names):
+        name = str(name) if str(name) != '' else f"Unnamed: {i}"
+        base = name
+        while name in seen:
+            seen[base] += 1
+            name = f"{base}.{seen[base]}"
+        seen.setdefault(name, 0)
+        result.append(name)
+    return result
+
+
+def header_keys(columns):
+    """Cột (một hoặc nhiều tầng) -> các tầng header CSV của từng cột, dạng list để lưu JSON"""
+    return [[str(level) for level in col] if isinstance(col, tuple) else [str(col)] for col in columns]
+
+
+def csv_column_names(keys):
+    """Tên cột khi load_staging đọc lại file CSV: tầng cuối của header (read_csv(header=1) với header 2 tầng)"""
+    return pandas_column_names([key[-1] for key in keys])
+
+
+def read_parquet_partition(path):
+    """Đọc các part của một partition thành DataFrame có tên cột như file CSV tương ứng.
+    Tên được đặt lại theo hợp header của mọi part (kể cả part copy từ shard khác) nên 'Unnamed: i' khớp với CSV."""
+    parts = sorted(glob.glob(os.path.join(path, "*.parquet")))
+    keys, frames = [], []
+    for part in parts:
+        header = [tuple(key) for key in json.loads(pq.read_schema(part).metadata[CSV_HEADER_METADATA])]
+        keys.extend(key for key in header if key not in keys)
+        frames.append((header, pd.read_parquet(part)))
+    if not frames:
+        return pd.DataFrame()
+    names = dict(zip(keys, csv_column_names(keys)))
+    df = pd.concat([frame.set_axis([names[key] for key in header], axis=1) for header, frame in frames],
+                   ignore_index=True)
+    return df.reindex(columns=list(names.values()))
+
+
+def to_arrow(values, field_type=None):
+    """Series -> Array theo kiểu khai báo; không khai báo thì để pyarrow suy kiểu (object lẫn kiểu -> string)"""
+    if field_type is None:
+        try:
+            return pa.Array.from_pandas(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            return pa.Array.from_pandas(values.astype("string"))
+    if pa.types.is_string(field_type):
+        values = values.astype("string")
+    elif pa.types.is_integer(field_type) or pa.types.is_floating(field_type):
+        values = pd.to_numeric(values, errors="coerce")
+    elif pa.types.is_timestamp(field_type):
+        values = pd.to_datetime(values, errors="coerce")
+    return pa.Array.from_pandas(values, type=field_type, safe=False)
+
+
+def conform_to_schema(df, schema):
+    """Ép DataFrame theo schema: thiếu cột thì NULL, thừa cột thì bỏ, sai kiểu thì ép kiểu"""
+    arrays = [to_arrow(df[field.name], field.type) if field.name in df.columns else pa.nulls(len(df), field.type)
+              for field in schema]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def dataset_table(name_prefix, df):
+    """DataFrame của một dataset -> Table theo DATASET_SCHEMAS. Cột được đặt tên như khi đọc file CSV,
+    header CSV gốc (các tầng) được giữ trong metadata để read_parquet_partition đặt lại tên trên nhiều part"""
+    keys = header_keys(df.columns)
+    declared = DATASET_SCHEMAS.get(name_prefix, {})
+    arrays = []
+    for i, key in enumerate(keys):
+        name = next((level for level in reversed(key) if level), "")
+        arrays.append(to_arrow(df.iloc[:, i], declared.get(name)))
+    table = pa.Table.from_arrays(arrays, names=csv_column_names(keys))
+    return table.replace_schema_metadata({CSV_HEADER_METADATA: json.dumps(keys)})
+
+
+class StreamingParquetWriter:
+    """Ghi Parquet theo schema cố định của từng dataset, phân vùng theo ngày dữ liệu.
+    Dữ liệu được gom tới PARQUET_FLUSH_ROWS dòng rồi ghi thành một file part hoàn chỉnh,
+    nên bộ nhớ bị chặn trên và các part đã ghi vẫn đọc được nếu job crash."""
+
+    def __init__(self, path, date_tag, flush_rows=PARQUET_FLUSH_ROWS):
+        self.path = path
+        self.date_tag = date_tag
+        self.flush_rows = flush_rows
+        self.columns = {}
+        self.buffers = {}
+        self.buffered_rows = {}
+        self.parts = {}
+        self.rows = {}
+        os.makedirs(path, exist_ok=True)
+
+    def file_path(self, name_prefix):
+        return parquet_partition_path(self.path, name_prefix, self.date_tag)
+
+    def write(self, name_prefix, df):
+        if df is None:
+            return 0
+        if name_prefix not in self.columns:
+            # Lần ghi đầu: xóa partition cũ cùng ngày
+            self.columns[name_prefix] = df.columns
+            self.buffers[name_prefix] = []
+            self.buffered_rows[name_prefix] = 0
+            self.parts[name_prefix] = 0
+            self.rows[name_prefix] = 0
+            partition = self.file_path(name_prefix)
+            shutil.rmtree(partition, ignore_errors=True)
+            os.makedirs(partition, exist_ok=True)
+        else:
+            self.columns[name_prefix] = union_columns(self.columns[name_prefix], df)
+
+        self.buffers[name_prefix].append(df)
+        self.buffered_rows[name_prefix] += len(df)
+        self.rows[name_prefix] += len(df)
+        if self.buffered_rows[name_prefix] >= self.flush_rows:
+            self._flush(name_prefix)
+        return len(df)
+
+    def _flush(self, name_prefix):
+        if not self.buffered_rows.get(name_prefix):
+            return
+        df = pd.concat(self.buffers[name_prefix], ignore_index=True).reindex(columns=self.columns[name_prefix])
+        table = dataset_table(name_prefix, df)
+        part_path = os.path.join(self.file_path(name_prefix), f"part-{self.parts[name_prefix]:05d}.parquet")
+        pq.write_table(table, part_path, compression="zstd")
+        self.parts[name_prefix] += 1
+        self.buffers[name_prefix] = []
+        self.buffered_rows[name_prefix] = 0
+
+    @property
+    def total_rows(self):
+        return sum(self.rows.values())
+
+    def close(self):
+        for name_prefix, rows in self.rows.items():
+            self._flush(name_prefix)
+            print(f"Saved {name_prefix}: {rows} rows (parquet)")
+
+
+# Nến intraday (1m/5m): symbol và ngày nằm ở đường dẫn partition nên không lưu lại trong file
+INTRADAY_SCHEMA = pa.schema([
+    ("time", pa.timestamp("s")),
+    ("open", pa.float32()),
+    ("high", pa.float32()),
+    ("low", pa.float32()),
+    ("close", pa.float32()),
+    ("volume", pa.int64()),
+])
+
+
+def intraday_partition_path(path, interval, data_date, symbol):
+    """<path>/intraday/interval=<1m>/data_date=<YYYY-MM-DD>/symbol=<MÃ>/"""
+    return os.path.join(path, "intraday", f"interval={interval}", f"data_date={data_date}", f"symbol={symbol}")
+
+
+class IntradayParquetWriter:
+    """Ghi nến intraday thành file Parquet nhỏ, phân vùng theo interval / ngày / mã.
+    Mỗi lần write chỉ giữ dữ liệu của một mã, file của (interval, ngày, mã) được ghi đè nên chạy lại an toàn."""
+
+    def __init__(self, path, date_tag):
+        self.path = path
+        self.date_tag = date_tag
+        self.rows = {}
+        self.files = 0
+        self.bytes = 0
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, interval, df):
+        if df is None or df.empty:
+            return 0
+        symbol = str(df["symbol"].iloc[0])
+        table = conform_to_schema(df, INTRADAY_SCHEMA)
+        days = pd.to_datetime(df["time"], errors="coerce").dt.date.to_numpy()
+        for day in sorted(d for d in set(days) if isinstance(d, date)):
+            partition = intraday_partition_path(self.path, interval, day.isoformat(), symbol)
+            os.makedirs(partition, exist_ok=True)
+            file_path = os.path.join(partition, "part-00000.parquet")
+            pq.write_table(table.filter(pa.array(days == day)), file_path, compression="zstd")
+            self.files += 1
+            self.bytes += os.path.getsize(file_path)
+        self.rows[interval] = self.rows.get(interval, 0) + len(df)
+        return len(df)
+
+    @property
+    def total_rows(self):
+        return sum(self.rows.values())
+
+    def close(self):
+        for interval, rows in self.rows.items():
+            print(f"Saved intraday {interval}: {rows} rows")
+        print(f"Intraday files: {self.files}, {self.bytes / 1024 / 1024:.1f} MB")
+
+
+def make_writer(output_format, path, date_tag):
+    if output_format == "parquet":
+        return StreamingParquetWriter(path, date_tag)
+    return StreamingCsvWriter(path, date_tag)
@@ -0,0 +1,14 @@
+from datetime import date, datetime
+
+
+def as_date(value):
+    """datetime -> date; date giữ nguyên (cột DATE và DATETIME của MySQL trả về hai kiểu khác nhau)"""
+    return value.date() if isinstance(value, datetime) else value
+
+
+def parse_date_id(value):
+    """date_id trong DWH có thể là số dạng YYYYMMDD, chuỗi hoặc kiểu date"""
+    if isinstance(value, date):
+        return as_date(value)
+    text = str(value)
+    return datetime.strptime(text, '%Y-%m-%d' if '-' in text else '%Y%m%d').date()
@@ -0,0 +1,100 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+import requests.api
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+
+
+class SessionPool:
+    """Dùng chung requests.Session (keep-alive, connection pool) theo từng host cho mọi lệnh gọi HTTP.
+
+    vnstock gọi thẳng requests.get/post nên mỗi request tạo Session mới (bắt tay TCP/TLS lại từ đầu).
+    Trong khối `with SessionPool():` các lệnh gọi đó được chuyển sang session dùng chung của từng luồng,
+    đồng thời đo số kết nối mới và thời gian thiết lập kết nối để ước tính thời gian tiết kiệm được.
+    """
+
+    def __init__(self, pool_size=10):
+        self.pool_size = pool_size
+        self.requests = 0
+        self.new_connections = 0
+        self.connect_seconds = 0.0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Mọi session đã tạo (của mọi luồng) để đóng kết nối keep-alive khi ra khỏi khối with
+        self._sessions = []
+        self._originals = {}
+
+    def _session_for(self, url):
+        # requests.Session không đảm bảo thread-safe nên mỗi luồng giữ session riêng cho từng host
+        sessions = getattr(self._local, "sessions", None)
+        if sessions is None:
+            sessions = self._local.sessions = {}
+        host = urlsplit(url).netloc
+        session = sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            sessions[host] = session
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def request(self, method, url, **kwargs):
+        with self._lock:
+            self.requests += 1
+        return self._session_for(url).request(method=method, url=url, **kwargs)
+
+    def _timed_connect(self, original):
+        pool = self
+
+        def connect(conn, *args, **kwargs):
+            if getattr(pool._local, "connecting", False):
+                return original(conn, *args, **kwargs)
+            pool._local.connecting = True
+            started = time.perf_counter()
+            try:
+                return original(conn, *args, **kwargs)
+            finally:
+                pool._local.connecting = False
+                with pool._lock:
+                    pool.new_connections += 1
+                    pool.connect_seconds += time.perf_counter() - started
+        return connect
+
+    def __enter__(self):
+        self._originals = {
+            "api_request": requests.api.request,
+            "request": requests.request,
+            "http_connect": HTTPConnection.connect,
+            "https_connect": HTTPSConnection.connect,
+        }
+        # requests.get/post/... đều đi qua requests.api.request
+        requests.api.request = self.request
+        requests.request = self.request
+        HTTPConnection.connect = self._timed_connect(self._originals["http_connect"])
+        HTTPSConnection.connect = self._timed_connect(self._originals["https_connect"])
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        requests.api.request = self._originals["api_request"]
+        requests.request = self._originals["request"]
+        HTTPConnection.connect = self._originals["http_connect"]
+        HTTPSConnection.connect = self._originals["https_connect"]
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+            # Luồng dùng lại pool sau này sẽ tạo session mới
+            self._local = threading.local()
+        for session in sessions:
+            session.close()
+        return False
+
+    def report(self):
+        reused = max(0, self.requests - self.new_connections)
+        avg_connect = self.connect_seconds / self.new_connections if self.new_connections else 0.0
+        return (f"HTTP pool: {self.requests} requests over {self.new_connections} connections, "
+                f"avg connect {avg_connect * 1000:.0f} ms, ~{reused * avg_connect:.1f}s setup saved")
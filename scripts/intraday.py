@@ -0,0 +1,279 @@
+"""Nạp nến intraday (1m, 5m) cho các mã theo dõi, đi thẳng từ file Parquet vào DWH (không qua JSON staging).
+
+    python intraday.py crawl [--start YYYY-MM-DD --end YYYY-MM-DD] [--intervals 1m,5m] [--workers 4]
+        -> config INTRADAY_CRAWLED, file tại <path>/intraday/interval=<i>/data_date=<ngày>/symbol=<mã>/
+    python intraday.py load
+        -> đọc file theo từng batch và INSERT nhiều dòng vào fact_price_intraday, config INTRADAY_LOADED
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+
+import mysql.connector
+import pyarrow.parquet as pq
+
+from crawl_data import CrawlJob, DB_CONFIG, CRAWL_WORKERS, HTTP_POOL_SIZE
+from crawl_writer import IntradayParquetWriter
+from date_utils import as_date
+from http_pool import SessionPool
+from job_logger import get_job_logger
+from load_dw import CONTROLLER_CONFIG, DWH_CONFIG
+
+INTRADAY_INTERVALS = os.getenv("INTRADAY_INTERVALS", "1m,5m")
+# Số dòng đọc từ Parquet mỗi lần và số dòng mỗi lần INSERT / commit
+INTRADAY_READ_BATCH_ROWS = int(os.getenv("INTRADAY_READ_BATCH_ROWS", "10000"))
+INTRADAY_LOAD_BATCH_ROWS = int(os.getenv("INTRADAY_LOAD_BATCH_ROWS", "20000"))
+
+
+class IntradayCrawlJob(CrawlJob):
+    """Crawl Quote.history với interval phút, mỗi interval là một endpoint riêng (retry/metrics theo interval)"""
+
+    def __init__(self, db_config, intervals=None, **kwargs):
+        super().__init__(db_config, **kwargs)
+        self.intervals = intervals or [i.strip() for i in INTRADAY_INTERVALS.split(',') if i.strip()]
+
+    def _open_writer(self, end_date_str):
+        return IntradayParquetWriter(self.job_config['path'], end_date_str)
+
+    def _write_listing(self):
+        pass
+
+    def _write_manifest(self):
+        pass
+
+    def _crawl_symbol(self, symbol, start_date_str, end_date_str):
+        if self.past_deadline():
+            return symbol, None, None
+        results, errors = {}, {}
+        context = (start_date_str, end_date_str)
+        for interval in self.intervals:
+            try:
+                results[interval] = self._fetch(interval, symbol, context)
+            except Exception as e:
+                errors[interval] = (e, context)
+        return symbol, results, errors
+
+    def _fetch(self, endpoint, symbol, date_range=None):
+        start, end = date_range
+        df = self._call(
+            'VCI', f'history_{endpoint}', symbol, self.source.history, symbol, start=start, end=end, interval=endpoint
+        )
+        df['symbol'] = symbol
+        return df
+
+    def _write_result(self, endpoint, df):
+        self.writer.write(endpoint, df)
+        self.success_count += 1
+
+    def _update_job_status(self, cursor, final_status, final_flag):
+        # Trạng thái riêng để load_staging.py không nhận job intraday
+        status = 'INTRADAY_CRAWLED' if final_status == 'CRAWLED' else final_status
+        super()._update_job_status(cursor, status, final_flag)
+
+
+def intraday_files(path, start_date, end_date):
+    """Liệt kê (interval, symbol, file) trong khoảng ngày, theo thứ tự interval / ngày / mã"""
+    root = os.path.join(path, "intraday")
+    if not os.path.isdir(root):
+        return
+    for interval_dir in sorted(os.listdir(root)):
+        interval = interval_dir.split('=', 1)[1]
+        for date_dir in sorted(os.listdir(os.path.join(root, interval_dir))):
+            day = datetime.strptime(date_dir.split('=', 1)[1], '%Y-%m-%d').date()
+            if not start_date <= day <= end_date:
+                continue
+            day_path = os.path.join(root, interval_dir, date_dir)
+            for symbol_dir in sorted(os.listdir(day_path)):
+                symbol = symbol_dir.split('=', 1)[1]
+                for name in sorted(os.listdir(os.path.join(day_path, symbol_dir))):
+                    if name.endswith('.parquet'):
+                        yield interval, symbol, os.path.join(day_path, symbol_dir, name)
+
+
+def iter_intraday_rows(path, start_date, end_date, company_ids, batch_rows=INTRADAY_READ_BATCH_ROWS, skipped=None):
+    """Sinh từng lô tuple (company_id, interval, time, open, high, low, close, volume) từ file Parquet.
+    Chỉ giữ một record batch trong bộ nhớ; mã chưa có trong dim_company được đếm vào skipped."""
+    for interval, symbol, file_path in intraday_files(path, start_date, end_date):
+        company_id = company_ids.get(symbol)
+        parquet = pq.ParquetFile(file_path)
+        if company_id is None:
+            if skipped is not None:
+                skipped[symbol] = skipped.get(symbol, 0) + parquet.metadata.num_rows
+            continue
+        for batch in parquet.iter_batches(batch_size=batch_rows):
+            columns = [batch.column(name).to_pylist() for name in ("time", "open", "high", "low", "close", "volume")]
+            yield [(company_id, interval) + values for values in zip(*columns)]
+
+
+class IntradayLoadJob:
+    def __init__(self, load_batch_rows=INTRADAY_LOAD_BATCH_ROWS):
+        self.config_id = None
+        self.job_config = None
+        self.load_batch_rows = load_batch_rows
+        self.rows_loaded = 0
+        self.logger = get_job_logger(CONTROLLER_CONFIG)
+
+    def _get_conn(self, config):
+        try:
+            return mysql.connector.connect(**config)
+        except mysql.connector.Error as err:
+            print(f"❌ Connection Error to {config.get('host')}: {err}")
+            return None
+
+    def get_job_to_load(self):
+        conn = self._get_conn(CONTROLLER_CONFIG)
+        if not conn: return False
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT * FROM config
+                WHERE status = 'INTRADAY_CRAWLED' AND flag = 1 AND is_processing = FALSE
+                ORDER BY id ASC LIMIT 1
+            """)
+            self.job_config = cursor.fetchone()
+            if not self.job_config:
+                print("💤 Không có Job intraday nào cần load (INTRADAY_CRAWLED).")
+                return False
+            self.config_id = self.job_config['id']
+            cursor.execute(
+                "UPDATE config SET status = 'INTRADAY_LOADING', is_processing = TRUE WHERE id = %s", (self.config_id,)
+            )
+            conn.commit()
+            print(f"🔒 Đã Lock Job ID: {self.config_id}. Trạng thái: INTRADAY_LOADING")
+            return True
+        finally:
+            conn.close()
+
+    @staticmethod
+    def ensure_table(cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS fact_price_intraday (
+                company_id INT NOT NULL,
+                bar_interval VARCHAR(4) NOT NULL,
+                bar_time DATETIME NOT NULL,
+                open_price FLOAT,
+                high_price FLOAT,
+                low_price FLOAT,
+                close_price FLOAT,
+                volume BIGINT,
+                PRIMARY KEY (company_id, bar_interval, bar_time)
+            )
+        """)
+
+    def load_to_dwh(self):
+        conn = self._get_conn(DWH_CONFIG)
+        if not conn:
+            self.report_error("Connection Failed to Real DWH")
+            return False
+        try:
+            cursor = conn.cursor()
+            self.ensure_table(cursor)
+            cursor.execute("SELECT symbol, id FROM dim_company")
+            company_ids = dict(cursor.fetchall())
+
+            skipped = {}
+            buffer = []
+            started = time.perf_counter()
+            sql = """
+                INSERT IGNORE INTO fact_price_intraday
+                (company_id, bar_interval, bar_time, open_price, high_price, low_price, close_price, volume)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """
+            rows = iter_intraday_rows(
+                self.job_config['path'], as_date(self.job_config['data_date_start']),
+                as_date(self.job_config['data_date_end']), company_ids, skipped=skipped
+            )
+            for batch in rows:
+                buffer.extend(batch)
+                if len(buffer) >= self.load_batch_rows:
+                    self._insert(conn, cursor, sql, buffer)
+                    buffer = []
+            self._insert(conn, cursor, sql, buffer)
+
+            elapsed = time.perf_counter() - started
+            print(f"   ✅ Loaded {self.rows_loaded} intraday rows in {elapsed:.1f}s "
+                  f"({self.rows_loaded / elapsed if elapsed else 0:.0f} rows/s)")
+            if skipped:
+                self.logger.log(self.config_id, 'WARN',
+                                f"Skipped {sum(skipped.values())} rows of {len(skipped)} symbols missing in dim_company")
+            return True
+        except Exception as e:
+            print(f"❌ Lỗi Load Intraday: {e}")
+            conn.rollback()
+            self.report_error(f"Load Intraday Error: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def _insert(self, conn, cursor, sql, rows):
+        # Mỗi lô một transaction: lỗi giữa chừng thì chạy lại, INSERT IGNORE bỏ qua các dòng đã có
+        if not rows:
+            return
+        cursor.executemany(sql, rows)
+        conn.commit()
+        self.rows_loaded += len(rows)
+
+    def finalize_job(self):
+        self.logger.log(self.config_id, 'SUCCESS', f"Loaded {self.rows_loaded} intraday rows")
+        conn = self._get_conn(CONTROLLER_CONFIG)
+        if not conn: return
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE config SET status = 'INTRADAY_LOADED', is_processing = FALSE, flag = 1 WHERE id = %s",
+                (self.config_id,)
+            )
+            with self.logger.flush_with(cursor):
+                conn.commit()
+            print("🏁 Job Hoàn tất: INTRADAY_LOADED")
+        finally:
+            conn.close()
+
+    def report_error(self, msg):
+        self.logger.log(self.config_id, 'ERR', msg)
+        conn = self._get_conn(CONTROLLER_CONFIG)
+        if not conn: return
+        try:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE config SET status = 'ERR_INTRADAY', is_processing = FALSE WHERE id = %s",
+                           (self.config_id,))
+            with self.logger.flush_with(cursor):
+                conn.commit()
+        finally:
+            conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Intraday bar ingestion")
+    sub = parser.add_subparsers(dest='command', required=True)
+    crawl_parser = sub.add_parser('crawl', help='Download 1m/5m bars into partitioned Parquet files')
+    crawl_parser.add_argument('--start', type=str, default=None, help='Start Date (YYYY-MM-DD)')
+    crawl_parser.add_argument('--end', type=str, default=None, help='End Date (YYYY-MM-DD)')
+    crawl_parser.add_argument('--intervals', type=str, default=INTRADAY_INTERVALS, help='Comma separated intervals')
+    crawl_parser.add_argument('--workers', type=int, default=CRAWL_WORKERS)
+    sub.add_parser('load', help='Bulk-load the oldest INTRADAY_CRAWLED job into fact_price_intraday')
+    args = parser.parse_args()
+
+    if args.command == 'load':
+        job = IntradayLoadJob()
+        if job.get_job_to_load() and job.load_to_dwh():
+            job.finalize_job()
+        return
+
+    # Nến intraday luôn lấy mới, không qua cache
+    job = IntradayCrawlJob(DB_CONFIG, intervals=[i.strip() for i in args.intervals.split(',') if i.strip()],
+                           manual_start=args.start, manual_end=args.end, workers=args.workers)
+    pool = SessionPool(HTTP_POOL_SIZE)
+    if job.setup_config():
+        if job.start_processing():
+            try:
+                with pool:
+                    job.execute_crawl()
+            finally:
+                job.finalize_job()
+                print(pool.report())
+
+
+if __name__ == "__main__":
+    main()
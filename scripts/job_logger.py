@@ -0,0 +1,126 @@
+import atexit
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+import mysql.connector
+
+# Ghi xuống DB khi buffer đủ số dòng này hoặc sau chừng này giây
+LOG_BUFFER_ROWS = int(os.getenv("LOG_BUFFER_ROWS", "50"))
+LOG_FLUSH_SECONDS = float(os.getenv("LOG_FLUSH_SECONDS", "5"))
+# mysql-connector gộp executemany của INSERT ... VALUES thành một câu INSERT nhiều dòng
+LOG_INSERT_SQL = "INSERT INTO logging (id_config, status, description) VALUES (%s, %s, %s)"
+
+
+class BufferedJobLogger:
+    """Gom các dòng log của job vào buffer và ghi vào bảng `logging` bằng INSERT nhiều dòng.
+
+    Buffer được flush khi đủ LOG_BUFFER_ROWS dòng, theo chu kỳ LOG_FLUSH_SECONDS (luồng nền),
+    khi gọi flush()/close() và tự động khi process thoát (atexit). flush_with(cursor) ghi trong transaction
+    của bên gọi, dùng khi log phải được commit cùng trạng thái job.
+    """
+
+    def __init__(self, db_config, max_rows=LOG_BUFFER_ROWS, flush_interval=LOG_FLUSH_SECONDS):
+        self.db_config = db_config
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.conn = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._closed = False
+        self._timer = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._timer.start()
+        atexit.register(self.close)
+
+    def _get_conn(self):
+        if any(v is None for v in self.db_config.values()):
+            return None
+        if not self.conn or not self.conn.is_connected():
+            self.conn = mysql.connector.connect(**self.db_config)
+        return self.conn
+
+    def log(self, config_id, status, description):
+        with self._lock:
+            self.buffer.append((config_id, status, description))
+            should_flush = len(self.buffer) >= self.max_rows
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self.buffer:
+                return True
+            rows = self.buffer
+            self.buffer = []
+            try:
+                conn = self._get_conn()
+                if not conn:
+                    raise mysql.connector.Error("Logging DB is not configured")
+                cursor = conn.cursor()
+                cursor.executemany(LOG_INSERT_SQL, rows)
+                conn.commit()
+                cursor.close()
+                return True
+            except mysql.connector.Error as err:
+                # Giữ lại log để lần flush sau ghi tiếp, không làm mất dòng nào
+                print(f"Error flushing {len(rows)} log rows: {err}", file=sys.stderr)
+                self.buffer = rows + self.buffer
+                return False
+
+    @contextmanager
+    def flush_with(self, cursor):
+        """Ghi các dòng đang chờ bằng cursor của bên gọi: log nằm cùng transaction với việc cập nhật trạng thái
+        job, không mở thêm kết nối. Bên gọi commit trong khối with; commit lỗi thì các dòng được trả lại buffer
+
+            with logger.flush_with(cursor):
+                conn.commit()
+        """
+        with self._lock:
+            rows, self.buffer = self.buffer, []
+        try:
+            if rows:
+                cursor.executemany(LOG_INSERT_SQL, rows)
+            yield rows
+        except BaseException:
+            self.requeue(rows)
+            raise
+
+    def requeue(self, rows):
+        """Trả các dòng chưa được commit về đầu buffer để lần flush sau ghi lại"""
+        if rows:
+            with self._lock:
+                self.buffer = rows + self.buffer
+
+    def _flush_periodically(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._stop.set()
+        if not self.flush():
+            # DB không ghi được: in ra stderr để log vẫn còn trong output của job
+            for config_id, status, description in self.buffer:
+                print(f"[LOGGING FAILED] Config: {config_id}, Status: {status}, Desc: {description}",
+                      file=sys.stderr)
+            self.buffer = []
+        if self.conn and self.conn.is_connected():
+            self.conn.close()
+        self.conn = None
+
+
+_loggers = {}
+_loggers_lock = threading.Lock()
+
+
+def get_job_logger(db_config):
+    """Trả về logger dùng chung trong process cho một DB controller"""
+    key = tuple(sorted((k, str(v)) for k, v in db_config.items()))
+    with _loggers_lock:
+        if key not in _loggers:
+            _loggers[key] = BufferedJobLogger(db_config)
+        return _loggers[key]
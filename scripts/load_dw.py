@@ -1,7 +1,10 @@
 import mysql.connector
 import os
 import sys
+import argparse
 from dotenv import load_dotenv
+from job_logger import get_job_logger
+from date_utils import parse_date_id
 
 load_dotenv()
 
@@ -36,12 +39,42 @@ DWH_CONFIG = {
 }
 
 
+def date_id_like(day, sample):
+    """Đổi ngày về cùng dạng với date_id mẫu (YYYYMMDD hoặc YYYY-MM-DD) để so sánh trong SQL"""
+    return day.isoformat() if '-' in str(sample) else day.strftime('%Y%m%d')
+
+
+def ratio_key(mark):
+    """Mốc fact_financial_ratio dạng 'year-period' -> (year, period) để so sánh"""
+    return tuple(int(v) for v in mark.split('-'))
+
+
+# Bảng fact -> hàm đổi mốc (chuỗi) về giá trị so sánh được
+MARK_KEYS = {
+    'fact_price_history': parse_date_id,
+    'fact_financial_ratio': ratio_key,
+}
+
+
 class LoadDwhJob:
-    def __init__(self):
+    """Chỉ chuyển các dòng fact mới hơn mốc (watermark) đã load sang DWH thật.
+
+    Mốc lưu theo từng mã ở bảng load_watermark_symbol (DB controller): date_id lớn nhất của
+    fact_price_history, (year, period) lớn nhất của fact_financial_ratio. Mã về trễ hoặc mã mới chỉ bị lọc
+    theo mốc của chính nó (mã chưa có mốc được lấy toàn bộ). Bảng chưa có mốc nào thì lấy MAX theo mã từ
+    DWH thật; full_reload=True bỏ qua mốc và gửi lại toàn bộ.
+    """
+
+    def __init__(self, full_reload=False):
         self.config_id = None
         self.data_companies = []
         self.data_prices = []
         self.data_financials = []
+        self.full_reload = full_reload
+        self.window_start = None
+        # bảng -> {mã -> mốc trước khi load}, dạng chuỗi ('20250110' / '2025-01-10', '2024-4')
+        self.watermarks = {}
+        self.logger = get_job_logger(CONTROLLER_CONFIG)
 
     def _get_conn(self, config):
         try:
@@ -77,6 +110,7 @@ class LoadDwhJob:
                 return False
 
             self.config_id = job['id']
+            self.window_start = job.get('data_date_start')
 
             # Lock Job
             cursor.execute("UPDATE config SET status = 'LOADING_DWH', is_processing = TRUE WHERE id = %s",
@@ -87,6 +121,124 @@ class LoadDwhJob:
         finally:
             conn.close()
 
+    # --- BƯỚC 1.1: ĐỌC MỐC ĐÃ LOAD ---
+    @staticmethod
+    def ensure_watermark_table(cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS load_watermark_symbol (
+                table_name VARCHAR(64) NOT NULL,
+                symbol VARCHAR(20) NOT NULL,
+                watermark VARCHAR(32) NOT NULL,
+                id_config INT NULL,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                PRIMARY KEY (table_name, symbol)
+            )
+        """)
+
+    def load_watermarks(self):
+        if self.full_reload:
+            print("♻️ Full reload: bỏ qua watermark, gửi lại toàn bộ fact.")
+            return True
+        conn = self._get_conn(CONTROLLER_CONFIG)
+        if not conn:
+            self.report_error("Connection Failed to Controller (watermark)")
+            return False
+        try:
+            cursor = conn.cursor()
+            self.ensure_watermark_table(cursor)
+            cursor.execute("SELECT table_name, symbol, watermark FROM load_watermark_symbol")
+            for table, symbol, mark in cursor.fetchall():
+                self.watermarks.setdefault(table, {})[symbol] = mark
+        finally:
+            conn.close()
+        if len(self.watermarks) < len(MARK_KEYS):
+            self._bootstrap_watermarks()
+        for table in MARK_KEYS:
+            marks = self.watermarks.get(table)
+            oldest = min(marks.values(), key=MARK_KEYS[table]) if marks else 'chưa có (load toàn bộ)'
+            print(f"📍 Watermark {table}: {len(marks or {})} mã, mốc cũ nhất {oldest}")
+        return True
+
+    def _bootstrap_watermarks(self):
+        """Lần đầu chạy incremental: mốc của từng mã = dữ liệu đã có trong DWH thật"""
+        conn = self._get_conn(DWH_CONFIG)
+        if not conn: return
+        try:
+            cursor = conn.cursor()
+            if 'fact_price_history' not in self.watermarks:
+                cursor.execute("""
+                    SELECT dc.symbol, MAX(f.date_id)
+                    FROM fact_price_history f JOIN dim_company dc ON f.company_id = dc.id
+                    GROUP BY dc.symbol
+                """)
+                marks = {symbol: str(date_id) for symbol, date_id in cursor.fetchall() if date_id is not None}
+                if marks:
+                    self.watermarks['fact_price_history'] = marks
+            if 'fact_financial_ratio' not in self.watermarks:
+                cursor.execute("""
+                    SELECT dc.symbol, f.year, MAX(f.period)
+                    FROM fact_financial_ratio f JOIN dim_company dc ON f.company_id = dc.id
+                    WHERE (f.company_id, f.year) IN (
+                        SELECT company_id, MAX(year) FROM fact_financial_ratio GROUP BY company_id
+                    )
+                    GROUP BY dc.symbol, f.year
+                """)
+                marks = {symbol: f"{year}-{period}" for symbol, year, period in cursor.fetchall()}
+                if marks:
+                    self.watermarks['fact_financial_ratio'] = marks
+        except mysql.connector.Error as err:
+            print(f"⚠️ Không đọc được mốc từ DWH thật, load toàn bộ: {err}")
+        finally:
+            conn.close()
+
+    def _unmarked_symbols(self, table):
+        """Mã trong dim_company của Staging chưa có mốc (mã mới): lấy toàn bộ dòng của mã đó"""
+        marks = self.watermarks[table]
+        return [row[0] for row in self.data_companies if row[0] not in marks]
+
+    @staticmethod
+    def _symbol_clause(condition, symbols):
+        if not symbols:
+            return condition, ()
+        return f"{condition} OR dc.symbol IN ({', '.join(['%s'] * len(symbols))})", tuple(symbols)
+
+    def _price_filter(self):
+        """Lọc thô trong SQL theo mốc cũ nhất trong các mã; _after_watermark lọc lại đúng mốc từng mã"""
+        marks = self.watermarks.get('fact_price_history')
+        if not marks:
+            return "", ()
+        oldest = min(marks.values(), key=parse_date_id)
+        where, params = self._symbol_clause("f.date_id > %s", self._unmarked_symbols('fact_price_history'))
+        if self.window_start:
+            # Job backfill có thể mang ngày cũ hơn mốc: luôn lấy cả khoảng ngày của job
+            where += " OR f.date_id >= %s"
+            params += (date_id_like(parse_date_id(self.window_start), oldest),)
+        return f" WHERE {where}", (oldest, *params)
+
+    def _ratio_filter(self):
+        marks = self.watermarks.get('fact_financial_ratio')
+        if not marks:
+            return "", ()
+        year, period = min(ratio_key(mark) for mark in marks.values())
+        where, params = self._symbol_clause("f.year > %s OR (f.year = %s AND f.period > %s)",
+                                            self._unmarked_symbols('fact_financial_ratio'))
+        return f" WHERE {where}", (year, year, period, *params)
+
+    def _after_watermark(self, table, rows, key):
+        """Bỏ các dòng không mới hơn mốc của chính mã đó (giữ lại ngày trong khoảng của job backfill)"""
+        marks = self.watermarks.get(table)
+        if not marks:
+            return rows
+        window = parse_date_id(self.window_start) if self.window_start and table == 'fact_price_history' else None
+        to_key = MARK_KEYS[table]
+        kept = []
+        for row in rows:
+            mark = marks.get(row[0])
+            value = key(row)
+            if mark is None or value > to_key(mark) or (window and value >= window):
+                kept.append(row)
+        return kept
+
     # --- BƯỚC 2: EXTRACT TỪ STAGING (MIRROR DWH) ---
     def extract_from_staging(self):
         print("🚀 Đang lấy dữ liệu từ Server Staging (Mirror DWH)...")
@@ -114,8 +266,11 @@ class LoadDwhJob:
                         FROM fact_price_history f
                                  JOIN dim_company dc ON f.company_id = dc.id \
                         """
-            cursor.execute(sql_price)
-            self.data_prices = cursor.fetchall()
+            # Chỉ lấy các ngày sau watermark (không có watermark = toàn bộ)
+            where, params = self._price_filter()
+            cursor.execute(sql_price + where, params)
+            self.data_prices = self._after_watermark('fact_price_history', cursor.fetchall(),
+                                                     lambda row: parse_date_id(row[1]))
             print(f"   -> Đã lấy {len(self.data_prices)} dòng giá.")
 
             # 2.3 Lấy Fact Financial
@@ -124,8 +279,10 @@ class LoadDwhJob:
                       FROM fact_financial_ratio f
                                JOIN dim_company dc ON f.company_id = dc.id \
                       """
-            cursor.execute(sql_fin)
-            self.data_financials = cursor.fetchall()
+            where, params = self._ratio_filter()
+            cursor.execute(sql_fin + where, params)
+            self.data_financials = self._after_watermark('fact_financial_ratio', cursor.fetchall(),
+                                                         lambda row: (int(row[1]), int(row[2])))
             print(f"   -> Đã lấy {len(self.data_financials)} dòng tài chính.")
 
             return True
@@ -221,49 +378,78 @@ class LoadDwhJob:
         finally:
             conn.close()
 
+    def new_watermarks(self):
+        """Mốc mới của từng mã sau khi load: không bao giờ lùi (job backfill chỉ mang ngày cũ).
+        Trả về list (bảng, mã, mốc)"""
+        marks = []
+        for table, rows, mark_of in (
+            ('fact_price_history', self.data_prices, lambda row: str(row[1])),
+            ('fact_financial_ratio', self.data_financials, lambda row: f"{int(row[1])}-{int(row[2])}"),
+        ):
+            to_key = MARK_KEYS[table]
+            latest = {}
+            for row in rows:
+                mark = mark_of(row)
+                if row[0] not in latest or to_key(mark) > to_key(latest[row[0]]):
+                    latest[row[0]] = mark
+            current = {} if self.full_reload else self.watermarks.get(table, {})
+            marks.extend((table, symbol, mark) for symbol, mark in latest.items()
+                         if symbol not in current or to_key(mark) > to_key(current[symbol]))
+        return marks
+
     # --- BƯỚC 4: HOÀN TẤT ---
     def finalize_job(self):
+        self.logger.log(self.config_id, 'SUCCESS', 'Final Load to Real DWH Complete')
         conn = self._get_conn(CONTROLLER_CONFIG)
         if not conn: return
         try:
             cursor = conn.cursor()
+            # Dữ liệu đã commit bên DWH thật: tiến mốc cùng lúc với trạng thái DW_LOADED
+            marks = self.new_watermarks()
+            if marks:
+                self.ensure_watermark_table(cursor)
+                cursor.executemany("""
+                    INSERT INTO load_watermark_symbol (table_name, symbol, watermark, id_config)
+                    VALUES (%s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE watermark = VALUES(watermark), id_config = VALUES(id_config)
+                """, [(table, symbol, mark, self.config_id) for table, symbol, mark in marks])
+                print(f"📍 Watermark mới: {len(marks)} mã / bảng được tiến mốc.")
             # Kết thúc chu trình: Flag = 0, Status = DW_LOADED
             query = "UPDATE config SET status = 'DW_LOADED', is_processing = FALSE, flag = 1 WHERE id = %s"
             cursor.execute(query, (self.config_id,))
-            # MỚI (Đúng): Thêm (self.config_id,) vào cuối
-            cursor.execute(
-                "INSERT INTO logging (id_config, status, description) VALUES (%s, 'SUCCESS', 'Final Load to Real DWH Complete')",
-                (self.config_id,)
-            )
-            # ------------------------
-
-            conn.commit()
+            with self.logger.flush_with(cursor):
+                conn.commit()
             print("🏁 Job Hoàn tất: DW_LOADED")
         finally:
             conn.close()
 
     # --- HỖ TRỢ: BÁO LỖI ---
     def report_error(self, msg):
+        self.logger.log(self.config_id, 'ERR', msg)
         conn = self._get_conn(CONTROLLER_CONFIG)
         if not conn: return
         try:
             cursor = conn.cursor()
             cursor.execute("UPDATE config SET status = 'ERR_DWH', is_processing = FALSE WHERE id = %s",
                            (self.config_id,))
-            cursor.execute("INSERT INTO logging (id_config, status, description) VALUES (%s, 'ERR', %s)",
-                           (self.config_id, msg))
-            conn.commit()
+            with self.logger.flush_with(cursor):
+                conn.commit()
         finally:
             conn.close()
 
 
 def main():
-    job = LoadDwhJob()
+    parser = argparse.ArgumentParser(description="Load new DWH facts from the staging mirror into the real DWH")
+    parser.add_argument('--full-reload', action='store_true',
+                        help='Ignore the load watermarks and re-send every fact row')
+    args = parser.parse_args()
+
+    job = LoadDwhJob(full_reload=args.full_reload)
 
     # 1. Tìm Job (TRANSFORMED)
     if job.get_job_to_load():
-        # 2. Lấy dữ liệu từ Staging (Đã được validate cấu trúc)
-        if job.extract_from_staging():
+        # 2. Lấy dữ liệu từ Staging (Đã được validate cấu trúc), chỉ các dòng sau watermark
+        if job.load_watermarks() and job.extract_from_staging():
             # 3. Đẩy sang DWH Thật
             if job.load_to_real_dwh():
                 # 4. Hoàn tất
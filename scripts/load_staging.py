@@ -1,10 +1,18 @@
 import pandas as pd
+import pyarrow as pa
 import mysql.connector
 import os
 import sys
 import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
+from job_logger import get_job_logger
+from crawl_writer import pandas_column_names, parquet_partition_path, read_parquet_partition
+from manifest import read_manifest
+from staging_codec import available_codecs, compress_payload
 
 load_dotenv()
 
@@ -27,13 +35,169 @@ STAGING_DB_CONFIG = {
 
 DATE_FORMAT = '%Y-%m-%d'
 
+# Cột trong staging_raw_data -> tên dataset (tiền tố file) do crawl_data.py ghi ra
+DATASET_COLUMNS = {
+    "company_overview_data": "company_overview",
+    "finance_ratio_data": "finance_ratio",
+    "listing_exchange_data": "listing_exchange",
+    "listing_industries_data": "listing_industries",
+    "price_history_data": "price_history"
+}
+
+# row: 5 dataset trong một dòng staging_raw_data (cũ)
+# chunked: mỗi dataset được chia thành nhiều dòng staging_raw_chunk theo nhóm mã,
+#          mỗi dòng tối đa STAGING_CHUNK_ROWS bản ghi
+STAGING_MODE = os.getenv("STAGING_MODE", "row")
+STAGING_CHUNK_ROWS = int(os.getenv("STAGING_CHUNK_ROWS", "5000"))
+# Số file đọc song song
+STAGING_READ_WORKERS = int(os.getenv("STAGING_READ_WORKERS", "5"))
+# Nạp vào bảng <tên>_shadow rồi RENAME nguyên tử, bảng cũ được giữ lại thành <tên>_prev để rollback
+STAGING_SWAP = os.getenv("STAGING_SWAP", "0") == "1"
+SHADOW_SUFFIX = "_shadow"
+PREVIOUS_SUFFIX = "_prev"
+# Nén payload trong staging_raw_chunk (none | zlib | zstd); khác none thì chế độ row cũng đi qua
+# staging_raw_chunk (một chunk duy nhất) vì staging_raw_data là đầu vào JSON thô của Parse_JSON_To_ODS.
+# Với engine procedure, transform phải giải nén rồi INSERT lại JSON thô: chỉ có lợi khi TRANSFORM_ENGINE=python
+# (xem bench_staging.py --engine)
+STAGING_CODEC = os.getenv("STAGING_CODEC", "none")
+# Cột của staging_raw_data ghi hash manifest (JSON dataset -> sha256) của dữ liệu đang nằm trong dòng đó.
+# Ghi bằng INSERT không kèm cột này (transform nạp lại chunk) thì NULL: không dataset nào được dùng lại
+STAGED_HASH_COLUMN = "manifest_hashes"
+# Job có dữ liệu đã vào DWH: manifest của các job này được dùng để so sánh
+MANIFEST_BASE_STATUSES = ('TRANSFORMED', 'LOADING_DWH', 'DW_LOADED', 'ERR_DWH', 'AGGREGATING', 'AGGREGATED', 'ERR_AGG')
+
+
+def stringify_dates(df):
+    """Giữ ngày dạng chuỗi ('YYYY-MM-DD') như khi đọc CSV bằng pandas, thay vì epoch khi to_json"""
+    for col in df.columns:
+        if pd.api.types.infer_dtype(df[col], skipna=True) in ("date", "datetime", "datetime64"):
+            df[col] = df[col].astype(str).where(df[col].notna(), None)
+    return df
+
+
+def read_dataset(col, full_path, file_format):
+    if file_format == "parquet":
+        # Part Parquet mang sẵn kiểu như khi đọc CSV, tên cột được đặt lại theo header CSV lưu trong metadata
+        df = read_parquet_partition(full_path)
+    else:
+        # Engine pyarrow đọc đa luồng và nhả GIL, nên nhiều file đọc song song được
+        df = pd.read_csv(full_path, header=1 if col == "finance_ratio_data" else 0, engine="pyarrow")
+        df.columns = pandas_column_names(df.columns)
+    return stringify_dates(df)
+
+
+def records_json(df):
+    """Payload JSON của một dataset, giống to_json(orient='records') của bản cũ"""
+    return df.to_json(orient='records', force_ascii=False)
+
+
+def peak_memory_mb():
+    """Bộ nhớ đỉnh của process (MB)"""
+    try:
+        import resource
+        # Linux trả về KB
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 1024 / 1024
+
+
+def prepare_shadow(cursor, table):
+    """Tạo bảng shadow rỗng cùng cấu trúc với bảng đang dùng"""
+    shadow = table + SHADOW_SUFFIX
+    cursor.execute(f"DROP TABLE IF EXISTS {shadow}")
+    cursor.execute(f"CREATE TABLE {shadow} LIKE {table}")
+    return shadow
+
+
+def swap_in(cursor, table):
+    """Đưa shadow thành bảng chính trong một câu RENAME (nguyên tử), bảng cũ thành bản _prev"""
+    previous = table + PREVIOUS_SUFFIX
+    cursor.execute(f"DROP TABLE IF EXISTS {previous}")
+    cursor.execute(f"RENAME TABLE {table} TO {previous}, {table + SHADOW_SUFFIX} TO {table}")
+
+
+def rollback_table(cursor, table):
+    """Đổi chỗ bảng chính và bản _prev (chạy lại lần nữa để quay về)"""
+    previous, temp = table + PREVIOUS_SUFFIX, table + "_swap"
+    cursor.execute(f"RENAME TABLE {table} TO {temp}, {previous} TO {table}, {temp} TO {previous}")
+
+
+def symbol_column(df):
+    """Cột mã cổ phiếu của dataset (finance_ratio đọc từ CSV header=1 dùng cột CP)"""
+    for name in ("symbol", "CP", "ticker"):
+        if name in df.columns:
+            return name
+    return None
+
+
+def plan_symbol_chunks(frames, max_rows=STAGING_CHUNK_ROWS):
+    """Nhóm các mã sao cho trong mỗi chunk, mỗi dataset có không quá max_rows bản ghi.
+    Mọi dataset của cùng một mã nằm chung một chunk nên từng chunk được parse độc lập."""
+    counts = {}
+    for col, df in frames.items():
+        column = symbol_column(df)
+        if column is None:
+            continue
+        for symbol, rows in df[column].astype(str).value_counts().items():
+            counts.setdefault(symbol, {})[col] = rows
+
+    groups, current, totals = [], [], {}
+    for symbol in sorted(counts):
+        rows = counts[symbol]
+        if current and any(totals.get(col, 0) + n > max_rows for col, n in rows.items()):
+            groups.append(current)
+            current, totals = [], {}
+        current.append(symbol)
+        for col, n in rows.items():
+            totals[col] = totals.get(col, 0) + n
+    if current:
+        groups.append(current)
+    return groups
+
+
+def split_into_chunks(frames, groups):
+    """Sinh (dataset, chunk_index, symbols, số bản ghi, JSON) cho từng phần của mỗi dataset.
+    Dataset không có cột mã được đưa nguyên vào chunk 0."""
+    chunk_of = {symbol: i for i, symbols in enumerate(groups) for symbol in symbols}
+    for col, df in frames.items():
+        column = symbol_column(df)
+        if column is None:
+            yield col, 0, groups[0] if groups else [], len(df), df.to_json(orient='records', force_ascii=False)
+            continue
+        chunk_ids = df[column].astype(str).map(chunk_of)
+        for chunk_index, part in df.groupby(chunk_ids, sort=True):
+            chunk_index = int(chunk_index)
+            yield (col, chunk_index, groups[chunk_index], len(part),
+                   part.to_json(orient='records', force_ascii=False))
+
 
 class StagingLoadJob:
-    def __init__(self):
+    def __init__(self, mode=STAGING_MODE, chunk_rows=STAGING_CHUNK_ROWS, skip_unchanged=True,
+                 read_workers=STAGING_READ_WORKERS, swap=STAGING_SWAP, codec=STAGING_CODEC):
         self.job_config = None
         self.config_id = None
         self.file_mapping = {}
         self.data_payload = {}
+        self.mode = mode
+        self.chunk_rows = chunk_rows
+        self.codec = codec
+        if codec != "none" and mode == "row":
+            # Payload nén được chuyển qua staging_raw_chunk, cả job trong một chunk
+            self.mode, self.chunk_rows = "chunked", sys.maxsize
+        # Chế độ chunked giữ DataFrame, JSON được tạo theo từng chunk khi insert
+        self.frames = {}
+        # Manifest của job (hash + số dòng từng file) và các dataset không đổi so với lần load trước
+        self.skip_unchanged = skip_unchanged
+        self.manifest = None
+        self.skipped = []
+        # Chế độ row: cột staging_raw_data đang chứa đúng dataset của job (cùng hash), không đọc / gửi lại
+        self.reused = []
+        self.staged_hashes = None
+        self.read_workers = max(1, read_workers)
+        self.swap = swap
+        self.logger = get_job_logger(CONTROLLER_DB_CONFIG)
 
     def _get_conn(self, config):
         try:
@@ -80,20 +244,18 @@ class StagingLoadJob:
         date_tag = self.job_config['data_date_end'].strftime(DATE_FORMAT)
         path = self.job_config['path']
 
-        # Định nghĩa tên file cần check
-        self.file_mapping = {
-            "company_overview_data": f"company_overview_{date_tag}.csv",
-            "finance_ratio_data": f"finance_ratio_{date_tag}.csv",
-            "listing_exchange_data": f"listing_exchange_{date_tag}.csv",
-            "listing_industries_data": f"listing_industries_{date_tag}.csv",
-            "price_history_data": f"price_history_{date_tag}.csv"
-        }
-
+        # Mỗi dataset có thể ở dạng partition Parquet (ưu tiên) hoặc file CSV
+        self.file_mapping = {}
         missing_files = []
-        for col, filename in self.file_mapping.items():
-            full_path = os.path.join(path, filename)
-            if not os.path.exists(full_path):
-                missing_files.append(filename)
+        for col, dataset in DATASET_COLUMNS.items():
+            parquet_dir = parquet_partition_path(path, dataset, date_tag)
+            csv_path = os.path.join(path, f"{dataset}_{date_tag}.csv")
+            if os.path.isdir(parquet_dir):
+                self.file_mapping[col] = (parquet_dir, "parquet")
+            elif os.path.exists(csv_path):
+                self.file_mapping[col] = (csv_path, "csv")
+            else:
+                missing_files.append(f"{dataset}_{date_tag}.csv")
 
         if missing_files:
             print(f"❌ LỖI NGHIÊM TRỌNG: Thiếu các file sau: {missing_files}")
@@ -101,9 +263,109 @@ class StagingLoadJob:
             self.report_error(f"Missing files: {str(missing_files)}")
             return False  # <-- Dừng quy trình tại đây
 
-        print("✅ Đã tìm thấy đầy đủ 5 file CSV.")
+        print("✅ Đã tìm thấy đầy đủ 5 file dữ liệu.")
+        self.manifest = read_manifest(path, date_tag)
+        if self.skip_unchanged and self.manifest:
+            self._skip_unchanged_datasets()
+            if not self.skipped and self.mode == "row":
+                self._reuse_staged_datasets()
         return True
 
+    def _job_hashes(self):
+        """Hash manifest của job theo dataset, dạng JSON ổn định để lưu / so sánh trong staging_raw_data"""
+        datasets = (self.manifest or {}).get("datasets", {})
+        return json.dumps({dataset: entry["sha256"] for dataset, entry in datasets.items()}, sort_keys=True)
+
+    @staticmethod
+    def ensure_staged_hash_column(cursor):
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = 'staging_raw_data' AND column_name = %s
+        """, (STAGED_HASH_COLUMN,))
+        if not cursor.fetchone()[0]:
+            cursor.execute(f"ALTER TABLE staging_raw_data ADD COLUMN {STAGED_HASH_COLUMN} TEXT NULL")
+
+    def _reuse_staged_datasets(self):
+        """Dataset có hash trùng với dữ liệu đang nằm trong staging_raw_data thì không đọc file và không gửi lại:
+        dòng staging chỉ được cập nhật các cột thay đổi, Parse_JSON_To_ODS vẫn nhận đủ 5 payload"""
+        conn = self._get_conn(STAGING_DB_CONFIG)
+        if not conn: return
+        try:
+            cursor = conn.cursor()
+            self.ensure_staged_hash_column(cursor)
+            cursor.execute(f"SELECT {STAGED_HASH_COLUMN} FROM staging_raw_data LIMIT 2")
+            rows = cursor.fetchall()
+        except mysql.connector.Error as err:
+            print(f"Staged hash lookup failed, staging every dataset: {err}")
+            return
+        finally:
+            conn.close()
+        if len(rows) != 1 or not rows[0][0]:
+            return
+        self.staged_hashes = rows[0][0]
+        staged, current = json.loads(self.staged_hashes), json.loads(self._job_hashes())
+        self.reused = [col for col, dataset in DATASET_COLUMNS.items()
+                       if current.get(dataset) and staged.get(dataset) == current[dataset]]
+        for col in self.reused:
+            self.file_mapping.pop(col, None)
+        if self.reused:
+            print(f"♻️ {len(self.reused)}/{len(DATASET_COLUMNS)} dataset đã có sẵn trong staging_raw_data, "
+                  f"không đọc / gửi lại: {', '.join(self.reused)}")
+
+    @staticmethod
+    def ensure_manifest_table(cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS file_manifest (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                id_config INT NOT NULL,
+                dataset VARCHAR(64) NOT NULL,
+                content_hash CHAR(64) NOT NULL,
+                row_count INT,
+                skipped BOOLEAN NOT NULL DEFAULT FALSE,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE KEY uq_file_manifest (id_config, dataset)
+            )
+        """)
+
+    def _previous_hashes(self):
+        """Hash các dataset của job gần nhất đã load thành công (dữ liệu đã vào DWH)"""
+        conn = self._get_conn(CONTROLLER_DB_CONFIG)
+        if not conn: return {}
+        try:
+            cursor = conn.cursor()
+            self.ensure_manifest_table(cursor)
+            placeholders = ', '.join(['%s'] * len(MANIFEST_BASE_STATUSES))
+            cursor.execute(f"""
+                SELECT MAX(m.id_config) FROM file_manifest m JOIN config c ON c.id = m.id_config
+                WHERE c.status IN ({placeholders}) AND m.id_config <> %s
+            """, (*MANIFEST_BASE_STATUSES, self.config_id))
+            previous_id = cursor.fetchone()[0]
+            if not previous_id:
+                return {}
+            cursor.execute("SELECT dataset, content_hash FROM file_manifest WHERE id_config = %s", (previous_id,))
+            return dict(cursor.fetchall())
+        except mysql.connector.Error as err:
+            print(f"Manifest lookup failed, loading every dataset: {err}")
+            return {}
+        finally:
+            conn.close()
+
+    def _skip_unchanged_datasets(self):
+        """Chỉ bỏ qua khi cả 5 dataset đều không đổi: Parse_JSON_To_ODS và engine Python thay toàn bộ
+        các bảng ODS, một dataset gửi dạng mảng rỗng sẽ làm rỗng bảng ODS tương ứng"""
+        previous = self._previous_hashes()
+        datasets = self.manifest.get("datasets", {})
+        unchanged = [dataset for dataset in DATASET_COLUMNS.values()
+                     if datasets.get(dataset) and previous.get(dataset) == datasets[dataset]["sha256"]]
+        if len(unchanged) < len(DATASET_COLUMNS):
+            if unchanged:
+                print(f"ℹ️ {len(unchanged)}/{len(DATASET_COLUMNS)} dataset không đổi, vẫn stage đủ 5 dataset.")
+            return
+        # Không đọc / gửi lại gì, transform_data.py bỏ qua parse và sync của job này
+        self.file_mapping = {}
+        self.skipped = unchanged
+        print(f"⏭️ Cả {len(unchanged)} dataset không đổi so với lần load trước, không stage lại.")
+
     # --- BƯỚC 3: Lock Job & Đọc File ---
     def lock_and_read_files(self):
         """Khóa Job và đọc nội dung file vào bộ nhớ"""
@@ -119,19 +381,23 @@ class StagingLoadJob:
             cursor.execute(update_query, (self.config_id,))
             conn.commit()
 
-            # Đọc file (Lúc này đã chắc chắn file tồn tại nhờ Bước 2)
-            path = self.job_config['path']
-            for col, filename in self.file_mapping.items():
-                full_path = os.path.join(path, filename)
-
-                if "finance_ratio" in filename:
-                    df = pd.read_csv(full_path, header=1)
-                else:
-                    df = pd.read_csv(full_path)
-                # Chuyển thành JSON
-                self.data_payload[col] = df.to_json(orient='records', force_ascii=False)
-
-            print("✅ Đã đọc và chuyển đổi dữ liệu sang JSON.")
+            # Đọc file (Lúc này đã chắc chắn file tồn tại nhờ Bước 2), mỗi file một luồng
+            started = time.perf_counter()
+            items = list(self.file_mapping.items())
+            workers = min(self.read_workers, len(items)) or 1
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for col, payload in executor.map(lambda item: self._read_one(*item), items):
+                    if self.mode == "chunked":
+                        self.frames[col] = payload
+                    else:
+                        self.data_payload[col] = payload
+            elapsed = time.perf_counter() - started
+
+            arrow_peak = pa.default_memory_pool().max_memory() / 1024 / 1024
+            report = (f"Read {len(items)} datasets in {elapsed:.2f}s ({workers} threads), "
+                      f"peak RSS {peak_memory_mb():.0f} MB, arrow peak {arrow_peak:.0f} MB")
+            print(f"✅ Đã đọc và chuyển đổi dữ liệu sang JSON. {report}")
+            self.logger.log(self.config_id, 'INFO', report)
             return True
         except Exception as e:
             print(f"Lỗi khi đọc/lock: {e}")
@@ -139,10 +405,36 @@ class StagingLoadJob:
         finally:
             conn.close()
 
+    def _read_one(self, col, file_info):
+        """Đọc một dataset; chế độ row chuyển luôn sang JSON trong luồng đọc"""
+        df = read_dataset(col, *file_info)
+        if self.mode == "chunked":
+            return col, df
+        return col, records_json(df)
+
+    def _target_table(self, cursor, table):
+        """Bảng để insert: shadow (chế độ swap) hoặc chính bảng đó sau khi TRUNCATE"""
+        if self.swap:
+            print(f"🪞 Đang nạp vào bảng {table + SHADOW_SUFFIX}...")
+            return prepare_shadow(cursor, table)
+        print(f"🧹 Đang dọn dẹp bảng {table}...")
+        cursor.execute(f"TRUNCATE TABLE {table}")
+        return table
+
+    def _publish(self, cursor, table):
+        if self.swap:
+            swap_in(cursor, table)
+            print(f"🔁 Đã swap {table + SHADOW_SUFFIX} -> {table} (bản cũ: {table + PREVIOUS_SUFFIX})")
+
     # --- BƯỚC 4: Load vào Staging ---
         # ... (Các phần khác giữ nguyên)
 
     def load_to_staging(self):
+            if self.skipped:
+                # Giữ nguyên Staging: transform nhận biết job không đổi qua file_manifest.skipped
+                return True
+            if self.mode == "chunked":
+                return self.load_chunks_to_staging()
             conn = self._get_conn(STAGING_DB_CONFIG)
             if not conn:
                 print("❌ Không thể kết nối Staging DB.")
@@ -151,29 +443,19 @@ class StagingLoadJob:
 
             try:
                 cursor = conn.cursor()
-
-                # ===> THÊM ĐOẠN NÀY: Xóa sạch dữ liệu cũ trước khi load mới <===
-                print("🧹 Đang dọn dẹp bảng staging_raw_data...")
-                cursor.execute("TRUNCATE TABLE staging_raw_data")
-                # ==============================================================
-
-                insert_query = """
-                               INSERT INTO staging_raw_data
-                               (company_overview_data, finance_ratio_data, listing_exchange_data,
-                                listing_industries_data, price_history_data)
-                               VALUES (%s, %s, %s, %s, %s) \
-                               """
-
-                values = (
-                    self.data_payload["company_overview_data"],
-                    self.data_payload["finance_ratio_data"],
-                    self.data_payload["listing_exchange_data"],
-                    self.data_payload["listing_industries_data"],
-                    self.data_payload["price_history_data"]
-                )
-
-                cursor.execute(insert_query, values)
+                self.ensure_staged_hash_column(cursor)
+                if self.reused:
+                    self._update_changed_columns(cursor)
+                else:
+                    # Xóa dữ liệu cũ trước khi load mới, hoặc nạp vào bảng shadow (chế độ swap)
+                    target = self._target_table(cursor, "staging_raw_data")
+                    columns = [*DATASET_COLUMNS, STAGED_HASH_COLUMN]
+                    cursor.execute(
+                        f"INSERT INTO {target} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+                        [*(self.data_payload[col] for col in DATASET_COLUMNS), self._job_hashes()]
+                    )
                 conn.commit()
+                self._publish(cursor, "staging_raw_data")
                 print("✅ Đã Insert vào Staging DB thành công.")
                 return True
             except Exception as e:
@@ -183,28 +465,149 @@ class StagingLoadJob:
             finally:
                 conn.close()
 
+    def _update_changed_columns(self, cursor):
+        """Chỉ ghi các cột thay đổi, cột dùng lại được giữ / copy ngay trên server. Điều kiện theo hash đã đọc lúc
+        kiểm tra file: staging_raw_data bị ghi đè giữa chừng thì báo lỗi thay vì ghép payload của hai job"""
+        changed = [col for col in DATASET_COLUMNS if col not in self.reused]
+        hashes = self._job_hashes()
+        if self.swap:
+            target = self._target_table(cursor, "staging_raw_data")
+            values = ', '.join('%s' if col in changed else col for col in DATASET_COLUMNS)
+            cursor.execute(f"""
+                INSERT INTO {target} ({', '.join(DATASET_COLUMNS)}, {STAGED_HASH_COLUMN})
+                SELECT {values}, %s FROM staging_raw_data WHERE {STAGED_HASH_COLUMN} = %s
+            """, [*(self.data_payload[col] for col in changed), hashes, self.staged_hashes])
+        elif hashes == self.staged_hashes:
+            print("✅ staging_raw_data đã chứa đúng dữ liệu của job, không cần ghi.")
+            return
+        else:
+            assignments = ', '.join(f"{col} = %s" for col in [*changed, STAGED_HASH_COLUMN])
+            cursor.execute(f"UPDATE staging_raw_data SET {assignments} WHERE {STAGED_HASH_COLUMN} = %s",
+                           [*(self.data_payload[col] for col in changed), hashes, self.staged_hashes])
+        if cursor.rowcount != 1:
+            raise RuntimeError("staging_raw_data changed after the files were checked, rerun the job")
+        print(f"✏️ Đã ghi {len(changed)} cột thay đổi: {', '.join(changed) or '-'}")
+
+    @staticmethod
+    def ensure_chunk_table(cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS staging_raw_chunk (
+                id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                id_config INT NOT NULL,
+                dataset VARCHAR(64) NOT NULL,
+                chunk_index INT NOT NULL,
+                symbols TEXT NOT NULL,
+                row_count INT NOT NULL,
+                codec VARCHAR(16) NOT NULL DEFAULT 'none',
+                raw_bytes BIGINT NULL,
+                payload LONGBLOB NOT NULL,
+                UNIQUE KEY uq_staging_raw_chunk (id_config, dataset, chunk_index)
+            )
+        """)
+        # Bảng tạo trước khi có cột codec: payload LONGTEXT -> LONGBLOB (giữ nguyên bytes UTF-8)
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = 'staging_raw_chunk' AND column_name = 'codec'
+        """)
+        if not cursor.fetchone()[0]:
+            cursor.execute("""
+                ALTER TABLE staging_raw_chunk
+                    ADD COLUMN codec VARCHAR(16) NOT NULL DEFAULT 'none' AFTER row_count,
+                    ADD COLUMN raw_bytes BIGINT NULL AFTER codec,
+                    MODIFY payload LONGBLOB NOT NULL
+            """)
+
+    def load_chunks_to_staging(self):
+        """Ghi mỗi phần dataset thành một dòng riêng, mỗi câu INSERT chỉ mang một chunk"""
+        conn = self._get_conn(STAGING_DB_CONFIG)
+        if not conn:
+            print("❌ Không thể kết nối Staging DB.")
+            self.report_error("Connection failed to Staging DB")
+            return False
+
+        try:
+            cursor = conn.cursor()
+            self.ensure_chunk_table(cursor)
+            target = self._target_table(cursor, "staging_raw_chunk")
+            # transform_data.py tự nạp từng chunk vào staging_raw_data: không để lại dữ liệu job cũ
+            cursor.execute("TRUNCATE TABLE staging_raw_data")
+
+            groups = plan_symbol_chunks(self.frames, self.chunk_rows)
+            insert_query = f"""
+                INSERT INTO {target}
+                (id_config, dataset, chunk_index, symbols, row_count, codec, raw_bytes, payload)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """
+            total_chunks = raw_bytes = sent_bytes = 0
+            for col, chunk_index, symbols, row_count, payload in split_into_chunks(self.frames, groups):
+                data = compress_payload(payload, self.codec)
+                size = len(payload.encode('utf-8'))
+                cursor.execute(insert_query, (self.config_id, col, chunk_index, json.dumps(symbols),
+                                              row_count, self.codec, size, data))
+                total_chunks += 1
+                raw_bytes += size
+                sent_bytes += len(data)
+            conn.commit()
+            self._publish(cursor, "staging_raw_chunk")
+            print(f"✅ Đã Insert {total_chunks} chunk ({len(groups)} nhóm mã) vào Staging DB.")
+            if self.codec != "none":
+                report = (f"Payload {self.codec}: {raw_bytes / 1024 / 1024:.1f} MB -> "
+                          f"{sent_bytes / 1024 / 1024:.1f} MB ({sent_bytes / raw_bytes if raw_bytes else 1:.1%})")
+                print(f"🗜️ {report}")
+                self.logger.log(self.config_id, 'INFO', report)
+            return True
+        except Exception as e:
+            print(f"❌ Lỗi Insert Staging: {e}")
+            conn.rollback()
+            self.report_error(f"Staging Insert Error: {str(e)}")
+            return False
+        finally:
+            conn.close()
+
     # --- BƯỚC 5: Hoàn tất ---
     def finalize_success(self):
+        # Ghi Log, cùng transaction với trạng thái ST_LOADED
+        message = 'Loaded to Staging'
+        if self.skipped:
+            message += f" (unchanged, skipped: {', '.join(self.skipped)})"
+        elif self.reused:
+            message += f" (reused staged columns: {', '.join(self.reused)})"
+        self.logger.log(self.config_id, 'SUCCESS', message)
         conn = self._get_conn(CONTROLLER_DB_CONFIG)
         if not conn: return
         try:
             cursor = conn.cursor()
+            if self.manifest:
+                # DDL tự commit: tạo bảng trước khi mở transaction của trạng thái, manifest và log
+                self.ensure_manifest_table(cursor)
             # Thành công: flag=0 để kết thúc chuỗi ETL này
             query = "UPDATE config SET status = 'ST_LOADED', is_processing = FALSE, flag = 1 WHERE id = %s"
             cursor.execute(query, (self.config_id,))
 
-            # Ghi Log
-            log_query = "INSERT INTO logging (id_config, status, description) VALUES (%s, 'SUCCESS', 'Loaded to Staging')"
-            cursor.execute(log_query, (self.config_id,))
-
-            conn.commit()
+            if self.manifest:
+                self._record_manifest(cursor)
+            with self.logger.flush_with(cursor):
+                conn.commit()
             print("🎉 Job hoàn tất thành công (ST_LOADED).")
         finally:
             conn.close()
 
+    def _record_manifest(self, cursor):
+        """Lưu hash của job này làm mốc so sánh cho các lần load sau (bảng đã được tạo trước transaction)"""
+        cursor.executemany("""
+            INSERT INTO file_manifest (id_config, dataset, content_hash, row_count, skipped)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE content_hash = VALUES(content_hash), row_count = VALUES(row_count),
+                                    skipped = VALUES(skipped)
+        """, [
+            (self.config_id, dataset, entry["sha256"], entry["rows"], dataset in self.skipped)
+            for dataset, entry in self.manifest.get("datasets", {}).items()
+        ])
+
     # --- Hỗ trợ: Báo lỗi ---
     def report_error(self, message):
         """Cập nhật trạng thái lỗi vào DB để không bị kẹt Job"""
+        self.logger.log(self.config_id, 'ERR', message)
         conn = self._get_conn(CONTROLLER_DB_CONFIG)
         if not conn: return
         try:
@@ -213,17 +616,53 @@ class StagingLoadJob:
             # Ở đây tôi để flag=0 và status=ERR_FILE để bạn kiểm tra thủ công
             query = "UPDATE config SET status = 'ERR_STAGING', is_processing = FALSE, flag = 0 WHERE id = %s"
             cursor.execute(query, (self.config_id,))
-
-            log_query = "INSERT INTO logging (id_config, status, description) VALUES (%s, 'ERR', %s)"
-            cursor.execute(log_query, (self.config_id, message))
-            conn.commit()
+            with self.logger.flush_with(cursor):
+                conn.commit()
             print(f"⚠️ Đã cập nhật trạng thái lỗi cho Job {self.config_id}")
         finally:
             conn.close()
 
 
+def rollback_staging(table):
+    try:
+        conn = mysql.connector.connect(**STAGING_DB_CONFIG)
+    except mysql.connector.Error as err:
+        print(f"Connection Error: {err}")
+        return False
+    try:
+        rollback_table(conn.cursor(), table)
+        print(f"⏪ Đã khôi phục {table} từ {table + PREVIOUS_SUFFIX}.")
+        return True
+    except mysql.connector.Error as err:
+        print(f"❌ Rollback {table} thất bại: {err}")
+        return False
+    finally:
+        conn.close()
+
+
 def main():
-    job = StagingLoadJob()
+    parser = argparse.ArgumentParser(description="Load crawled files into the staging DB")
+    parser.add_argument('--mode', choices=['row', 'chunked'], default=STAGING_MODE,
+                        help='row: one staging_raw_data row, chunked: bounded staging_raw_chunk rows')
+    parser.add_argument('--chunk-rows', type=int, default=STAGING_CHUNK_ROWS, help='Max records per dataset chunk')
+    parser.add_argument('--full', action='store_true',
+                        help='Stage every dataset even if its manifest hash matches the last loaded job')
+    parser.add_argument('--swap', action='store_true', default=STAGING_SWAP,
+                        help='Load into a shadow table and swap it in atomically (keeps <table>_prev)')
+    parser.add_argument('--rollback', action='store_true',
+                        help='Swap the staging table back with its _prev snapshot and exit')
+    parser.add_argument('--codec', choices=available_codecs(), default=STAGING_CODEC,
+                        help='Compress staged payloads (row mode then stages the job as a single chunk)')
+    parser.add_argument('--read-workers', type=int, default=STAGING_READ_WORKERS, help='Files read in parallel')
+    args = parser.parse_args()
+
+    if args.rollback:
+        chunked = args.mode == "chunked" or args.codec != "none"
+        rollback_staging("staging_raw_chunk" if chunked else "staging_raw_data")
+        return
+
+    job = StagingLoadJob(mode=args.mode, chunk_rows=args.chunk_rows, skip_unchanged=not args.full,
+                         read_workers=args.read_workers, swap=args.swap, codec=args.codec)
 
     # 1. Lấy thông tin (Chưa Lock)
     if not job.get_candidate_job():
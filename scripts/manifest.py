@@ -0,0 +1,86 @@
+import csv
+import glob
+import hashlib
+import json
+import os
+from datetime import datetime
+
+import pyarrow.parquet as pq
+
+from crawl_writer import CSV_HEADER_ROWS, parquet_partition_path
+
+# 5 dataset mà load_staging.py đọc
+MANIFEST_DATASETS = ["company_overview", "finance_ratio", "listing_exchange", "listing_industries", "price_history"]
+HASH_BLOCK_BYTES = 1024 * 1024
+
+
+def manifest_path(path, date_tag):
+    return os.path.join(path, f"manifest_{date_tag}.json")
+
+
+def dataset_files(path, dataset, date_tag):
+    """(định dạng, danh sách file) của một dataset, Parquet được ưu tiên giống load_staging.py"""
+    partition = parquet_partition_path(path, dataset, date_tag)
+    if os.path.isdir(partition):
+        return "parquet", sorted(glob.glob(os.path.join(partition, "*.parquet")))
+    csv_path = os.path.join(path, f"{dataset}_{date_tag}.csv")
+    if os.path.exists(csv_path):
+        return "csv", [csv_path]
+    return None, []
+
+
+def content_hash(files):
+    """SHA-256 trên nội dung các file (theo thứ tự), đọc theo block để không giữ cả file trong bộ nhớ"""
+    digest = hashlib.sha256()
+    for file_path in files:
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def count_rows(file_format, files, header_rows=1):
+    if file_format == "parquet":
+        return sum(pq.ParquetFile(f).metadata.num_rows for f in files)
+    rows = 0
+    for file_path in files:
+        # Dùng csv.reader để đếm đúng cả khi ô dữ liệu có xuống dòng
+        with open(file_path, 'r', encoding='utf-8', newline='') as f:
+            rows += max(0, sum(1 for _ in csv.reader(f)) - header_rows)
+    return rows
+
+
+def build_manifest(path, date_tag, config_id=None):
+    datasets = {}
+    for dataset in MANIFEST_DATASETS:
+        file_format, files = dataset_files(path, dataset, date_tag)
+        if not files:
+            continue
+        datasets[dataset] = {
+            "format": file_format,
+            "files": [os.path.relpath(f, path) for f in files],
+            "bytes": sum(os.path.getsize(f) for f in files),
+            "rows": count_rows(file_format, files, CSV_HEADER_ROWS.get(dataset, 1)),
+            "sha256": content_hash(files),
+        }
+    return {
+        "config_id": config_id,
+        "data_date": date_tag,
+        "generated_at": datetime.now().isoformat(timespec='seconds'),
+        "datasets": datasets
+    }
+
+
+def write_manifest(path, date_tag, config_id=None):
+    manifest = build_manifest(path, date_tag, config_id)
+    with open(manifest_path(path, date_tag), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    return manifest
+
+
+def read_manifest(path, date_tag):
+    try:
+        with open(manifest_path(path, date_tag), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
@@ -0,0 +1,173 @@
+"""Engine transform bằng Python: thay cho Parse_JSON_To_ODS, xử lý payload staging theo từng cột (pandas)
+rồi bulk insert vào ods_buffer.
+
+Tên bảng ODS bắt buộc khai báo qua ODS_COMPANY_TABLE / ODS_PRICE_TABLE / ODS_RATIO_TABLE, trỏ đúng các bảng
+mà Sync_ODS_To_DWH đọc; engine không tự tạo bảng. Các bảng này phải có các cột trong COMPANY_COLUMNS,
+PRICE_COLUMNS, RATIO_COLUMNS cùng cột symbol (giống dim_company, fact_price_history, fact_financial_ratio
+của dwh_production, khóa là symbol thay cho company_id).
+"""
+import io
+import os
+
+import pandas as pd
+
+# Bảng ODS của từng loại dữ liệu -> biến môi trường chứa tên bảng thật
+ODS_TABLE_ENV = {
+    "company": "ODS_COMPANY_TABLE",
+    "price": "ODS_PRICE_TABLE",
+    "ratio": "ODS_RATIO_TABLE",
+}
+ODS_TABLES = {kind: os.getenv(env) for kind, env in ODS_TABLE_ENV.items()}
+ODS_INSERT_BATCH_ROWS = int(os.getenv("ODS_INSERT_BATCH_ROWS", "5000"))
+
+# Cột ODS -> các tên cột có thể gặp trong payload (tên đầu tiên có mặt được dùng)
+PRICE_COLUMNS = {
+    "trade_date": ("time", "date", "tradingDate"),
+    "open_price": ("open",),
+    "high_price": ("high",),
+    "low_price": ("low",),
+    "close_price": ("close",),
+    "volume": ("volume",),
+}
+# finance_ratio đọc từ CSV header=1: tên cột tiếng Việt của vnstock
+RATIO_COLUMNS = {
+    "year": ("Năm", "yearReport", "year"),
+    "period": ("Kỳ", "lengthReport", "period"),
+    "roe": ("ROE (%)", "roe"),
+    "roa": ("ROA (%)", "roa"),
+    "eps": ("EPS (VND)", "eps"),
+    "pe": ("P/E", "pe"),
+}
+COMPANY_COLUMNS = {
+    "company_name": ("organ_name", "company_name", "short_name"),
+    "exchange": ("exchange", "comGroupCode"),
+    "industry": ("icb_name3", "industry", "icb_name2"),
+    "company_type": ("com_type_code", "company_type", "type"),
+}
+SYMBOL_ALIASES = ("symbol", "CP", "ticker")
+
+
+def read_payload(payload):
+    """Chuỗi JSON records -> DataFrame (giữ nguyên kiểu chuỗi, ép kiểu làm sau theo cột)"""
+    if not payload or payload == '[]':
+        return pd.DataFrame()
+    return pd.read_json(io.StringIO(payload), orient='records', dtype=False, convert_dates=False)
+
+
+def _first_column(df, aliases):
+    for name in aliases:
+        if name in df.columns:
+            return df[name]
+    return pd.Series(None, index=df.index, dtype=object)
+
+
+def _symbols(df, tracked):
+    symbol = _first_column(df, SYMBOL_ALIASES).astype("string").str.strip().str.upper()
+    mask = symbol.notna() & (symbol != "")
+    if tracked:
+        mask &= symbol.isin(tracked)
+    return symbol, mask
+
+
+def _text(series):
+    series = series.astype("string").str.strip()
+    return series.where(series != "")
+
+
+def transform_prices(df, tracked=()):
+    if df.empty:
+        return pd.DataFrame(columns=["symbol", *PRICE_COLUMNS])
+    symbol, mask = _symbols(df, tracked)
+    out = pd.DataFrame({"symbol": symbol})
+    out["trade_date"] = pd.to_datetime(_first_column(df, PRICE_COLUMNS["trade_date"]), errors='coerce').dt.date
+    for column in ("open_price", "high_price", "low_price", "close_price"):
+        out[column] = pd.to_numeric(_first_column(df, PRICE_COLUMNS[column]), errors='coerce')
+    out["volume"] = pd.to_numeric(_first_column(df, PRICE_COLUMNS["volume"]), errors='coerce').round().astype("Int64")
+    out = out[mask & out["trade_date"].notna() & out["close_price"].notna()]
+    return out.drop_duplicates(["symbol", "trade_date"], keep='last')
+
+
+def transform_ratios(df, tracked=()):
+    if df.empty:
+        return pd.DataFrame(columns=["symbol", *RATIO_COLUMNS])
+    symbol, mask = _symbols(df, tracked)
+    out = pd.DataFrame({"symbol": symbol})
+    for column in ("year", "period"):
+        out[column] = pd.to_numeric(_first_column(df, RATIO_COLUMNS[column]), errors='coerce').astype("Int64")
+    for column in ("roe", "roa", "eps", "pe"):
+        out[column] = pd.to_numeric(_first_column(df, RATIO_COLUMNS[column]), errors='coerce')
+    out = out[mask & out["year"].notna() & out["period"].notna()]
+    return out.drop_duplicates(["symbol", "year", "period"], keep='last')
+
+
+def transform_companies(frames, tracked=()):
+    """Ghép listing_industries, listing_exchange, company_overview theo mã; frame trước được ưu tiên,
+    frame sau chỉ lấp chỗ trống"""
+    indexed = []
+    for df in frames:
+        if df.empty:
+            continue
+        symbol, mask = _symbols(df, tracked)
+        indexed.append(df[mask].set_axis(symbol[mask], axis=0).groupby(level=0).last())
+    if not indexed:
+        return pd.DataFrame(columns=["symbol", *COMPANY_COLUMNS])
+    index = indexed[0].index
+    for df in indexed[1:]:
+        index = index.union(df.index)
+    out = pd.DataFrame(index=index)
+    for column, aliases in COMPANY_COLUMNS.items():
+        values = pd.Series(pd.NA, index=out.index, dtype="string")
+        for df in indexed:
+            present = [name for name in aliases if name in df.columns]
+            if present:
+                values = values.combine_first(_text(df[present[0]]))
+        out[column] = values
+    return out.rename_axis("symbol").reset_index()
+
+
+def missing_ods_tables():
+    """Các biến ODS_*_TABLE chưa được khai báo"""
+    return [ODS_TABLE_ENV[kind] for kind, table in ODS_TABLES.items() if not table]
+
+
+def build_ods_frames(payloads, tracked=()):
+    """payloads: cột staging_raw_data -> JSON. Trả về loại dữ liệu (company / price / ratio) -> DataFrame"""
+    tracked = set(tracked)
+    frames = {col: read_payload(payloads.get(col)) for col in
+              ("listing_industries_data", "listing_exchange_data", "company_overview_data",
+               "price_history_data", "finance_ratio_data")}
+    return {
+        "company": transform_companies(
+            [frames["listing_industries_data"], frames["listing_exchange_data"], frames["company_overview_data"]],
+            tracked),
+        "price": transform_prices(frames["price_history_data"], tracked),
+        "ratio": transform_ratios(frames["finance_ratio_data"], tracked),
+    }
+
+
+def frame_rows(df):
+    """DataFrame -> list tuple kiểu Python, NaN/NA -> None"""
+    return list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+
+
+def load_ods(conn, ods_frames, batch_rows=ODS_INSERT_BATCH_ROWS):
+    """Thay toàn bộ nội dung các bảng ODS (như Parse_JSON_To_ODS) bằng các DataFrame; trả về số dòng mỗi bảng"""
+    missing = missing_ods_tables()
+    if missing:
+        # Không đoán tên bảng: ghi nhầm bảng thì Sync_ODS_To_DWH không thấy gì mà job vẫn báo thành công
+        raise ValueError(f"Python ODS engine needs {', '.join(missing)} set to the tables Sync_ODS_To_DWH reads")
+    cursor = conn.cursor()
+    counts = {}
+    for kind, df in ods_frames.items():
+        table = ODS_TABLES[kind]
+        cursor.execute(f"TRUNCATE TABLE {table}")
+        columns = ', '.join(df.columns)
+        sql = f"INSERT INTO {table} ({columns}) VALUES ({', '.join(['%s'] * len(df.columns))})"
+        rows = frame_rows(df)
+        # executemany gộp mỗi lô thành một câu INSERT nhiều VALUES
+        for start in range(0, len(rows), batch_rows):
+            cursor.executemany(sql, rows[start:start + batch_rows])
+        counts[table] = len(rows)
+    conn.commit()
+    cursor.close()
+    return counts
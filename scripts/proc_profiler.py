@@ -0,0 +1,187 @@
+"""Đo từng lần gọi stored procedure (Parse_JSON_To_ODS, Sync_ODS_To_DWH, Refresh_Data_Mart...) và lưu vào
+bảng proc_metrics của DB controller, mỗi dòng một lần gọi của một job.
+
+    python proc_profiler.py report [--procedure Sync_ODS_To_DWH] [--last 20]
+        -> lịch sử theo job, so với trung vị các lần chạy trước để thấy procedure chậm dần khi dữ liệu tăng
+"""
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+
+import mysql.connector
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CONTROLLER_DB_CONFIG = {
+    "host": os.getenv("DB_HOST_CONTROLLER"),
+    "port": os.getenv("DB_PORT_CONTROLLER"),
+    "user": os.getenv("DB_USER_CONTROLLER"),
+    "password": os.getenv("DB_PASS_CONTROLLER"),
+    "database": os.getenv("DB_NAME_CONTROLLER")
+}
+
+# Bộ đếm phía server của session (SHOW SESSION STATUS), lấy chênh lệch trước / sau khi gọi procedure
+PROC_STATUS_VARIABLES = (
+    "Handler_read_first", "Handler_read_key", "Handler_read_next", "Handler_read_rnd", "Handler_read_rnd_next",
+    "Handler_write", "Handler_update", "Handler_delete",
+    "Created_tmp_tables", "Created_tmp_disk_tables",
+    "Select_scan", "Select_full_join", "Select_range",
+    "Sort_rows", "Sort_merge_passes",
+    "Bytes_sent", "Bytes_received", "Questions",
+)
+# Chậm hơn trung vị các lần trước bao nhiêu lần thì report đánh dấu
+PROC_REGRESSION_RATIO = float(os.getenv("PROC_REGRESSION_RATIO", "1.5"))
+
+
+def session_status(cursor):
+    placeholders = ', '.join(['%s'] * len(PROC_STATUS_VARIABLES))
+    cursor.execute(f"SHOW SESSION STATUS WHERE Variable_name IN ({placeholders})", PROC_STATUS_VARIABLES)
+    return {name: int(value) for name, value in cursor.fetchall()}
+
+
+def status_delta(before, after, overhead=None):
+    overhead = overhead or {}
+    return {name: max(0, after.get(name, 0) - before.get(name, 0) - overhead.get(name, 0)) for name in after}
+
+
+class ProcProfiler:
+    """Bọc cursor.callproc: thời gian, số dòng bị ảnh hưởng, result set và chênh lệch bộ đếm session"""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _status_overhead(cursor):
+        # Bản thân SHOW SESSION STATUS cũng làm tăng một số bộ đếm (Questions, Bytes_*, Handler_write...)
+        first = session_status(cursor)
+        return status_delta(first, session_status(cursor))
+
+    def callproc(self, cursor, stage, procedure, args=()):
+        """Gọi procedure như cursor.callproc; lỗi được ghi nhận rồi raise lại cho bên gọi xử lý"""
+        overhead = self._status_overhead(cursor)
+        before = session_status(cursor)
+        started = time.perf_counter()
+        call = {"stage": stage, "procedure": procedure, "outcome": "ok", "error": None,
+                "rows_affected": 0, "result_sets": 0, "result_rows": 0}
+        try:
+            result = cursor.callproc(procedure, args)
+            call["rows_affected"] = max(cursor.rowcount, 0)
+            for stored in cursor.stored_results():
+                call["result_sets"] += 1
+                call["result_rows"] += len(stored.fetchall())
+            return result
+        except mysql.connector.Error as err:
+            call["outcome"], call["error"] = "error", str(err)
+            raise
+        finally:
+            call["wall_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            try:
+                call["status"] = status_delta(before, session_status(cursor), overhead)
+            except mysql.connector.Error:
+                # Mất kết nối giữa chừng: vẫn giữ thời gian và lỗi
+                call["status"] = {}
+            with self._lock:
+                self.calls.append(call)
+            print(f"   ⏱️ {procedure}: {call['wall_ms'] / 1000:.2f}s, {call['rows_affected']} rows affected, "
+                  f"{call['status'].get('Handler_read_rnd_next', 0)} rows scanned")
+
+    def save_to_db(self, conn, config_id):
+        """Lưu các lần gọi vào bảng proc_metrics của DB controller"""
+        with self._lock:
+            calls, self.calls = self.calls, []
+        if not calls:
+            return
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS proc_metrics (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                id_config INT NOT NULL,
+                stage VARCHAR(32) NOT NULL,
+                procedure_name VARCHAR(64) NOT NULL,
+                outcome VARCHAR(16) NOT NULL,
+                wall_ms DOUBLE NOT NULL,
+                rows_affected BIGINT, result_sets INT, result_rows BIGINT,
+                rows_read BIGINT, rows_written BIGINT, full_scans BIGINT, tmp_disk_tables BIGINT,
+                session_status TEXT,
+                error TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                KEY idx_proc_metrics_config (id_config),
+                KEY idx_proc_metrics_procedure (procedure_name, id_config)
+            )
+        """)
+        rows = []
+        for call in calls:
+            status = call["status"]
+            rows.append((
+                config_id, call["stage"], call["procedure"], call["outcome"], call["wall_ms"],
+                call["rows_affected"], call["result_sets"], call["result_rows"],
+                sum(v for k, v in status.items() if k.startswith("Handler_read_")),
+                status.get("Handler_write", 0) + status.get("Handler_update", 0) + status.get("Handler_delete", 0),
+                status.get("Select_scan", 0) + status.get("Select_full_join", 0),
+                status.get("Created_tmp_disk_tables", 0),
+                json.dumps(status), call["error"]
+            ))
+        cursor.executemany("""
+            INSERT INTO proc_metrics
+            (id_config, stage, procedure_name, outcome, wall_ms, rows_affected, result_sets, result_rows,
+             rows_read, rows_written, full_scans, tmp_disk_tables, session_status, error)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, rows)
+        conn.commit()
+        cursor.close()
+
+
+def report(conn, procedure=None, last=20):
+    """Tổng thời gian mỗi procedure theo job (nhiều chunk được cộng lại), so với trung vị các job trước"""
+    cursor = conn.cursor()
+    where = "WHERE procedure_name = %s" if procedure else ""
+    cursor.execute(f"""
+        SELECT procedure_name, id_config, COUNT(*), SUM(wall_ms), SUM(rows_read), SUM(rows_written),
+               SUM(full_scans), SUM(tmp_disk_tables), SUM(outcome <> 'ok')
+        FROM proc_metrics {where}
+        GROUP BY procedure_name, id_config
+        ORDER BY procedure_name, id_config
+    """, (procedure,) if procedure else ())
+    history = {}
+    for row in cursor.fetchall():
+        history.setdefault(row[0], []).append(row[1:])
+    cursor.close()
+
+    for name, runs in history.items():
+        print(f"\n{name}")
+        print(f"{'job':>6} {'calls':>5} {'wall s':>8} {'rows read':>12} {'rows written':>12} {'scans':>6} "
+              f"{'tmp disk':>8} {'vs median':>9}")
+        for i, (config_id, calls, wall_ms, read, written, scans, tmp_disk, errors) in enumerate(runs):
+            if i < len(runs) - last:
+                continue
+            previous = [float(r[2]) for r in runs[max(0, i - last):i]]
+            ratio = float(wall_ms) / statistics.median(previous) if previous else None
+            flag = " ⚠️" if ratio and ratio >= PROC_REGRESSION_RATIO else ""
+            flag += " ❌" if errors else ""
+            ratio_text = f"{ratio:8.2f}x" if ratio else f"{'-':>9}"
+            print(f"{config_id:6} {calls:5} {float(wall_ms) / 1000:8.2f} {int(read or 0):12} {int(written or 0):12} "
+                  f"{int(scans or 0):6} {int(tmp_disk or 0):8} {ratio_text}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stored procedure execution metrics")
+    sub = parser.add_subparsers(dest='command', required=True)
+    report_parser = sub.add_parser('report', help='Per-job history of procedure timings')
+    report_parser.add_argument('--procedure', type=str, default=None)
+    report_parser.add_argument('--last', type=int, default=20, help='Jobs to show / median window')
+    args = parser.parse_args()
+
+    conn = mysql.connector.connect(**CONTROLLER_DB_CONFIG)
+    try:
+        report(conn, args.procedure, args.last)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
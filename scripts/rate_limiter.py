@@ -0,0 +1,32 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Giới hạn tốc độ gọi API theo thuật toán token bucket (an toàn đa luồng)"""
+
+    def __init__(self, rate, capacity=None):
+        # rate: số token nạp lại mỗi giây, capacity: số request tối đa được bắn liên tiếp (burst)
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity else max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, tokens=1):
+        """Chờ cho tới khi đủ token rồi mới cho phép gọi API"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
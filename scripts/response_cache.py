@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class ResponseCache:
+    """Cache kết quả API (DataFrame) trên đĩa, có TTL theo từng endpoint và loại bỏ theo LRU"""
+
+    def __init__(self, cache_dir, ttl_seconds, max_bytes, refresh=False):
+        # ttl_seconds: {endpoint: số giây}, endpoint không có trong dict sẽ không được cache
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(cache_dir, "responses.sqlite3"), check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                source TEXT, endpoint TEXT, symbol TEXT,
+                created_at REAL, accessed_at REAL,
+                size INTEGER, payload BLOB
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(source, endpoint, symbol, params):
+        raw = json.dumps([source, endpoint, symbol, params or {}], sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, source, endpoint, symbol, params=None):
+        """Trả về dữ liệu còn hạn hoặc None"""
+        ttl = self.ttl_seconds.get(endpoint)
+        if not ttl:
+            return None
+        if self.refresh:
+            with self._lock:
+                self.misses += 1
+            return None
+        key = self.make_key(source, endpoint, symbol, params)
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT created_at, payload FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if not row or now - row[0] > ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+        return pickle.loads(zlib.decompress(row[1]))
+
+    def put(self, source, endpoint, symbol, params, value):
+        if not self.ttl_seconds.get(endpoint) or value is None:
+            return
+        key = self.make_key(source, endpoint, symbol, params)
+        payload = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), 6)
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, source, endpoint, symbol, now, now, len(payload), payload)
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """Xóa các entry ít được dùng gần đây nhất cho tới khi tổng dung lượng <= max_bytes"""
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.conn.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,85 @@
+import os
+import random
+import threading
+import time
+
+# Số lần gọi tối đa cho mỗi cặp (mã, endpoint), tính cả lần gọi đầu tiên
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "4"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "2"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "60"))
+
+
+class RetryQueue:
+    """Hàng đợi các lệnh gọi API bị lỗi theo từng cặp (symbol, endpoint).
+
+    Chỉ lệnh gọi lỗi được thử lại, sau mỗi vòng chờ theo exponential backoff có jitter (full jitter).
+    """
+
+    def __init__(self, max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.items = []
+        self.recovered = 0
+        self._lock = threading.Lock()
+
+    def add(self, symbol, endpoint, error, context=None, attempts=1):
+        # context: tham số cần để gọi lại đúng lệnh cũ (vd: khoảng ngày của history)
+        with self._lock:
+            self.items.append({
+                "symbol": symbol,
+                "endpoint": endpoint,
+                "context": context,
+                "attempts": attempts,
+                "error": error
+            })
+
+    def __len__(self):
+        return len(self.items)
+
+    def pop_all(self):
+        """Lấy ra toàn bộ hàng đợi mà không thử lại"""
+        with self._lock:
+            items, self.items = self.items, []
+        return items
+
+    def backoff(self, round_no):
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (round_no - 1))))
+
+    def drain(self, retry, on_success, on_failure, map_func=map):
+        """Thử lại theo từng vòng cho tới khi hết hàng đợi hoặc hết số lần cho phép.
+
+        retry(item) -> kết quả hoặc raise; on_success(item, result); on_failure(item) khi bỏ cuộc.
+        map_func cho phép chạy song song (vd: executor.map), kết quả vẫn theo thứ tự hàng đợi.
+        """
+        round_no = 0
+        while self.items:
+            round_no += 1
+            with self._lock:
+                pending = [item for item in self.items if item["attempts"] < self.max_attempts]
+                exhausted = [item for item in self.items if item["attempts"] >= self.max_attempts]
+                self.items = []
+            for item in exhausted:
+                on_failure(item)
+            if not pending:
+                break
+
+            time.sleep(self.backoff(round_no))
+            for item, (result, error) in zip(pending, map_func(self._attempt(retry), pending)):
+                item["attempts"] += 1
+                if error is None:
+                    self.recovered += 1
+                    on_success(item, result)
+                else:
+                    item["error"] = error
+                    with self._lock:
+                        self.items.append(item)
+
+    @staticmethod
+    def _attempt(retry):
+        def run(item):
+            try:
+                return retry(item), None
+            except Exception as e:
+                return None, e
+        return run
@@ -0,0 +1,329 @@
+"""Chia universe mã cổ phiếu cho nhiều runner crawl chạy song song (horizontal sharding).
+
+Quy trình:
+    python shards.py plan --shards 4 [--start YYYY-MM-DD --end YYYY-MM-DD]
+        -> tạo 1 dòng config (job logic) + 4 dòng crawl_shard, in ra config id
+    python crawl_data.py --config-id <id> --shard 0/4      (mỗi runner một shard)
+    python shards.py merge --config-id <id>
+        -> gộp output của các shard thành 5 file mà load_staging.py cần, config -> CRAWLED
+
+Runner cập nhật updated_at của shard (heartbeat) khi crawl xong từng mã. Shard RUNNING không có heartbeat quá
+SHARD_STALE_MINUTES phút (runner bị kill / crash) được chuyển về ERR để runner khác nhận lại.
+"""
+import argparse
+import csv
+import glob
+import hashlib
+import os
+import shutil
+import time
+from datetime import datetime
+
+import mysql.connector
+
+from crawl_data import CrawlJob, DB_CONFIG, DEFAULT_CSV_PATH, DATE_FORMAT, TODAY_DATE
+from crawl_writer import CSV_HEADER_ROWS, parquet_partition_path
+from job_logger import get_job_logger
+from manifest import write_manifest
+from trading_calendar import get_calendar
+
+# Dataset theo mã được gộp từ mọi shard, dataset listing giống nhau nên chỉ lấy của một shard
+SYMBOL_DATASETS = ["price_history", "company_overview", "finance_ratio"]
+LISTING_DATASETS = ["listing_exchange", "listing_industries"]
+# Phải lớn hơn thời gian crawl lâu nhất của một mã (gồm cả retry) cộng SHARD_HEARTBEAT_SECONDS
+SHARD_STALE_MINUTES = float(os.getenv("SHARD_STALE_MINUTES", "360"))
+# Khoảng cách tối thiểu giữa hai lần heartbeat, tránh một câu UPDATE cho mỗi mã
+SHARD_HEARTBEAT_SECONDS = float(os.getenv("SHARD_HEARTBEAT_SECONDS", "60"))
+
+
+def parse_shard(value):
+    """'i/n' -> (i, n)"""
+    index, count = (int(part) for part in value.split('/'))
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard {value}, expected i/n with 0 <= i < n")
+    return index, count
+
+
+def shard_of(symbol, shard_count):
+    """Hash ổn định (không phụ thuộc PYTHONHASHSEED) để một mã luôn thuộc cùng một shard"""
+    return int(hashlib.md5(symbol.encode('utf-8')).hexdigest(), 16) % shard_count
+
+
+def shard_dir(path, shard_index, shard_count):
+    return os.path.join(path, f"shard_{shard_index}_of_{shard_count}")
+
+
+def _get_conn(db_config):
+    try:
+        return mysql.connector.connect(**db_config)
+    except mysql.connector.Error as err:
+        print(f"Connection Error: {err}")
+        return None
+
+
+def ensure_shard_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS crawl_shard (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            id_config INT NOT NULL,
+            shard_index INT NOT NULL,
+            shard_count INT NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'PENDING',
+            rows_saved INT NOT NULL DEFAULT 0,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            UNIQUE KEY uq_crawl_shard (id_config, shard_index)
+        )
+    """)
+
+
+def reset_stale_shards(cursor, config_id, stale_minutes=SHARD_STALE_MINUTES):
+    """Shard RUNNING không được cập nhật quá stale_minutes phút -> ERR; trả về số shard bị reset"""
+    cursor.execute("""
+        UPDATE crawl_shard SET status = 'ERR'
+        WHERE id_config = %s AND status = 'RUNNING' AND updated_at < NOW() - INTERVAL %s MINUTE
+    """, (config_id, stale_minutes))
+    return cursor.rowcount
+
+
+class ShardCrawlJob(CrawlJob):
+    """CrawlJob chỉ chạy trên một shard của job logic đã được tạo bởi `shards.py plan`"""
+
+    def __init__(self, db_config, config_id, shard_index, shard_count, **kwargs):
+        super().__init__(db_config, **kwargs)
+        self.config_id = config_id
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self._sharded = False
+        self._last_heartbeat = 0.0
+
+    def load_symbols(self):
+        symbols = super().load_symbols()
+        if not self._sharded:
+            self.symbols = [s for s in symbols if shard_of(s, self.shard_count) == self.shard_index]
+            self._sharded = True
+            print(f"Shard {self.shard_index}/{self.shard_count}: {len(self.symbols)} of {len(symbols)} symbols")
+        return self.symbols
+
+    def setup_config(self):
+        # Config đã được tạo lúc plan, shard chỉ kiểm tra sự tồn tại
+        conn = self._get_db_connection()
+        if not conn: return False
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT id FROM config WHERE id = %s", (self.config_id,))
+            return cursor.fetchone() is not None
+        finally:
+            cursor.close()
+
+    def start_processing(self):
+        conn = self._get_db_connection()
+        if not conn: return False
+        cursor = conn.cursor(dictionary=True)
+        try:
+            # Chỉ nhận shard chưa chạy hoặc đã lỗi (kể cả RUNNING quá hạn), tránh 2 runner chạy trùng một shard
+            if reset_stale_shards(cursor, self.config_id):
+                print(f"Job {self.config_id}: stale RUNNING shards reset to ERR.")
+            cursor.execute("""
+                UPDATE crawl_shard SET status = 'RUNNING'
+                WHERE id_config = %s AND shard_index = %s AND shard_count = %s AND status IN ('PENDING', 'ERR')
+            """, (self.config_id, self.shard_index, self.shard_count))
+            if cursor.rowcount == 0:
+                conn.rollback()
+                print(f"Shard {self.shard_index}/{self.shard_count} of job {self.config_id} is not pending.")
+                return False
+            conn.commit()
+            self._last_heartbeat = time.monotonic()
+            cursor.execute("SELECT * FROM config WHERE id = %s", (self.config_id,))
+            self.job_config = cursor.fetchone()
+            self.job_config['path'] = shard_dir(self.job_config['path'], self.shard_index, self.shard_count)
+            return True
+        except mysql.connector.Error as err:
+            print(f"Shard start error: {err}")
+            conn.rollback()
+            return False
+        finally:
+            cursor.close()
+
+    def _heartbeat(self):
+        """Đánh dấu shard vẫn đang chạy (updated_at) để reset_stale_shards không coi là runner đã chết"""
+        if time.monotonic() - self._last_heartbeat < SHARD_HEARTBEAT_SECONDS:
+            return
+        conn = self._get_db_connection()
+        if not conn: return
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                UPDATE crawl_shard SET updated_at = NOW()
+                WHERE id_config = %s AND shard_index = %s AND status = 'RUNNING'
+            """, (self.config_id, self.shard_index))
+            conn.commit()
+            self._last_heartbeat = time.monotonic()
+        except mysql.connector.Error as err:
+            # Lỗi tạm thời: lần heartbeat sau thử lại, không dừng crawl
+            print(f"Shard heartbeat error: {err}")
+        finally:
+            cursor.close()
+
+    def _collect_result(self, symbol, results, errors):
+        super()._collect_result(symbol, results, errors)
+        self._heartbeat()
+
+    def _on_retry_success(self, item, df):
+        super()._on_retry_success(item, df)
+        self._heartbeat()
+
+    def _on_retry_failure(self, item):
+        super()._on_retry_failure(item)
+        self._heartbeat()
+
+    def _update_job_status(self, cursor, final_status, final_flag):
+        # Trạng thái của config do bước merge quyết định, shard chỉ cập nhật dòng của mình
+        rows_saved = self.writer.total_rows if self.writer else 0
+        cursor.execute("""
+            UPDATE crawl_shard SET status = %s, rows_saved = %s
+            WHERE id_config = %s AND shard_index = %s AND status = 'RUNNING'
+        """, ('DONE' if final_status == 'CRAWLED' else 'ERR', rows_saved, self.config_id, self.shard_index))
+
+
+def plan(shard_count, start=None, end=None):
+    """Tạo job logic (config) và các dòng crawl_shard, trả về config id"""
+    conn = _get_conn(DB_CONFIG)
+    if not conn: return None
+    try:
+        cursor = conn.cursor()
+        ensure_shard_table(cursor)
+        start_dt = datetime.strptime(start or TODAY_DATE, DATE_FORMAT)
+        end_dt = datetime.strptime(end or TODAY_DATE, DATE_FORMAT)
+        trading_range = get_calendar().clip(start_dt, end_dt)
+        if trading_range is None:
+            print(f"No trading days between {start_dt:%Y-%m-%d} and {end_dt:%Y-%m-%d}, nothing to plan.")
+            return None
+        start_dt, end_dt = (datetime.combine(d, datetime.min.time()) for d in trading_range)
+        # is_processing = TRUE để load_staging không lấy job khi các shard chưa gộp xong
+        cursor.execute("""
+            INSERT INTO config (status, flag, is_processing, path, data_date_start, data_date_end)
+            VALUES ('CRAWLING', 1, TRUE, %s, %s, %s)
+        """, (DEFAULT_CSV_PATH, start_dt, end_dt))
+        config_id = cursor.lastrowid
+        cursor.executemany(
+            "INSERT INTO crawl_shard (id_config, shard_index, shard_count) VALUES (%s, %s, %s)",
+            [(config_id, i, shard_count) for i in range(shard_count)]
+        )
+        conn.commit()
+        print(f"Planned job {config_id} with {shard_count} shards.")
+        return config_id
+    finally:
+        conn.close()
+
+
+def _read_csv_header(path, header_rows):
+    """Các cột của file CSV, mỗi cột là tuple các tầng header"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(iter(f.readline, ''))
+        return list(zip(*(next(reader) for _ in range(header_rows))))
+
+
+def _merge_csv(shard_files, target, header_rows):
+    """Nối các file CSV của shard theo dạng text; nếu header khác nhau thì gộp theo hợp các cột
+    (thứ tự xuất hiện, như pd.concat), ô của cột mà shard không có để trống"""
+    headers = [_read_csv_header(path, header_rows) for path in shard_files]
+    columns = []
+    for header in headers:
+        columns.extend(col for col in header if col not in columns)
+    with open(target, 'w', encoding='utf-8', newline='') as out:
+        writer = csv.writer(out, lineterminator=os.linesep)
+        writer.writerows(zip(*columns))
+        for path, header in zip(shard_files, headers):
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                reader = csv.reader(iter(f.readline, ''))
+                for _ in range(header_rows):
+                    next(reader)
+                if header == columns:
+                    shutil.copyfileobj(f, out)
+                    continue
+                positions = [header.index(col) if col in header else None for col in columns]
+                for row in reader:
+                    writer.writerow(['' if i is None else row[i] for i in positions])
+
+
+def _merge_dataset(shard_dirs, path, dataset, date_tag):
+    """Gộp một dataset (CSV hoặc partition Parquet) từ các thư mục shard vào thư mục của job"""
+    csv_files = [p for p in (os.path.join(d, f"{dataset}_{date_tag}.csv") for d in shard_dirs) if os.path.exists(p)]
+    if csv_files:
+        _merge_csv(csv_files, os.path.join(path, f"{dataset}_{date_tag}.csv"), CSV_HEADER_ROWS.get(dataset, 1))
+    partitions = [p for p in (parquet_partition_path(d, dataset, date_tag) for d in shard_dirs) if os.path.isdir(p)]
+    if partitions:
+        target = parquet_partition_path(path, dataset, date_tag)
+        shutil.rmtree(target, ignore_errors=True)
+        os.makedirs(target, exist_ok=True)
+        for shard_no, partition in enumerate(partitions):
+            for part in sorted(glob.glob(os.path.join(partition, "*.parquet"))):
+                shutil.copy2(part, os.path.join(target, f"shard{shard_no:03d}-{os.path.basename(part)}"))
+    return bool(csv_files or partitions)
+
+
+def merge(config_id):
+    """Gộp output khi mọi shard đã DONE và chuyển config sang CRAWLED"""
+    conn = _get_conn(DB_CONFIG)
+    if not conn: return False
+    logger = get_job_logger(DB_CONFIG)
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM config WHERE id = %s", (config_id,))
+        job_config = cursor.fetchone()
+        if reset_stale_shards(cursor, config_id):
+            conn.commit()
+        cursor.execute("SELECT * FROM crawl_shard WHERE id_config = %s ORDER BY shard_index", (config_id,))
+        shards = cursor.fetchall()
+        if not job_config or not shards:
+            print(f"Job {config_id} has no shards.")
+            return False
+        not_done = [s['shard_index'] for s in shards if s['status'] != 'DONE']
+        if not_done:
+            print(f"Job {config_id}: shards {not_done} are not DONE yet, merge skipped.")
+            return False
+
+        path = job_config['path']
+        date_tag = job_config['data_date_end'].strftime(DATE_FORMAT)
+        shard_dirs = [shard_dir(path, s['shard_index'], s['shard_count']) for s in shards]
+        for dataset in SYMBOL_DATASETS:
+            _merge_dataset(shard_dirs, path, dataset, date_tag)
+        for dataset in LISTING_DATASETS:
+            # Mọi shard tải cùng một listing: lấy bản của shard đầu tiên có dữ liệu
+            for directory in shard_dirs:
+                if _merge_dataset([directory], path, dataset, date_tag):
+                    break
+
+        write_manifest(path, date_tag, config_id)
+        total_rows = sum(s['rows_saved'] for s in shards)
+        cursor.execute(
+            "UPDATE config SET status = 'CRAWLED', is_processing = FALSE, flag = 1 WHERE id = %s", (config_id,)
+        )
+        logger.log(config_id, 'SUCCESS', f"Merged {len(shards)} shards. Saved {total_rows} rows.")
+        with logger.flush_with(cursor):
+            conn.commit()
+        print(f"Job {config_id}: merged {len(shards)} shards into {path}")
+        return True
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan and merge sharded crawl jobs")
+    sub = parser.add_subparsers(dest='command', required=True)
+    plan_parser = sub.add_parser('plan', help='Create a logical job split into n shards')
+    plan_parser.add_argument('--shards', type=int, required=True)
+    plan_parser.add_argument('--start', type=str, default=None, help='Start Date (YYYY-MM-DD)')
+    plan_parser.add_argument('--end', type=str, default=None, help='End Date (YYYY-MM-DD)')
+    merge_parser = sub.add_parser('merge', help='Merge shard outputs once every shard is DONE')
+    merge_parser.add_argument('--config-id', type=int, required=True)
+    args = parser.parse_args()
+
+    if args.command == 'plan':
+        plan(args.shards, args.start, args.end)
+    else:
+        merge(args.config_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+
+
+class VnstockSource:
+    """Nguồn dữ liệu thật qua thư viện vnstock (cần mạng)"""
+
+    def __init__(self):
+        # Client không gắn với mã cổ phiếu được tạo một lần và dùng lại cho mọi mã
+        self._vnstock = None
+        self._listing = None
+        self._lock = threading.Lock()
+
+    def _clients(self):
+        with self._lock:
+            if self._vnstock is None:
+                from vnstock import Vnstock, Listing
+                self._vnstock = Vnstock()
+                self._listing = Listing()
+        return self._vnstock, self._listing
+
+    def overview(self, symbol):
+        vnstock, _ = self._clients()
+        return vnstock.stock(symbol=symbol, source='TCBS').company.overview()
+
+    def ratio(self, symbol, period='year', lang='vi', dropna=True):
+        from vnstock import Finance
+        return Finance(symbol=symbol, source='VCI').ratio(period=period, lang=lang, dropna=dropna)
+
+    def history(self, symbol, start, end, interval='1D'):
+        from vnstock import Quote
+        return Quote(symbol=symbol, source='VCI').history(start=start, end=end, interval=interval)
+
+    def symbols_by_exchange(self):
+        _, listing = self._clients()
+        return listing.symbols_by_exchange()
+
+    def symbols_by_industries(self):
+        _, listing = self._clients()
+        return listing.symbols_by_industries()
+
+
+def fixture_path(fixtures_dir, method, symbol, args, kwargs):
+    """<fixtures_dir>/<method>/<symbol>/<hash tham số>.pkl"""
+    raw = json.dumps([args, kwargs], sort_keys=True, default=str)
+    digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(fixtures_dir, method, symbol or '_', f"{digest}.pkl")
+
+
+class RecordingSource:
+    """Gọi nguồn thật và lưu lại từng response (kể cả lỗi) xuống đĩa để replay"""
+
+    def __init__(self, inner, fixtures_dir):
+        self.inner = inner
+        self.fixtures_dir = fixtures_dir
+
+    def _record(self, method, symbol, *args, **kwargs):
+        path = fixture_path(self.fixtures_dir, method, symbol, args, kwargs)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        call_args = (symbol,) + args if symbol else args
+        started = time.perf_counter()
+        try:
+            value = getattr(self.inner, method)(*call_args, **kwargs)
+            record = {"value": value, "error": None}
+        except Exception as e:
+            value, record = None, {"value": None, "error": f"{type(e).__name__}: {e}"}
+            raise
+        finally:
+            record["seconds"] = time.perf_counter() - started
+            with open(path, 'wb') as f:
+                pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return value
+
+    def overview(self, symbol):
+        return self._record('overview', symbol)
+
+    def ratio(self, symbol, **kwargs):
+        return self._record('ratio', symbol, **kwargs)
+
+    def history(self, symbol, start, end, interval='1D'):
+        return self._record('history', symbol, start=start, end=end, interval=interval)
+
+    def symbols_by_exchange(self):
+        return self._record('symbols_by_exchange', None)
+
+    def symbols_by_industries(self):
+        return self._record('symbols_by_industries', None)
+
+
+class ReplaySource:
+    """Trả lại response đã ghi, có giả lập độ trễ mạng để benchmark offline và lặp lại được.
+
+    latency: độ trễ cố định (giây) mỗi lệnh gọi; use_recorded_latency=True thì dùng đúng thời gian đã ghi.
+    """
+
+    def __init__(self, fixtures_dir, latency=0.0, use_recorded_latency=False):
+        self.fixtures_dir = fixtures_dir
+        self.latency = latency
+        self.use_recorded_latency = use_recorded_latency
+
+    def symbols(self):
+        """Danh sách mã có fixture overview (dùng làm universe khi benchmark)"""
+        root = os.path.join(self.fixtures_dir, 'overview')
+        return sorted(os.listdir(root)) if os.path.isdir(root) else []
+
+    def _replay(self, method, symbol, *args, **kwargs):
+        path = fixture_path(self.fixtures_dir, method, symbol, args, kwargs)
+        if not os.path.exists(path):
+            raise LookupError(f"No recorded response for {method}({symbol}, {kwargs})")
+        with open(path, 'rb') as f:
+            record = pickle.load(f)
+        time.sleep(record["seconds"] if self.use_recorded_latency else self.latency)
+        if record["error"]:
+            raise RuntimeError(record["error"])
+        return record["value"]
+
+    def overview(self, symbol):
+        return self._replay('overview', symbol)
+
+    def ratio(self, symbol, **kwargs):
+        return self._replay('ratio', symbol, **kwargs)
+
+    def history(self, symbol, start, end, interval='1D'):
+        return self._replay('history', symbol, start=start, end=end, interval=interval)
+
+    def symbols_by_exchange(self):
+        return self._replay('symbols_by_exchange', None)
+
+    def symbols_by_industries(self):
+        return self._replay('symbols_by_industries', None)
+
+
+def make_source(mode='live', fixtures_dir=None, latency=0.0):
+    if mode == 'record':
+        return RecordingSource(VnstockSource(), fixtures_dir)
+    if mode == 'replay':
+        return ReplaySource(fixtures_dir, latency=latency)
+    return VnstockSource()
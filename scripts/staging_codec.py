@@ -0,0 +1,41 @@
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Mức nén thấp: ưu tiên tốc độ, JSON giá / chỉ số lặp lại nhiều nên vẫn nén tốt
+ZLIB_LEVEL = 1
+ZSTD_LEVEL = 3
+
+
+def available_codecs():
+    """Các codec dùng được trong môi trường hiện tại (zstd cần gói zstandard)"""
+    return ["none", "zlib"] + (["zstd"] if zstandard is not None else [])
+
+
+def compress_payload(text, codec="none"):
+    """Chuỗi JSON -> bytes để lưu vào cột LONGBLOB"""
+    data = text.encode('utf-8')
+    if codec == "none":
+        return data
+    if codec == "zlib":
+        return zlib.compress(data, ZLIB_LEVEL)
+    if codec == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise ValueError(f"Unsupported staging codec: {codec}")
+
+
+def decompress_payload(data, codec="none"):
+    """Ngược lại của compress_payload; dòng cũ (LONGTEXT) trả về str thì giữ nguyên"""
+    if isinstance(data, str):
+        return data
+    data = bytes(data)
+    if codec == "zlib":
+        data = zlib.decompress(data)
+    elif codec == "zstd" and zstandard is not None:
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif codec != "none":
+        raise ValueError(f"Unsupported staging codec: {codec}")
+    return data.decode('utf-8')
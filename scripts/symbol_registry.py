@@ -0,0 +1,204 @@
+"""Danh sách mã theo dõi dùng chung cho crawl và transform, lưu ở bảng symbol_registry (DB Controller).
+
+    python symbol_registry.py sync [--file symbol_company.txt] [--keep-missing] [--metadata]
+        -> nạp / kích hoạt các mã trong file, tắt (is_active = FALSE) các mã không còn trong file;
+           --metadata lấy tên, sàn, ngành từ dim_company của DWH
+    python symbol_registry.py list [--all]
+
+Khi bảng chưa có hoặc chưa có mã nào, các stage đọc lại symbol_company.txt như trước.
+Mã mà mỗi job thực sự crawl (kể cả universe của chế độ --market) được lưu ở bảng job_symbol,
+transform lọc theo danh sách này thay vì danh sách đang theo dõi.
+"""
+import argparse
+import os
+
+import mysql.connector
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CONTROLLER_DB_CONFIG = {
+    "host": os.getenv("DB_HOST_CONTROLLER"),
+    "port": os.getenv("DB_PORT_CONTROLLER"),
+    "user": os.getenv("DB_USER_CONTROLLER"),
+    "password": os.getenv("DB_PASS_CONTROLLER"),
+    "database": os.getenv("DB_NAME_CONTROLLER")
+}
+
+DWH_DB_CONFIG = {
+    "host": os.getenv("DB_HOST_DW"),
+    "port": os.getenv("DB_PORT_DW"),
+    "user": os.getenv("DB_USER_DW"),
+    "password": os.getenv("DB_PASS_DW"),
+    "database": "dwh_production"
+}
+
+SYMBOL_FILE = os.getenv(
+    "SYMBOL_FILE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "symbol_company.txt")
+)
+
+
+def ensure_registry_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS symbol_registry (
+            symbol VARCHAR(20) PRIMARY KEY,
+            is_active BOOLEAN NOT NULL DEFAULT TRUE,
+            company_name VARCHAR(255) NULL,
+            exchange VARCHAR(20) NULL,
+            industry VARCHAR(255) NULL,
+            source VARCHAR(32) NOT NULL DEFAULT 'file',
+            added_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            KEY idx_symbol_registry_active (is_active, symbol)
+        )
+    """)
+
+
+def ensure_job_symbol_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS job_symbol (
+            id_config INT NOT NULL,
+            symbol VARCHAR(20) NOT NULL,
+            PRIMARY KEY (id_config, symbol)
+        )
+    """)
+
+
+def record_job_symbols(cursor, config_id, symbols):
+    """Lưu các mã mà job đã crawl (shard của cùng một job ghi chung một config id)"""
+    ensure_job_symbol_table(cursor)
+    cursor.executemany("INSERT IGNORE INTO job_symbol (id_config, symbol) VALUES (%s, %s)",
+                       [(config_id, s) for s in symbols])
+
+
+def job_symbols(db_config, config_id):
+    """Các mã của một job; [] khi job được crawl trước khi có bảng job_symbol"""
+    try:
+        conn = mysql.connector.connect(**db_config)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT symbol FROM job_symbol WHERE id_config = %s ORDER BY symbol", (config_id,))
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            conn.close()
+    except (mysql.connector.Error, TypeError):
+        return []
+
+
+def read_symbol_file(path=SYMBOL_FILE):
+    with open(path, 'r', encoding='utf-8') as f:
+        # Giữ thứ tự trong file (thứ tự crawl), chỉ bỏ mã trùng
+        return list(dict.fromkeys(line.strip().upper() for line in f if line.strip()))
+
+
+def write_symbol_filter(cursor, symbols):
+    """Bảng symbol_filter (khóa chính = symbol) trong ods_buffer: procedure lọc JOIN vào bảng này
+    thay vì duyệt mảng JSON cho từng dòng"""
+    cursor.execute("CREATE TABLE IF NOT EXISTS symbol_filter (symbol VARCHAR(20) PRIMARY KEY)")
+    cursor.execute("TRUNCATE TABLE symbol_filter")
+    cursor.executemany("INSERT IGNORE INTO symbol_filter (symbol) VALUES (%s)", [(s,) for s in symbols])
+
+
+def fetch_active_symbols(cursor):
+    cursor.execute("SELECT symbol FROM symbol_registry WHERE is_active = TRUE ORDER BY symbol")
+    return [row[0] for row in cursor.fetchall()]
+
+
+def active_symbols(db_config=CONTROLLER_DB_CONFIG, fallback_file=SYMBOL_FILE):
+    """Các mã đang theo dõi; đọc file khi registry chưa dùng được. Trả về (danh sách mã, nguồn)"""
+    try:
+        conn = mysql.connector.connect(**db_config)
+        try:
+            symbols = fetch_active_symbols(conn.cursor())
+        finally:
+            conn.close()
+        if symbols:
+            return symbols, "symbol_registry"
+    except (mysql.connector.Error, TypeError):
+        # Bảng chưa tạo (chưa chạy sync) hoặc thiếu cấu hình DB
+        pass
+    return read_symbol_file(fallback_file), fallback_file
+
+
+def sync_registry(conn, symbols, deactivate_missing=True, source="file"):
+    """Upsert danh sách mã; trả về (số mã mới, số mã bật lại, số mã bị tắt)"""
+    cursor = conn.cursor()
+    ensure_registry_table(cursor)
+    cursor.execute("SELECT symbol, is_active FROM symbol_registry")
+    current = dict(cursor.fetchall())
+
+    added = [s for s in symbols if s not in current]
+    reactivated = [s for s in symbols if s in current and not current[s]]
+    wanted = set(symbols)
+    deactivated = [s for s, active in current.items() if active and s not in wanted] if deactivate_missing else []
+
+    if added:
+        cursor.executemany("INSERT INTO symbol_registry (symbol, source) VALUES (%s, %s)",
+                           [(s, source) for s in added])
+    if reactivated:
+        cursor.executemany("UPDATE symbol_registry SET is_active = TRUE WHERE symbol = %s",
+                           [(s,) for s in reactivated])
+    if deactivated:
+        cursor.executemany("UPDATE symbol_registry SET is_active = FALSE WHERE symbol = %s",
+                           [(s,) for s in deactivated])
+    conn.commit()
+    cursor.close()
+    return len(added), len(reactivated), len(deactivated)
+
+
+def refresh_metadata(conn, dwh_config=DWH_DB_CONFIG):
+    """Tên công ty, sàn, ngành lấy từ dim_company của DWH (chỉ cập nhật mã có trong registry)"""
+    dwh = mysql.connector.connect(**dwh_config)
+    try:
+        cursor = dwh.cursor()
+        cursor.execute("SELECT company_name, exchange, industry, symbol FROM dim_company")
+        rows = cursor.fetchall()
+    finally:
+        dwh.close()
+    cursor = conn.cursor()
+    cursor.executemany(
+        "UPDATE symbol_registry SET company_name = %s, exchange = %s, industry = %s WHERE symbol = %s", rows
+    )
+    conn.commit()
+    cursor.close()
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tracked symbol registry")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sync_parser = sub.add_parser('sync', help='Load the registry from the symbol text file')
+    sync_parser.add_argument('--file', type=str, default=SYMBOL_FILE)
+    sync_parser.add_argument('--keep-missing', action='store_true',
+                             help='Do not deactivate symbols that are no longer in the file')
+    sync_parser.add_argument('--metadata', action='store_true',
+                             help='Fill company name / exchange / industry from the DWH dim_company')
+    list_parser = sub.add_parser('list', help='Print the registry')
+    list_parser.add_argument('--all', action='store_true', help='Include inactive symbols')
+    args = parser.parse_args()
+
+    conn = mysql.connector.connect(**CONTROLLER_DB_CONFIG)
+    try:
+        if args.command == 'sync':
+            symbols = read_symbol_file(args.file)
+            added, reactivated, deactivated = sync_registry(conn, symbols, not args.keep_missing)
+            print(f"✅ symbol_registry: {len(symbols)} mã trong file, +{added} mới, "
+                  f"{reactivated} bật lại, {deactivated} tắt.")
+            if args.metadata:
+                print(f"🏷️ Đã cập nhật metadata từ {refresh_metadata(conn)} dòng dim_company.")
+            return
+        cursor = conn.cursor()
+        ensure_registry_table(cursor)
+        where = "" if args.all else "WHERE is_active = TRUE"
+        cursor.execute(f"SELECT symbol, is_active, exchange, industry, company_name FROM symbol_registry {where} "
+                       f"ORDER BY symbol")
+        for symbol, is_active, exchange, industry, name in cursor.fetchall():
+            status = 'active' if is_active else 'off'
+            print(f"{symbol:8} {status:6} {exchange or '-':6} {industry or '-':30} {name or ''}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
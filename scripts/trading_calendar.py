@@ -0,0 +1,97 @@
+import bisect
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+from date_utils import as_date
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Danh sách ngày nghỉ lễ của sàn, mỗi dòng một ngày YYYY-MM-DD (xem trading_holidays.txt)
+HOLIDAY_FILE = os.getenv("TRADING_HOLIDAY_FILE", os.path.join(CURRENT_DIR, "trading_holidays.txt"))
+# Ngoài khoảng năm có trong file ngày nghỉ thì chỉ bỏ thứ 7, chủ nhật
+CALENDAR_PADDING_YEARS = 1
+
+
+class TradingCalendar:
+    """Lịch giao dịch của thị trường Việt Nam: thứ 2 - thứ 6, trừ các ngày nghỉ lễ.
+
+    Danh sách ngày giao dịch được tính sẵn cho các năm có trong file ngày nghỉ (+/- 1 năm)
+    nên mọi truy vấn chỉ là tra set / tìm nhị phân.
+    """
+
+    def __init__(self, holidays=()):
+        self.holidays = {as_date(d) for d in holidays}
+        years = [d.year for d in self.holidays] or [date.today().year]
+        self.first_day = date(min(years) - CALENDAR_PADDING_YEARS, 1, 1)
+        self.last_day = date(max(years) + CALENDAR_PADDING_YEARS, 12, 31)
+        self.days = []
+        day = self.first_day
+        while day <= self.last_day:
+            if day.weekday() < 5 and day not in self.holidays:
+                self.days.append(day)
+            day += timedelta(days=1)
+        self._day_set = set(self.days)
+
+    def is_trading_day(self, value):
+        day = as_date(value)
+        if self.first_day <= day <= self.last_day:
+            return day in self._day_set
+        return day.weekday() < 5
+
+    def trading_days(self, start, end):
+        """Các ngày giao dịch trong [start, end]"""
+        start, end = as_date(start), as_date(end)
+        if start < self.first_day or end > self.last_day:
+            days, day = [], start
+            while day <= end:
+                if self.is_trading_day(day):
+                    days.append(day)
+                day += timedelta(days=1)
+            return days
+        return self.days[bisect.bisect_left(self.days, start):bisect.bisect_right(self.days, end)]
+
+    def next_trading_day(self, value, include=True):
+        """Ngày giao dịch đầu tiên từ value (include=True tính cả chính value)"""
+        day = as_date(value) if include else as_date(value) + timedelta(days=1)
+        while not self.is_trading_day(day):
+            day += timedelta(days=1)
+        return day
+
+    def previous_trading_day(self, value, include=True):
+        day = as_date(value) if include else as_date(value) - timedelta(days=1)
+        while not self.is_trading_day(day):
+            day -= timedelta(days=1)
+        return day
+
+    def clip(self, start, end):
+        """Thu hẹp [start, end] về ngày giao dịch đầu / cuối, None nếu trong khoảng không có ngày giao dịch"""
+        start, end = as_date(start), as_date(end)
+        first = self.next_trading_day(start)
+        last = self.previous_trading_day(end)
+        return (first, last) if first <= last else None
+
+
+def load_holidays(path=HOLIDAY_FILE):
+    holidays = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    holidays.append(datetime.strptime(line.split()[0], '%Y-%m-%d').date())
+    except FileNotFoundError:
+        print(f"Holiday file {path} not found, only weekends are skipped.")
+    return holidays
+
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+
+def get_calendar():
+    """Lịch giao dịch dùng chung trong process (đọc file ngày nghỉ một lần)"""
+    global _calendar
+    with _calendar_lock:
+        if _calendar is None:
+            _calendar = TradingCalendar(load_holidays())
+        return _calendar
@@ -2,7 +2,14 @@ import mysql.connector
 import os
 import json
 import sys
+import time
+import argparse
 from dotenv import load_dotenv
+from job_logger import get_job_logger
+from staging_codec import decompress_payload
+from ods_engine import build_ods_frames, load_ods, missing_ods_tables
+from symbol_registry import active_symbols, job_symbols, write_symbol_filter
+from proc_profiler import ProcProfiler
 
 # Tải biến môi trường
 load_dotenv()
@@ -18,6 +25,36 @@ CONTROLLER_DB_CONFIG = {
     "database": os.getenv("DB_NAME_CONTROLLER")
 }
 
+# DB Staging: chứa staging_raw_data (đầu vào của Parse_JSON_To_ODS) và staging_raw_chunk
+STAGING_DB_CONFIG = {
+    "host": os.getenv("DB_HOST_ST"),
+    "port": os.getenv("DB_PORT_ST"),
+    "user": os.getenv("DB_USER_ST"),
+    "password": os.getenv("DB_PASS_ST"),
+    "database": os.getenv("DB_NAME_ST")
+}
+
+# Thứ tự cột của staging_raw_data
+STAGING_COLUMNS = ["company_overview_data", "finance_ratio_data", "listing_exchange_data",
+                   "listing_industries_data", "price_history_data"]
+
+# procedure: Parse_JSON_To_ODS trong MySQL (mặc định)
+# python: ods_engine.py đọc payload vào pandas, làm sạch / lọc mã / ép kiểu theo cột rồi bulk insert vào ods_buffer
+TRANSFORM_ENGINE = os.getenv("TRANSFORM_ENGINE", "procedure")
+
+# Procedure merge ODS -> DWH chỉ trong khoảng ngày của job và các mã bị ảnh hưởng:
+# Sync_ODS_To_DWH_Window(p_start DATE, p_end DATE, p_symbols JSON), p_symbols rỗng = mọi mã.
+# Procedure này (như Parse_JSON_To_ODS, Sync_ODS_To_DWH) nằm trong dwh_production, không có trong repo:
+# phải được deploy trước. Chưa có thì chạy Sync_ODS_To_DWH toàn bộ, hoặc báo lỗi nếu SYNC_WINDOW_REQUIRED=1.
+SYNC_WINDOW_PROCEDURE = os.getenv("SYNC_WINDOW_PROCEDURE", "Sync_ODS_To_DWH_Window")
+SYNC_WINDOW_REQUIRED = os.getenv("SYNC_WINDOW_REQUIRED", "0") == "1"
+
+# Biến thể của Parse_JSON_To_ODS lọc mã bằng JOIN vào bảng ods_buffer.symbol_filter (symbol VARCHAR(20) PRIMARY KEY)
+# thay vì duyệt tham số JSON cho từng dòng: Parse_JSON_To_ODS_Filtered(), không tham số, cùng đầu vào
+# staging_raw_data và cùng bảng ODS đích. Transform nạp symbol_filter trước mỗi lần gọi. Procedure này phải được
+# deploy vào ods_buffer; chưa có thì gọi Parse_JSON_To_ODS với danh sách JSON như cũ.
+ODS_FILTER_PROCEDURE = os.getenv("ODS_FILTER_PROCEDURE", "Parse_JSON_To_ODS_Filtered")
+
 # DB ODS Buffer: Nơi chứa Procedure Parse_JSON_To_ODS
 # (Thường chung Host với Controller nhưng khác Schema 'ods_buffer')
 ODS_DB_CONFIG = {
@@ -46,9 +83,20 @@ SYMBOL_FILE = os.getenv(
 
 
 class TransformJob:
-    def __init__(self):
+    def __init__(self, engine=TRANSFORM_ENGINE):
         self.config_id = None
         self.symbol_json_list = "[]"
+        self.chunk_indexes = []
+        self.engine = engine
+        # Khoảng ngày của job (config.data_date_start / data_date_end) để sync DWH theo cửa sổ
+        self.window = None
+        self.window_sync = None
+        self.filter_procedure = None
+        # Mã thực sự được parse trong job (JSON) cho p_symbols; '[]' = mọi mã trong cửa sổ
+        self.sync_symbols = "[]"
+        # Thời gian / số dòng / bộ đếm session của từng lần gọi procedure -> bảng proc_metrics
+        self.profiler = ProcProfiler()
+        self.logger = get_job_logger(CONTROLLER_DB_CONFIG)
 
     def _get_conn(self, config):
         try:
@@ -80,6 +128,8 @@ class TransformJob:
                 return False
 
             self.config_id = job['id']
+            if job.get('data_date_start') and job.get('data_date_end'):
+                self.window = (job['data_date_start'].strftime('%Y-%m-%d'), job['data_date_end'].strftime('%Y-%m-%d'))
 
             cursor.execute("UPDATE config SET status = 'TRANSFORMING', is_processing = TRUE WHERE id = %s",
                            (self.config_id,))
@@ -92,11 +142,15 @@ class TransformJob:
     # --- BƯỚC 2: CHUẨN BỊ LIST LỌC ---
     def prepare_filter_list(self):
         try:
-            with open(SYMBOL_FILE, 'r', encoding='utf-8') as f:
-                symbols = [line.strip() for line in f if line.strip()]
+            # Các mã job đã crawl (job_symbol); job cũ thì dùng symbol_registry, chưa có thì đọc file symbol
+            symbols, source = job_symbols(CONTROLLER_DB_CONFIG, self.config_id), f"job {self.config_id}"
+            if symbols:
+                self.sync_symbols = json.dumps(symbols)
+            else:
+                symbols, source = active_symbols(CONTROLLER_DB_CONFIG, SYMBOL_FILE)
 
             self.symbol_json_list = json.dumps(symbols)
-            print(f"📋 Đã tải danh sách lọc: {len(symbols)} mã cổ phiếu.")
+            print(f"📋 Đã tải danh sách lọc: {len(symbols)} mã cổ phiếu (nguồn: {source}).")
             return True
         except FileNotFoundError:
             msg = f"Không tìm thấy file symbol tại: {SYMBOL_FILE}"
@@ -104,8 +158,41 @@ class TransformJob:
             self.report_error(msg)
             return False
 
+    def job_unchanged(self):
+        """load_staging không stage lại vì cả 5 dataset giống job đã load trước: không có gì để parse / sync"""
+        conn = self._get_conn(CONTROLLER_DB_CONFIG)
+        if not conn: return False
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*), SUM(skipped) FROM file_manifest WHERE id_config = %s", (self.config_id,))
+            total, skipped = cursor.fetchone()
+        except mysql.connector.Error:
+            # Chưa có bảng file_manifest
+            return False
+        finally:
+            conn.close()
+        if not total or int(skipped or 0) < total:
+            return False
+        print("⏭️ Dữ liệu của job không đổi so với lần load trước, bỏ qua Staging -> ODS -> DWH.")
+        self.logger.log(self.config_id, 'INFO', 'Unchanged since the last loaded job, ODS/DWH sync skipped')
+        return True
+
     # --- BƯỚC 3: GỌI SQL PARSE JSON -> ODS ---
-    def call_ods_procedure(self):
+    def _has_filter_procedure(self, cursor):
+        """Kiểm tra một lần xem ods_buffer đã có procedure lọc theo bảng symbol_filter chưa"""
+        if self.filter_procedure is None:
+            cursor.execute("""
+                SELECT COUNT(*) FROM information_schema.routines
+                WHERE routine_schema = DATABASE() AND routine_type = 'PROCEDURE' AND routine_name = %s
+            """, (ODS_FILTER_PROCEDURE,))
+            self.filter_procedure = bool(cursor.fetchone()[0])
+            if not self.filter_procedure:
+                self.logger.log(self.config_id, 'WARN',
+                                f"{ODS_FILTER_PROCEDURE} is not deployed in ods_buffer, "
+                                f"falling back to Parse_JSON_To_ODS with the JSON symbol list")
+        return self.filter_procedure
+
+    def call_ods_procedure(self, symbol_json_list=None):
         conn = self._get_conn(ODS_DB_CONFIG)
         if not conn:
             self.report_error("Không thể kết nối ODS Database")
@@ -113,10 +200,17 @@ class TransformJob:
 
         try:
             cursor = conn.cursor()
-            print("⏳ Đang chạy Procedure: Parse_JSON_To_ODS...")
-
-            # Gọi thủ tục với tham số là JSON List các mã cổ phiếu
-            cursor.callproc('Parse_JSON_To_ODS', [self.symbol_json_list])
+            symbol_json_list = symbol_json_list or self.symbol_json_list
+            if self._has_filter_procedure(cursor):
+                # Danh sách lọc đi vào bảng có index để procedure JOIN
+                write_symbol_filter(cursor, json.loads(symbol_json_list))
+                conn.commit()
+                print(f"⏳ Đang chạy Procedure: {ODS_FILTER_PROCEDURE}...")
+                self.profiler.callproc(cursor, 'transform', ODS_FILTER_PROCEDURE)
+            else:
+                print("⏳ Đang chạy Procedure: Parse_JSON_To_ODS...")
+                # Gọi thủ tục với tham số là JSON List các mã cổ phiếu
+                self.profiler.callproc(cursor, 'transform', 'Parse_JSON_To_ODS', [symbol_json_list])
             conn.commit()
 
             print("✅ Thành công: JSON đã được chuyển sang ODS Buffer.")
@@ -129,8 +223,71 @@ class TransformJob:
         finally:
             conn.close()
 
+    # --- BƯỚC 3 (engine python): STAGING -> ODS BẰNG PANDAS ---
+    def call_ods(self, symbol_json_list=None, payloads=None):
+        if self.engine == "python":
+            return self.call_ods_python(symbol_json_list, payloads)
+        return self.call_ods_procedure(symbol_json_list)
+
+    def read_staged_payloads(self):
+        """Dòng JSON trong staging_raw_data (đầu vào của Parse_JSON_To_ODS)"""
+        conn = self._get_conn(STAGING_DB_CONFIG)
+        if not conn: return None
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {', '.join(STAGING_COLUMNS)} FROM staging_raw_data LIMIT 1")
+            row = cursor.fetchone() or [None] * len(STAGING_COLUMNS)
+            return {col: decompress_payload(value) if value is not None else None
+                    for col, value in zip(STAGING_COLUMNS, row)}
+        finally:
+            conn.close()
+
+    def call_ods_python(self, symbol_json_list=None, payloads=None):
+        if payloads is None:
+            payloads = self.read_staged_payloads()
+            if payloads is None:
+                self.report_error("Không thể kết nối Staging Database")
+                return False
+        conn = self._get_conn(ODS_DB_CONFIG)
+        if not conn:
+            self.report_error("Không thể kết nối ODS Database")
+            return False
+
+        try:
+            print("⏳ Đang chạy Python engine: Staging -> ODS...")
+            started = time.perf_counter()
+            ods_frames = build_ods_frames(payloads, json.loads(symbol_json_list or self.symbol_json_list))
+            parsed = time.perf_counter()
+            self.sync_symbols = json.dumps(sorted(set().union(*(df["symbol"] for df in ods_frames.values()))))
+            counts = load_ods(conn, ods_frames)
+            report = (f"Python ODS engine: {counts}, transform {parsed - started:.2f}s, "
+                      f"insert {time.perf_counter() - parsed:.2f}s")
+            print(f"✅ Thành công: {report}")
+            self.logger.log(self.config_id, 'INFO', report)
+            return True
+        except (mysql.connector.Error, ValueError) as err:
+            print(f"❌ Lỗi Python engine (ODS): {err}")
+            self.report_error(f"Python engine Error (ODS): {err}")
+            return False
+        finally:
+            conn.close()
+
     # --- BƯỚC 4: GỌI SQL SYNC ODS -> DWH ---
-    def call_dwh_procedure(self):
+    def _has_window_sync(self, cursor):
+        """Kiểm tra một lần xem dwh_production đã có procedure sync theo cửa sổ chưa"""
+        if self.window_sync is None:
+            cursor.execute("""
+                SELECT COUNT(*) FROM information_schema.routines
+                WHERE routine_schema = DATABASE() AND routine_type = 'PROCEDURE' AND routine_name = %s
+            """, (SYNC_WINDOW_PROCEDURE,))
+            self.window_sync = bool(cursor.fetchone()[0])
+            if not self.window_sync:
+                self.logger.log(self.config_id, 'WARN',
+                                f"{SYNC_WINDOW_PROCEDURE} is not deployed in dwh_production, "
+                                f"falling back to full Sync_ODS_To_DWH")
+        return self.window_sync
+
+    def call_dwh_procedure(self, symbol_json_list=None):
         conn = self._get_conn(DWH_DB_CONFIG)
         if not conn:
             self.report_error("Không thể kết nối DWH Database")
@@ -138,13 +295,26 @@ class TransformJob:
 
         try:
             cursor = conn.cursor()
-            print("⏳ Đang chạy Procedure: Sync_ODS_To_DWH...")
-
-            # Gọi thủ tục đồng bộ sang Dim/Fact
-            cursor.callproc('Sync_ODS_To_DWH')
+            started = time.perf_counter()
+            window_sync = self.window and self._has_window_sync(cursor)
+            if self.window and not window_sync and SYNC_WINDOW_REQUIRED:
+                self.report_error(f"{SYNC_WINDOW_PROCEDURE} is not deployed and SYNC_WINDOW_REQUIRED=1")
+                return False
+            if window_sync:
+                # Chỉ merge các ngày của job cho các mã vừa parse, thay vì toàn bộ ODS
+                symbols = symbol_json_list or self.sync_symbols
+                count = len(json.loads(symbols))
+                print(f"⏳ Đang chạy Procedure: {SYNC_WINDOW_PROCEDURE} {self.window[0]} -> {self.window[1]}, "
+                      f"{count or 'mọi'} mã...")
+                self.profiler.callproc(cursor, 'transform', SYNC_WINDOW_PROCEDURE,
+                                       [self.window[0], self.window[1], symbols])
+            else:
+                print("⏳ Đang chạy Procedure: Sync_ODS_To_DWH...")
+                # Gọi thủ tục đồng bộ sang Dim/Fact
+                self.profiler.callproc(cursor, 'transform', 'Sync_ODS_To_DWH')
             conn.commit()
 
-            print("✅ Thành công: Dữ liệu đã vào kho DWH Production.")
+            print(f"✅ Thành công: Dữ liệu đã vào kho DWH Production ({time.perf_counter() - started:.2f}s).")
             return True
 
         except mysql.connector.Error as err:
@@ -154,8 +324,86 @@ class TransformJob:
         finally:
             conn.close()
 
+    # --- BƯỚC 3 (chunked): STAGING THEO CHUNK ---
+    def find_staged_chunks(self):
+        """Danh sách chunk_index của job nếu load_staging chạy ở chế độ chunked"""
+        conn = self._get_conn(STAGING_DB_CONFIG)
+        if not conn: return False
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT DISTINCT chunk_index FROM staging_raw_chunk WHERE id_config = %s ORDER BY chunk_index",
+                (self.config_id,)
+            )
+            self.chunk_indexes = [row[0] for row in cursor.fetchall()]
+        except mysql.connector.Error:
+            # Chưa có bảng staging_raw_chunk: job được load theo kiểu một dòng
+            self.chunk_indexes = []
+        finally:
+            conn.close()
+        return bool(self.chunk_indexes)
+
+    def _chunk_payloads(self, conn, chunk_index):
+        """(cột staging_raw_data -> JSON, danh sách mã) của một chunk, dataset thiếu = '[]'"""
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT dataset, symbols, codec, payload FROM staging_raw_chunk
+            WHERE id_config = %s AND chunk_index = %s
+        """, (self.config_id, chunk_index))
+        payloads, symbols = {}, []
+        for dataset, chunk_symbols, codec, payload in cursor.fetchall():
+            # Giải nén ở đây, Parse_JSON_To_ODS chỉ đọc JSON thô trong staging_raw_data
+            payloads[dataset] = decompress_payload(payload, codec)
+            symbols = json.loads(chunk_symbols)
+        cursor.close()
+        return {col: payloads.get(col, '[]') for col in STAGING_COLUMNS}, symbols
+
+    def _stage_chunk(self, conn, payloads):
+        """Đưa một chunk vào staging_raw_data (một dòng) cho Parse_JSON_To_ODS"""
+        cursor = conn.cursor()
+        cursor.execute("TRUNCATE TABLE staging_raw_data")
+        placeholders = ', '.join(['%s'] * len(STAGING_COLUMNS))
+        cursor.execute(
+            f"INSERT INTO staging_raw_data ({', '.join(STAGING_COLUMNS)}) VALUES ({placeholders})",
+            [payloads[col] for col in STAGING_COLUMNS]
+        )
+        conn.commit()
+        cursor.close()
+
+    def run_chunked(self):
+        """Parse + Sync từng chunk: mỗi lần gọi procedure chỉ xử lý JSON của một nhóm mã"""
+        staging_conn = self._get_conn(STAGING_DB_CONFIG)
+        if not staging_conn:
+            self.report_error("Không thể kết nối Staging Database")
+            return False
+        tracked = set(json.loads(self.symbol_json_list))
+        try:
+            for chunk_index in self.chunk_indexes:
+                payloads, symbols = self._chunk_payloads(staging_conn, chunk_index)
+                symbols = [s for s in symbols if s in tracked] if tracked else symbols
+                if not symbols:
+                    continue
+                print(f"⏳ Chunk {chunk_index + 1}/{len(self.chunk_indexes)}: {len(symbols)} mã")
+                if self.engine == "python":
+                    # Engine python nhận payload trực tiếp, không cần ghi lại vào staging_raw_data
+                    ods_ok = self.call_ods_python(json.dumps(symbols), payloads)
+                else:
+                    self._stage_chunk(staging_conn, payloads)
+                    ods_ok = self.call_ods_procedure(json.dumps(symbols))
+                if not (ods_ok and self.call_dwh_procedure(json.dumps(symbols))):
+                    return False
+            return True
+        except mysql.connector.Error as err:
+            print(f"❌ Lỗi SQL (Staging chunk): {err}")
+            self.report_error(f"SQL Error (Staging chunk): {err}")
+            return False
+        finally:
+            staging_conn.close()
+
     # --- BƯỚC 5: HOÀN TẤT ---
     def finalize_job(self):
+        # Ghi Log thành công, cùng transaction với trạng thái TRANSFORMED
+        self.logger.log(self.config_id, 'SUCCESS', 'Transform & Load Complete')
         conn = self._get_conn(CONTROLLER_DB_CONFIG)
         if not conn: return
         try:
@@ -163,40 +411,60 @@ class TransformJob:
 
             query = "UPDATE config SET status = 'TRANSFORMED', is_processing = FALSE, flag = 1 WHERE id = %s"
             cursor.execute(query, (self.config_id,))
-
-            # Ghi Log thành công
-            log_query = "INSERT INTO logging (id_config, status, description) VALUES (%s, 'SUCCESS', 'Transform & Load Complete')"
-            cursor.execute(log_query, (self.config_id,))
-
-            conn.commit()
+            with self.logger.flush_with(cursor):
+                conn.commit()
             print("🏁 Job Transform Hoàn tất: TRANSFORMED ")
+            self._save_proc_metrics(conn)
         finally:
             conn.close()
 
+    def _save_proc_metrics(self, conn):
+        try:
+            self.profiler.save_to_db(conn, self.config_id)
+        except mysql.connector.Error as err:
+            print(f"Proc metrics save error: {err}")
+
     # --- HỖ TRỢ: BÁO LỖI ---
     def report_error(self, msg):
+        self.logger.log(self.config_id, 'ERR', msg)
         conn = self._get_conn(CONTROLLER_DB_CONFIG)
         if not conn: return
         try:
             cursor = conn.cursor()
             cursor.execute("UPDATE config SET status = 'ERR_TRANSFORM', is_processing = FALSE WHERE id = %s",
                            (self.config_id,))
-            cursor.execute("INSERT INTO logging (id_config, status, description) VALUES (%s, 'ERR', %s)",
-                           (self.config_id, msg))
-            conn.commit()
+            with self.logger.flush_with(cursor):
+                conn.commit()
+            self._save_proc_metrics(conn)
         finally:
             conn.close()
 
 
 def main():
-    job = TransformJob()
+    parser = argparse.ArgumentParser(description="Transform staged JSON into ODS and DWH")
+    parser.add_argument('--engine', choices=['procedure', 'python'], default=TRANSFORM_ENGINE,
+                        help='Staging -> ODS engine: Parse_JSON_To_ODS or the vectorized pandas engine')
+    args = parser.parse_args()
+    if args.engine == 'python' and missing_ods_tables():
+        # Kiểm tra trước khi lock job: không có bảng ODS thật thì engine python không nạp được gì vào DWH
+        parser.error(f"--engine python requires {', '.join(missing_ods_tables())} "
+                     f"(the ODS tables Sync_ODS_To_DWH reads)")
+
+    job = TransformJob(engine=args.engine)
 
     # 1. Tìm Job
     if job.get_job_to_transform():
         # 2. Chuẩn bị Filter
         if job.prepare_filter_list():
+            # Job không đổi: Staging không được nạp lại, chạy procedure sẽ parse dữ liệu của job cũ
+            if job.job_unchanged():
+                job.finalize_job()
+            # 3 + 4 (chunked): Staging -> ODS -> DWH theo từng chunk
+            elif job.find_staged_chunks():
+                if job.run_chunked():
+                    job.finalize_job()
             # 3. Chạy Staging -> ODS
-            if job.call_ods_procedure():
+            elif job.call_ods():
                 # 4. Chạy ODS -> DWH
                 if job.call_dwh_procedure():
                     # 5. Kết thúc
@@ -0,0 +1,163 @@
+"""Chế độ crawl toàn thị trường: universe lấy từ snapshot listing thay vì symbol_company.txt.
+
+    python crawl_data.py --market [--exchange HOSE,HNX] [--industry "Ngân hàng"] [--deadline-minutes 45]
+
+Mã được sắp theo thanh khoản (giá trị giao dịch bình quân trong DWH), mã bị dời từ lần chạy trước
+được ưu tiên lên đầu. Hết hạn chót thì các mã còn lại được lưu vào bảng crawl_deferred cho lần chạy sau.
+"""
+import os
+from datetime import datetime, timedelta
+
+import mysql.connector
+
+from crawl_data import CrawlJob, DWH_CONFIG
+
+# Số ngày giao dịch gần nhất dùng để tính thanh khoản
+LIQUIDITY_LOOKBACK_DAYS = int(os.getenv("LIQUIDITY_LOOKBACK_DAYS", "30"))
+# Loại chứng khoán được crawl trong listing (bỏ chứng quyền, trái phiếu, ...)
+MARKET_SECURITY_TYPES = {"STOCK"}
+# Tên sàn trong listing của VCI (HOSE được ghi là HSX)
+EXCHANGE_ALIASES = {"HOSE": "HSX"}
+# Khi chưa có dữ liệu thanh khoản: ưu tiên theo sàn
+EXCHANGE_PRIORITY = {"HSX": 0, "HNX": 1, "UPCOM": 2}
+
+
+def parse_list(value):
+    """'HOSE, HNX' -> ['HOSE', 'HNX']"""
+    return [part.strip() for part in value.split(',') if part.strip()] if value else []
+
+
+def select_universe(df_exchange, df_industries, exchanges=None, industries=None):
+    """Lọc snapshot listing theo sàn / ngành, trả về {symbol: exchange}"""
+    df = df_exchange
+    if 'type' in df.columns:
+        df = df[df['type'].astype(str).str.upper().isin(MARKET_SECURITY_TYPES)]
+    if exchanges:
+        wanted = {EXCHANGE_ALIASES.get(e.upper(), e.upper()) for e in exchanges}
+        df = df[df['exchange'].astype(str).str.upper().isin(wanted)]
+    if industries:
+        # Khớp không phân biệt hoa thường với tên hoặc mã ngành ICB ở mọi cấp
+        icb_columns = [c for c in df_industries.columns if c.startswith(('icb_name', 'en_icb_name', 'icb_code'))]
+        match = None
+        for industry in industries:
+            for column in icb_columns:
+                hit = df_industries[column].astype(str).str.contains(industry, case=False, regex=False)
+                match = hit if match is None else match | hit
+        allowed = set(df_industries.loc[match, 'symbol']) if match is not None else set()
+        df = df[df['symbol'].isin(allowed)]
+    exchange_col = df['exchange'] if 'exchange' in df.columns else [None] * len(df)
+    return dict(zip(df['symbol'].astype(str), exchange_col))
+
+
+def load_liquidity(lookback_days=LIQUIDITY_LOOKBACK_DAYS):
+    """Giá trị giao dịch bình quân (close * volume) theo mã trong DWH, {} nếu không đọc được"""
+    since = int((datetime.now() - timedelta(days=lookback_days)).strftime('%Y%m%d'))
+    try:
+        conn = mysql.connector.connect(**DWH_CONFIG)
+    except mysql.connector.Error as err:
+        print(f"Liquidity lookup failed, ordering by exchange: {err}")
+        return {}
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT dc.symbol, AVG(f.close_price * f.volume)
+            FROM fact_price_history f
+                     JOIN dim_company dc ON f.company_id = dc.id
+            WHERE f.date_id >= %s
+            GROUP BY dc.symbol
+        """, (since,))
+        return {symbol: float(value or 0) for symbol, value in cursor.fetchall()}
+    except mysql.connector.Error as err:
+        print(f"Liquidity lookup failed, ordering by exchange: {err}")
+        return {}
+    finally:
+        conn.close()
+
+
+def prioritize(universe, liquidity, deferred=()):
+    """Mã bị dời lần trước lên đầu, sau đó theo thanh khoản giảm dần, rồi theo sàn và tên mã"""
+    deferred = set(deferred)
+    return sorted(universe, key=lambda symbol: (
+        symbol not in deferred,
+        -liquidity.get(symbol, 0.0),
+        EXCHANGE_PRIORITY.get(str(universe[symbol]).upper(), len(EXCHANGE_PRIORITY)),
+        symbol
+    ))
+
+
+class MarketCrawlJob(CrawlJob):
+    """CrawlJob với universe là toàn bộ (hoặc một phần đã lọc) thị trường"""
+
+    def __init__(self, db_config, exchanges=None, industries=None, **kwargs):
+        super().__init__(db_config, **kwargs)
+        self.exchanges = exchanges
+        self.industries = industries
+        self._crawl_completed = False
+
+    def _ensure_deferred_table(self, cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS crawl_deferred (
+                symbol VARCHAR(20) PRIMARY KEY,
+                id_config INT,
+                deferred_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+    def _load_deferred(self):
+        conn = self._get_db_connection()
+        if not conn: return []
+        cursor = conn.cursor()
+        try:
+            self._ensure_deferred_table(cursor)
+            cursor.execute("SELECT symbol FROM crawl_deferred ORDER BY deferred_at, symbol")
+            return [row[0] for row in cursor.fetchall()]
+        except mysql.connector.Error as err:
+            print(f"Deferred lookup failed: {err}")
+            return []
+        finally:
+            cursor.close()
+
+    def load_symbols(self):
+        if self.symbols is not None:
+            return self.symbols
+        try:
+            df_exchange, df_industries = self.fetch_listing()
+        except Exception as e:
+            self.symbols = []
+            self._insert_logging('ERR', f"Listing snapshot error, market universe is empty: {e}")
+            return self.symbols
+        universe = select_universe(df_exchange, df_industries, self.exchanges, self.industries)
+        deferred = [s for s in self._load_deferred() if s in universe]
+        self.symbols = prioritize(universe, load_liquidity(), deferred)
+        print(f"Market universe: {len(self.symbols)} symbols ({len(deferred)} deferred from the last run)")
+        return self.symbols
+
+    def _save_deferred(self):
+        """Thay danh sách mã bị dời bằng các mã chưa crawl được ở lần chạy này"""
+        conn = self._get_db_connection()
+        if not conn: return
+        cursor = conn.cursor()
+        try:
+            self._ensure_deferred_table(cursor)
+            cursor.execute("DELETE FROM crawl_deferred")
+            if self.deferred:
+                cursor.executemany(
+                    "INSERT INTO crawl_deferred (symbol, id_config) VALUES (%s, %s)",
+                    [(symbol, self.config_id) for symbol in self.deferred]
+                )
+            conn.commit()
+        except mysql.connector.Error as err:
+            print(f"Deferred save error: {err}")
+            conn.rollback()
+        finally:
+            cursor.close()
+
+    def execute_crawl(self):
+        super().execute_crawl()
+        self._crawl_completed = True
+
+    def finalize_job(self):
+        # Lượt crawl bị gián đoạn thì giữ nguyên danh sách cũ
+        if self._crawl_completed:
+            self._save_deferred()
+        super().finalize_job()
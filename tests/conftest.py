@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Các module trong scripts/ import lẫn nhau như module cùng thư mục
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
@@ -0,0 +1,106 @@
+import pandas as pd
+
+from crawl_writer import StreamingCsvWriter, StreamingParquetWriter, read_parquet_partition
+from load_staging import DATASET_COLUMNS, read_dataset, records_json
+
+
+def ratio_frame(symbol, columns, values):
+    df = pd.DataFrame([[symbol, 2023, *values]],
+                      columns=pd.MultiIndex.from_tuples([("Meta", "CP"), ("Meta", "Năm"), *columns]))
+    df["symbol"] = symbol
+    return df
+
+
+def test_csv_writer_keeps_columns_first_seen_in_later_frames(tmp_path):
+    frames = [
+        pd.DataFrame({"CP": ["AAA"], "ROE": [0.1]}),
+        pd.DataFrame({"CP": ["BBB"], "ROE": [0.2], "P/E": [5.0]}),
+        pd.DataFrame({"CP": ["CCC"], "P/E": [7.5]}),
+    ]
+    writer = StreamingCsvWriter(str(tmp_path), "2024-01-02")
+    for df in frames:
+        writer.write("company_overview", df)
+    writer.close()
+
+    expected = pd.concat(frames, ignore_index=True)
+    written = pd.read_csv(writer.file_path("company_overview"))
+    assert list(written.columns) == ["CP", "ROE", "P/E"]
+    pd.testing.assert_frame_equal(written, expected)
+    assert writer.total_rows == 3
+
+
+def test_csv_writer_file_is_readable_before_close(tmp_path):
+    writer = StreamingCsvWriter(str(tmp_path), "2024-01-02")
+    writer.write("finance_ratio", ratio_frame("AAA", [("Chỉ tiêu", "ROE (%)")], [0.1]))
+    writer.write("finance_ratio", ratio_frame("BBB", [("Định giá", "P/E"), ("Chỉ tiêu", "ROE (%)")], [5.0, 0.2]))
+    # Không gọi close(): giống job crash sau khi đã ghi hai mã
+    written = pd.read_csv(writer.file_path("finance_ratio"), header=1)
+    assert len(written) == 2
+    assert "P/E" in written.columns
+
+
+def test_csv_writer_widens_two_level_header(tmp_path):
+    frames = [
+        ratio_frame("AAA", [("Chỉ tiêu", "ROE (%)")], [0.1]),
+        ratio_frame("BBB", [("Định giá", "P/E"), ("Chỉ tiêu", "ROE (%)")], [5.0, 0.2]),
+    ]
+    writer = StreamingCsvWriter(str(tmp_path), "2024-01-02")
+    for df in frames:
+        writer.write("finance_ratio", df)
+    writer.close()
+
+    with open(writer.file_path("finance_ratio"), encoding="utf-8") as f:
+        written = f.read()
+    assert written == pd.concat(frames, ignore_index=True).to_csv(index=False)
+
+
+def crawl_frames():
+    """Kết quả giả lập của 3 mã: mã sau có thêm cột, có cột số ngoài danh sách cột quen thuộc"""
+    prices = [pd.DataFrame({"time": pd.to_datetime(["2024-01-02", "2024-01-03"]), "open": [10.5, 11.0],
+                            "close": [11.0, 11.5], "volume": [1000, 2000], "symbol": symbol})
+              for symbol in ("AAA", "BBB", "CCC")]
+    overviews = [pd.DataFrame({"symbol": ["AAA"], "exchange": ["HOSE"], "no_branches": [42]}),
+                 pd.DataFrame({"symbol": ["BBB"], "exchange": ["HNX"], "no_branches": [7],
+                               "charter_capital": [1.5e12]}),
+                 pd.DataFrame({"symbol": ["CCC"], "exchange": ["UPCOM"]})]
+    ratios = [ratio_frame("AAA", [("Chỉ tiêu", "ROE (%)")], [0.1]),
+              ratio_frame("BBB", [("Định giá", "P/E"), ("Chỉ tiêu", "ROE (%)")], [5.0, 0.2]),
+              ratio_frame("CCC", [("Chỉ tiêu", "ROE (%)"), ("Định giá", "P/E")], [0.3, 8.0])]
+    return {"price_history": prices, "company_overview": overviews, "finance_ratio": ratios}
+
+
+def test_parquet_read_path_matches_csv_records(tmp_path):
+    date_tag = "2024-01-03"
+    csv_writer = StreamingCsvWriter(str(tmp_path / "csv"), date_tag)
+    # flush_rows=2: dữ liệu bị chia thành nhiều part, part sau có thêm cột
+    parquet_writer = StreamingParquetWriter(str(tmp_path / "parquet"), date_tag, flush_rows=2)
+    for dataset, frames in crawl_frames().items():
+        for df in frames:
+            csv_writer.write(dataset, df)
+            parquet_writer.write(dataset, df)
+    csv_writer.close()
+    parquet_writer.close()
+
+    for col, dataset in DATASET_COLUMNS.items():
+        if dataset not in crawl_frames():
+            continue
+        from_csv = read_dataset(col, csv_writer.file_path(dataset), "csv")
+        from_parquet = read_dataset(col, parquet_writer.file_path(dataset), "parquet")
+        assert list(from_parquet.columns) == list(from_csv.columns)
+        assert records_json(from_parquet) == records_json(from_csv)
+
+
+def test_parquet_parts_use_declared_and_inferred_types(tmp_path):
+    writer = StreamingParquetWriter(str(tmp_path), "2024-01-03")
+    for dataset, frames in crawl_frames().items():
+        for df in frames:
+            writer.write(dataset, df)
+    writer.close()
+
+    prices = read_parquet_partition(writer.file_path("price_history"))
+    assert pd.api.types.is_datetime64_any_dtype(prices["time"])
+    assert prices["volume"].dtype == "int64"
+    overview = read_parquet_partition(writer.file_path("company_overview"))
+    # Cột không khai báo trong DATASET_SCHEMAS vẫn giữ kiểu số
+    assert pd.api.types.is_numeric_dtype(overview["no_branches"])
+    assert pd.api.types.is_numeric_dtype(overview["charter_capital"])
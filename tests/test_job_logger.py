@@ -0,0 +1,27 @@
+import mysql.connector
+import pytest
+
+from job_logger import BufferedJobLogger
+
+
+class FakeCursor:
+    def __init__(self):
+        self.rows = []
+
+    def executemany(self, sql, rows):
+        self.rows.extend(rows)
+
+
+def test_flush_with_requeues_rows_when_commit_fails():
+    logger = BufferedJobLogger({"host": None}, flush_interval=3600)
+    logger.log(1, "SUCCESS", "done")
+    cursor = FakeCursor()
+    with pytest.raises(mysql.connector.Error):
+        with logger.flush_with(cursor):
+            raise mysql.connector.Error("commit failed")
+    assert cursor.rows == [(1, "SUCCESS", "done")]
+    assert logger.buffer == [(1, "SUCCESS", "done")]
+
+    with logger.flush_with(cursor):
+        pass
+    assert logger.buffer == []
@@ -0,0 +1,24 @@
+import pandas as pd
+
+from crawl_writer import StreamingCsvWriter
+from shards import _merge_csv
+
+
+def test_merge_csv_keeps_union_of_shard_columns(tmp_path):
+    shard_frames = [
+        [pd.DataFrame({"CP": ["AAA"], "ROE": [0.1]})],
+        [pd.DataFrame({"CP": ["BBB"], "P/E": [5.0], "ROE": [0.2]})],
+    ]
+    shard_files = []
+    for i, frames in enumerate(shard_frames):
+        writer = StreamingCsvWriter(str(tmp_path / f"shard_{i}"), "2024-01-02")
+        for df in frames:
+            writer.write("company_overview", df)
+        writer.close()
+        shard_files.append(writer.file_path("company_overview"))
+
+    target = tmp_path / "merged.csv"
+    _merge_csv(shard_files, str(target), 1)
+
+    expected = pd.concat([df for frames in shard_frames for df in frames], ignore_index=True)
+    pd.testing.assert_frame_equal(pd.read_csv(target), expected)
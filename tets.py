@@ -3,7 +3,7 @@ from mysql.connector import Error
 import pandas as pd
 import os
 from datetime import datetime
-from vnstock import Finance, Vnstock, Listing, Quote
+from scripts.sources import VnstockSource
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -27,21 +27,17 @@ def fetch_data(target_date: str, symbol: str) -> dict or None:
 
     print(f"\t[API] Gọi Vnstock cho mã {symbol} ngày: {target_date}...")
     try:
-        vnstock_instance = Vnstock()
+        source = VnstockSource()
 
-        company = vnstock_instance.stock(symbol=symbol, source='TCBS').company
-        data1 = company.overview()
+        data1 = source.overview(symbol)
 
-        finance = Finance(symbol=symbol, source='VCI')
-        data2 = finance.ratio(period='year', lang='vi', dropna=True).head()
+        data2 = source.ratio(symbol, period='year', lang='vi', dropna=True).head()
 
-        listing = Listing()
-        data3 = listing.symbols_by_exchange().head()
+        data3 = source.symbols_by_exchange().head()
 
-        data4 = listing.symbols_by_industries().head()
+        data4 = source.symbols_by_industries().head()
 
-        quote = Quote(symbol=symbol, source='VCI')
-        data5 = quote.history(start=target_date, end=target_date, interval='1D')
+        data5 = source.history(symbol, start=target_date, end=target_date, interval='1D')
 
         data_to_load = {
             "company_overview": data1,